@@ -28,7 +28,7 @@ import os
 import sys
 from collections import namedtuple
 
-from .log import set_detailed_logs
+from .log import set_detailed_logs, set_rate_limits
 
 
 logger = logging.getLogger(__name__)
@@ -95,12 +95,22 @@ class Config:
         self.backdoor = False
         self.file_log_debug = False
         self.stream_log_detailed = False
+        self.log_rotation_size = 256 * 1024 * 1024
+        self.log_rotation_interval = 24 * 60 * 60
+        # Logger name to arguments of cms.log.RateLimitFilter.
+        self.log_rate_limits = {
+            "cms.service.EvaluationService": {"rate": 20, "period": 10.0},
+            "cms.service.Worker": {"rate": 20, "period": 10.0},
+        }
 
         # Database.
         self.database = "postgresql+psycopg2://cmsuser@localhost/cms"
         self.database_debug = False
         self.twophase_commit = False
 
+        # File store (None means the database).
+        self.file_store = None
+
         # Worker.
         self.keep_sandbox = True
         self.use_cgroups = True
@@ -205,6 +215,7 @@ class Config:
         # If the configuration says to print detailed log on stdout,
         # change the log configuration.
         set_detailed_logs(self.stream_log_detailed)
+        set_rate_limits(self.log_rate_limits)
 
     def _load(self, paths):
         """Try to load the config files one at a time, until one loads
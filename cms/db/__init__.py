@@ -68,6 +68,8 @@ __all__ = [
     "UserTestExecutable",
     # printjob
     "PrintJob",
+    # taskscore
+    "TaskScore",
     # init
     "init_db",
     # drop
@@ -75,7 +77,8 @@ __all__ = [
     # util
     "test_db_connection", "get_contest_list", "is_contest_id",
     "ask_for_contest", "get_submissions", "get_submission_results",
-    "get_datasets_to_judge", "enumerate_files"
+    "get_datasets_to_judge", "enumerate_files",
+    "enumerate_unreferenced_files",
 ]
 
 
@@ -104,13 +107,14 @@ from .submission import Submission, File, Token, SubmissionResult, \
 from .usertest import UserTest, UserTestFile, UserTestManager, \
     UserTestResult, UserTestExecutable
 from .printjob import PrintJob
+from .taskscore import TaskScore
 
 from .init import init_db
 from .drop import drop_db
 
 from .util import test_db_connection, get_contest_list, is_contest_id, \
     ask_for_contest, get_submissions, get_submission_results, \
-    get_datasets_to_judge, enumerate_files
+    get_datasets_to_judge, enumerate_files, enumerate_unreferenced_files
 
 
 configure_mappers()
@@ -27,17 +27,30 @@
 """
 
 import atexit
+import datetime
+import hashlib
+import hmac
 import io
 import logging
+import mmap
+import multiprocessing
 import os
 import tempfile
 import fcntl
+import xml.etree.ElementTree as ET
 from abc import ABCMeta, abstractmethod
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
 
 import gevent
+import gevent.event
+import gevent.lock
+import gevent.monkey
+import gevent.pool
+import requests
+import requests.adapters
 from sqlalchemy.exc import IntegrityError
 
-from cms import config, mkdir, rmtree
+from cms import ConfigError, config, mkdir, rmtree
 from cms.db import SessionGen, Digest, FSObject, LargeObject
 from cmscommon.digest import Digester
 
@@ -72,6 +85,83 @@ def copyfileobj(source_fobj, destination_fobj,
         gevent.sleep(0)
 
 
+class _EmptyFileView(io.BytesIO):
+    """Stand-in for the memory map of an empty file, as those cannot be
+    mapped.
+
+    """
+    def __len__(self):
+        return 0
+
+
+def map_file(fobj):
+    """Map the content of a file in memory, read-only.
+
+    Reading from the map does not go through the user-space buffers of
+    regular file objects, and the pages are shared with all other
+    processes reading the same file. The map remains valid after fobj
+    is closed.
+
+    fobj (fileobj): a binary file object backed by a real file.
+
+    return (mmap.mmap): a read-only view of the content of the file,
+        supporting len(), read(), readline(), seek() and tell(). It can
+        be used as a context manager, which unmaps it on exit.
+
+    """
+    if os.fstat(fobj.fileno()).st_size == 0:
+        return _EmptyFileView()
+    view = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_SEQUENTIAL"):
+        view.madvise(mmap.MADV_SEQUENTIAL)
+    return view
+
+
+def _compute_backend_digest(backend, digest, chunk_size):
+    """Re-hash a file stored in a backend.
+
+    This runs in the worker processes of check_backend_integrity, hence
+    it is a module-level function.
+
+    backend (FileCacherBackend): the backend storing the file.
+    digest (unicode): the digest under which the file is stored.
+    chunk_size (int): how many bytes to read at a time.
+
+    return ((unicode, unicode|None)): the given digest and the one
+        computed from the content, or None if the file disappeared.
+
+    """
+    d = Digester()
+    try:
+        with backend.get_file(digest) as fobj:
+            buf = fobj.read(chunk_size)
+            while len(buf) > 0:
+                d.update(buf)
+                buf = fobj.read(chunk_size)
+    except KeyError:
+        return digest, None
+    return digest, d.digest()
+
+
+def _compute_backend_size(backend, digest):
+    """Return the size of a file stored in a backend.
+
+    This runs in the worker processes of get_sizes, hence it is a
+    module-level function.
+
+    backend (FileCacherBackend): the backend storing the file.
+    digest (unicode): the digest of the file.
+
+    return ((unicode, int|None)): the given digest and the size of the
+        file, or None if the file disappeared.
+
+    """
+    try:
+        return digest, backend.get_size(digest)
+    except KeyError:
+        return digest, None
+
+
 class TombstoneError(RuntimeError):
     """An error that represents the file cacher trying to read
     files that have been deleted from the database.
@@ -438,6 +528,344 @@ class DBBackend(FileCacherBackend):
                 return _list(session)
 
 
+class ObjectStoreBackend(FileCacherBackend):
+    """This class implements a backend for FileCacher that keeps the
+    files in a bucket of an S3-compatible object store (Amazon S3,
+    MinIO, Ceph, ...), named after their digest.
+
+    The store is given as a URL in the form
+    http[s]://[access_key:secret_key@]host[:port]/bucket[/prefix]
+    [?region=region]; without credentials, requests are not signed.
+    Descriptions are stored as object metadata. Files bigger than
+    PART_SIZE are uploaded in parts, several of them at the same time.
+
+    """
+
+    # S3 requires parts to be at least 5 MiB (except the last one).
+    PART_SIZE = 8 * 1024 * 1024  # 8 MiB
+    UPLOAD_CONCURRENCY = 4
+    POOL_SIZE = 16
+
+    S3_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+    DESCRIPTION_HEADER = "x-amz-meta-description"
+
+    def __init__(self, url):
+        """Initialize the backend.
+
+        url (string): the URL of the bucket, see the class docstring.
+
+        """
+        self.url = url
+
+        parsed = urlsplit(url)
+        self.access_key = unquote(parsed.username or "")
+        self.secret_key = unquote(parsed.password or "")
+        self.host = parsed.hostname
+        if parsed.port is not None:
+            self.host += ":%d" % parsed.port
+        self.endpoint = "%s://%s" % (parsed.scheme, self.host)
+        self.region = dict(parse_qsl(parsed.query)).get("region",
+                                                        "us-east-1")
+
+        bucket, _, prefix = parsed.path.strip("/").partition("/")
+        self.bucket = bucket
+        self.prefix = prefix + "/" if prefix else ""
+
+        # A single session reuses connections across requests.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.POOL_SIZE)
+        self.session.mount(self.endpoint, adapter)
+
+    def __getstate__(self):
+        # Sessions shouldn't be shared, each copy makes its own.
+        return {"url": self.url}
+
+    def __setstate__(self, state):
+        self.__init__(state["url"])
+
+    def _path(self, digest=None):
+        """Return the path of an object (or of the bucket) on the host.
+
+        """
+        path = "/" + self.bucket
+        if digest is not None:
+            path += "/" + self.prefix + digest
+        return path
+
+    def _sign(self, method, path, params, headers):
+        """Add an AWS signature (version 4) to the headers of a request.
+
+        The payload is not signed, to avoid hashing it.
+
+        """
+        now = datetime.datetime.utcnow()
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date = now.strftime("%Y%m%d")
+        headers["x-amz-date"] = amz_date
+        headers["x-amz-content-sha256"] = "UNSIGNED-PAYLOAD"
+
+        signed = dict((k.lower(), str(v).strip())
+                      for k, v in headers.items()
+                      if k.lower().startswith("x-amz-"))
+        signed["host"] = self.host
+        signed_headers = ";".join(sorted(signed))
+        canonical_request = "\n".join([
+            method,
+            quote(path, safe="/~"),
+            "&".join("%s=%s" % (quote(k, safe="~"), quote(v, safe="~"))
+                     for k, v in sorted(params.items())),
+            "".join("%s:%s\n" % (k, signed[k]) for k in sorted(signed)),
+            signed_headers,
+            "UNSIGNED-PAYLOAD"])
+
+        scope = "%s/%s/s3/aws4_request" % (date, self.region)
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()])
+
+        key = ("AWS4" + self.secret_key).encode("utf-8")
+        for item in (date, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, item.encode("utf-8"), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode("utf-8"),
+                             hashlib.sha256).hexdigest()
+
+        headers["Authorization"] = \
+            "AWS4-HMAC-SHA256 Credential=%s/%s, SignedHeaders=%s, " \
+            "Signature=%s" % (self.access_key, scope, signed_headers,
+                              signature)
+
+    def _request(self, method, path, params=None, headers=None, data=None,
+                 stream=False, not_found_ok=False):
+        """Send a request to the object store.
+
+        not_found_ok (bool): whether to return a 404 response rather
+            than raising KeyError.
+
+        return (requests.Response): the response.
+
+        raise (KeyError): if the object is not found.
+        raise (requests.HTTPError): for any other unsuccessful status.
+
+        """
+        params = params if params is not None else {}
+        headers = headers if headers is not None else {}
+        if self.access_key:
+            self._sign(method, path, params, headers)
+        response = self.session.request(
+            method, self.endpoint + quote(path, safe="/~"), params=params,
+            headers=headers, data=data, stream=stream)
+        if response.status_code == 404 and not not_found_ok:
+            response.close()
+            raise KeyError("File not found.")
+        if response.status_code != 404:
+            response.raise_for_status()
+        return response
+
+    def _head(self, digest):
+        """Return the headers of an object, or None if it doesn't exist.
+
+        """
+        response = self._request("HEAD", self._path(digest),
+                                 not_found_ok=True)
+        if response.status_code == 404:
+            return None
+        return response.headers
+
+    def get_file(self, digest):
+        """See FileCacherBackend.get_file().
+
+        """
+        return _ObjectStoreFile(self, self._path(digest))
+
+    def create_file(self, digest):
+        """See FileCacherBackend.create_file().
+
+        """
+        if self._head(digest) is not None:
+            return None
+
+        # Uploads need to know the size in advance, and multipart
+        # uploads read different parts at the same time, so we buffer
+        # the content in a temporary file.
+        return tempfile.NamedTemporaryFile('w+b', dir=config.temp_dir,
+                                           prefix=".tmp.", suffix=digest)
+
+    def commit_file(self, fobj, digest, desc=""):
+        """See FileCacherBackend.commit_file().
+
+        """
+        with fobj:
+            # As with FSBackend, there is a race condition here, but it
+            # would at most cause identical content to be uploaded twice.
+            if self._head(digest) is not None:
+                return False
+
+            fobj.flush()
+            size = fobj.tell()
+            headers = {self.DESCRIPTION_HEADER: quote(desc)}
+            if size <= self.PART_SIZE:
+                fobj.seek(0)
+                headers["Content-Length"] = str(size)
+                self._request("PUT", self._path(digest), headers=headers,
+                              data=fobj).close()
+            else:
+                self._multipart_upload(fobj, size, digest, headers)
+
+        logger.info("File %s (%s) stored on the object store.", digest, desc)
+        return True
+
+    def _multipart_upload(self, fobj, size, digest, headers):
+        """Upload a file in parts, several of them concurrently.
+
+        fobj (fileobj): a real file, holding the content.
+        size (int): the size of the content.
+        digest (unicode): the digest of the file.
+        headers ({str: str}): the headers to store with the object.
+
+        """
+        path = self._path(digest)
+        response = self._request("POST", path, params={"uploads": ""},
+                                 headers=headers)
+        upload_id = ET.fromstring(response.content).findtext(
+            self.S3_NAMESPACE + "UploadId")
+
+        def upload_part(part_number):
+            offset = (part_number - 1) * self.PART_SIZE
+            # pread doesn't move the shared file position.
+            data = os.pread(fobj.fileno(), self.PART_SIZE, offset)
+            response = self._request(
+                "PUT", path, data=data,
+                params={"partNumber": str(part_number),
+                        "uploadId": upload_id})
+            response.close()
+            return part_number, response.headers["ETag"]
+
+        parts = range(1, (size + self.PART_SIZE - 1) // self.PART_SIZE + 1)
+        try:
+            pool = gevent.pool.Pool(self.UPLOAD_CONCURRENCY)
+            etags = sorted(pool.imap_unordered(upload_part, parts))
+
+            root = ET.Element("CompleteMultipartUpload")
+            for part_number, etag in etags:
+                part = ET.SubElement(root, "Part")
+                ET.SubElement(part, "PartNumber").text = str(part_number)
+                ET.SubElement(part, "ETag").text = etag
+            self._request("POST", path, params={"uploadId": upload_id},
+                          data=ET.tostring(root)).close()
+        except Exception:
+            self._request("DELETE", path, params={"uploadId": upload_id},
+                          not_found_ok=True).close()
+            raise
+
+    def describe(self, digest):
+        """See FileCacherBackend.describe().
+
+        """
+        headers = self._head(digest)
+        if headers is None:
+            raise KeyError("File not found.")
+        return unquote(headers.get(self.DESCRIPTION_HEADER, ""))
+
+    def get_size(self, digest):
+        """See FileCacherBackend.get_size().
+
+        """
+        headers = self._head(digest)
+        if headers is None:
+            raise KeyError("File not found.")
+        return int(headers["Content-Length"])
+
+    def delete(self, digest):
+        """See FileCacherBackend.delete().
+
+        """
+        self._request("DELETE", self._path(digest), not_found_ok=True).close()
+
+    def list(self):
+        """See FileCacherBackend.list().
+
+        """
+        res = []
+        params = {"list-type": "2", "prefix": self.prefix}
+        while True:
+            response = self._request("GET", self._path(), params=params)
+            root = ET.fromstring(response.content)
+            for contents in root.iter(self.S3_NAMESPACE + "Contents"):
+                key = contents.findtext(self.S3_NAMESPACE + "Key")
+                res.append((key[len(self.prefix):], ""))
+            token = root.findtext(self.S3_NAMESPACE + "NextContinuationToken")
+            if root.findtext(self.S3_NAMESPACE + "IsTruncated") != "true" \
+                    or token is None:
+                break
+            params["continuation-token"] = token
+        return res
+
+
+class _ObjectStoreFile(io.RawIOBase):
+    """A readable file object streaming the content of an object.
+
+    Reads are served sequentially from a single response; seeking
+    opens a new response starting from the new position (with a range
+    request), so that parts of the object can be read without
+    downloading it all.
+
+    """
+
+    def __init__(self, backend, path):
+        """Start downloading the object.
+
+        raise (KeyError): if the object doesn't exist.
+
+        """
+        super().__init__()
+        self._backend = backend
+        self._path = path
+        self._position = 0
+        self._response = self._backend._request("GET", path, stream=True)
+        self._size = int(self._response.headers["Content-Length"])
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        if self._response is None:
+            return 0
+        data = self._response.raw.read(len(b))
+        b[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        offset = max(offset, 0)
+        if offset != self._position:
+            if self._response is not None:
+                self._response.close()
+                self._response = None
+            if offset < self._size:
+                self._response = self._backend._request(
+                    "GET", self._path, stream=True,
+                    headers={"Range": "bytes=%d-" % offset})
+            self._position = offset
+        return self._position
+
+    def close(self):
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+        super().close()
+
+
 class NullBackend(FileCacherBackend):
     """This backend is always empty, it just drops each file that
     receives. It looks mostly like /dev/null. It is useful when you
@@ -488,11 +916,20 @@ class FileCacher:
     # CHUNK_SIZE should be a multiple of these values.
     CHUNK_SIZE = 16 * 1024  # 16 KiB
 
+    # Bigger chunks used when scanning the whole store, where we are
+    # only bound by throughput.
+    SCAN_CHUNK_SIZE = 4 * 1024 * 1024  # 4 MiB
+
+    # Maximum number of prefetches downloading at the same time; each
+    # of them may hold a connection to the database.
+    PREFETCH_CONCURRENCY = 4
+
     def __init__(self, service=None, path=None, null=False):
         """Initialize.
 
-        By default the database-powered backend will be used, but this
-        can be changed using the parameters.
+        By default the backend given by the file_store configuration
+        option will be used (the database-powered one if not set), but
+        this can be changed using the parameters.
 
         service (Service|None): the service we are running for. Only
             used if present to determine the location of the
@@ -510,12 +947,19 @@ class FileCacher:
         """
         self.service = service
 
+        # Downloads currently in progress, from digest to the AsyncResult
+        # that will be set when the file lands in the cache. Used to
+        # avoid fetching the same file twice from the backend.
+        self._pending = dict()
+        self._prefetch_semaphore = gevent.lock.BoundedSemaphore(
+            self.PREFETCH_CONCURRENCY)
+
         if null:
             self.backend = NullBackend()
-        elif path is None:
-            self.backend = DBBackend()
-        else:
+        elif path is not None:
             self.backend = FSBackend(path)
+        else:
+            self.backend = FileCacher._get_configured_backend()
 
         # First we create the config directories.
         self._create_directory_or_die(config.temp_dir)
@@ -537,6 +981,27 @@ class FileCacher:
         # Just to make sure it was created.
         self._create_directory_or_die(self.file_dir)
 
+    @staticmethod
+    def _get_configured_backend():
+        """Return the backend selected in the configuration.
+
+        return (FileCacherBackend): a DBBackend if file_store is not
+            set, a FSBackend for a file:// URL, an ObjectStoreBackend
+            for a http:// or https:// URL.
+
+        raise (ConfigError): if the URL is not of one of these kinds.
+
+        """
+        url = config.file_store
+        if url is None:
+            return DBBackend()
+        scheme = urlsplit(url).scheme
+        if scheme == "file":
+            return FSBackend(unquote(urlsplit(url).path))
+        elif scheme in ("http", "https"):
+            return ObjectStoreBackend(url)
+        raise ConfigError("Unsupported file store %r." % url)
+
     def is_shared(self):
         """Return whether the cache directory is shared with other services."""
         return self.service is not None
@@ -601,31 +1066,144 @@ class FileCacher:
             except FileNotFoundError:
                 pass
 
-        logger.debug("File %s not in cache, downloading "
-                     "from database.", digest)
+        pending = self._pending.get(digest)
+        if pending is not None:
+            # Someone else (e.g., a prefetch) is already downloading
+            # this file: wait for them instead of downloading it again.
+            pending.get()
+            if cache_only:
+                return
+            try:
+                return open(cache_file_path, 'rb')
+            except FileNotFoundError:
+                # Deleted from the cache in the meantime, we need to
+                # download it ourselves.
+                pass
+
+        return self._download(digest, cache_only)
+
+    def _download(self, digest, cache_only, pending=None):
+        """Download a file from the backend into the cache.
+
+        While the download is in progress the file is registered as
+        pending, so that other greenlets that need it can wait for it
+        rather than start a download of their own.
+
+        cache_only (bool): don't open the file for reading.
+        pending (AsyncResult|None): the handle to register the download
+            with, and to set once it finishes; if not given a new one
+            is created.
+
+        return (fileobj): a readable binary file-like object from which
+            to read the contents of the file (None if cache_only is True).
+
+        raise (KeyError): if the file cannot be found.
+
+        """
+        cache_file_path = os.path.join(self.file_dir, digest)
+
+        if pending is None:
+            pending = gevent.event.AsyncResult()
+        self._pending[digest] = pending
+        try:
+            logger.debug("File %s not in cache, downloading "
+                         "from database.", digest)
+
+            ftmp_handle, temp_file_path = tempfile.mkstemp(dir=self.temp_dir,
+                                                           text=False)
+            with open(ftmp_handle, 'wb') as ftmp, \
+                    self.backend.get_file(digest) as fobj:
+                copyfileobj(fobj, ftmp, self.CHUNK_SIZE)
+
+            fd = None
+            if not cache_only:
+                # We allow anyone to delete files from the cache directory
+                # self.file_dir at any time. Hence, cache_file_path might no
+                # longer exist an instant after we create it. Opening the
+                # temporary file before renaming it circumvents this issue.
+                # (Note that the temporary file may not be manually deleted!)
+                fd = open(temp_file_path, 'rb')
+
+            # Then move it to its real location (this operation is atomic
+            # by POSIX requirement)
+            os.rename(temp_file_path, cache_file_path)
+
+            logger.debug("File %s downloaded.", digest)
+        except BaseException as error:
+            pending.set_exception(error)
+            raise
+        else:
+            pending.set(None)
+        finally:
+            if self._pending.get(digest) is pending:
+                del self._pending[digest]
+
+        return fd
 
-        ftmp_handle, temp_file_path = tempfile.mkstemp(dir=self.temp_dir,
-                                                       text=False)
-        with open(ftmp_handle, 'wb') as ftmp, \
-                self.backend.get_file(digest) as fobj:
-            copyfileobj(fobj, ftmp, self.CHUNK_SIZE)
+    def prefetch(self, digests):
+        """Start loading some files into the cache in the background.
 
-        if not cache_only:
-            # We allow anyone to delete files from the cache directory
-            # self.file_dir at any time. Hence, cache_file_path might no
-            # longer exist an instant after we create it. Opening the
-            # temporary file before renaming it circumvents this issue.
-            # (Note that the temporary file may not be manually deleted!)
-            fd = open(temp_file_path, 'rb')
+        Each file is downloaded in its own greenlet, and the caller
+        can carry on with its work in the meantime. Files that are
+        already in the cache are not downloaded again, and files whose
+        download is already in progress (for example, because of an
+        earlier prefetch or of a concurrent get_file) are not
+        downloaded twice. Conversely, get_file and friends wait for a
+        pending prefetch of the same file instead of starting a new
+        download.
 
-        # Then move it to its real location (this operation is atomic
-        # by POSIX requirement)
-        os.rename(temp_file_path, cache_file_path)
+        digests ([unicode]): the digests of the files to prefetch.
+
+        return ([AsyncResult]): one handle for each digest, in the
+            same order. Calling get() on a handle blocks until the file
+            is in the cache, and raises KeyError if the file cannot be
+            found or TombstoneError if the digest is the tombstone.
+
+        """
+        return [self._prefetch(digest) for digest in digests]
 
-        logger.debug("File %s downloaded.", digest)
+    def _prefetch(self, digest):
+        """Start loading a single file in the background.
 
-        if not cache_only:
-            return fd
+        digest (unicode): the digest of the file to prefetch.
+
+        return (AsyncResult): a handle for the download.
+
+        """
+        pending = self._pending.get(digest)
+        if pending is not None:
+            return pending
+
+        result = gevent.event.AsyncResult()
+        if digest == Digest.TOMBSTONE:
+            result.set_exception(TombstoneError())
+        elif os.path.exists(os.path.join(self.file_dir, digest)):
+            result.set(None)
+        else:
+            # Register a placeholder right away, so that requests for
+            # the same file made before the greenlet starts running
+            # are deduplicated too.
+            self._pending[digest] = result
+            gevent.spawn(self._prefetch_worker, digest, result)
+        return result
+
+    def _prefetch_worker(self, digest, result):
+        """Download a prefetched file and report the outcome.
+
+        digest (unicode): the digest of the file to download.
+        result (AsyncResult): the handle given to the callers.
+
+        """
+        try:
+            with self._prefetch_semaphore:
+                if os.path.exists(os.path.join(self.file_dir, digest)):
+                    del self._pending[digest]
+                    result.set(None)
+                else:
+                    self._download(digest, True, result)
+        except Exception as error:
+            # The error has already been delivered to the waiters.
+            logger.debug("Prefetching of file %s failed: %r.", digest, error)
 
     def cache_file(self, digest):
         """Load a file into the cache.
@@ -674,6 +1252,30 @@ class FileCacher:
 
         return self._load(digest, False)
 
+    def get_file_mmap(self, digest):
+        """Retrieve a file from the storage.
+
+        See `get_file'. This method returns a read-only memory map of
+        the cached copy of the file (see `map_file'), which is cheaper
+        than reading through a file object when the file is large or
+        when many processes read it at the same time. The map should
+        be used as a context manager, to make sure that it gets
+        unmapped:
+
+            with file_cacher.get_file_mmap(digest) as view:
+                ...
+
+        digest (unicode): the digest of the file to get.
+
+        return (mmap.mmap): a read-only view of the content of the file.
+
+        raise (KeyError): if the file cannot be found.
+        raise (TombstoneError): if the digest is the tombstone
+
+        """
+        with self.get_file(digest) as src:
+            return map_file(src)
+
     def get_file_content(self, digest):
         """Retrieve a file from the storage.
 
@@ -918,34 +1520,156 @@ class FileCacher:
         """
         return self.backend.list()
 
-    def check_backend_integrity(self, delete=False):
+    def _map_backend(self, func, digests, workers, *args):
+        """Apply a function to many files of the backend in parallel.
+
+        The function is run in a pool of freshly spawned processes (so
+        that they don't inherit connections to the database), each
+        receiving its own copy of the backend.
+
+        func (function): a module-level function taking the backend, a
+            digest and args.
+        digests ([unicode]): the digests to process.
+        workers (int|None): the number of processes to use; if None,
+            the number of CPUs; if 1, everything is done in this
+            process, which is also the case if threads are monkey
+            patched by gevent, since the pool relies on them.
+
+        return (iterator): the results of func, in no particular order.
+
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1 or gevent.monkey.is_module_patched("threading"):
+            for digest in digests:
+                yield func(self.backend, digest, *args)
+            return
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(workers) as pool:
+            yield from pool.imap_unordered(
+                _BackendCall(func, self.backend, args), digests,
+                chunksize=16)
+
+    def get_sizes(self, digests, workers=None):
+        """Return the size of many files, computed in parallel.
+
+        digests ([unicode]): the digests of the files.
+        workers (int|None): the number of processes to use (see
+            _map_backend).
+
+        return ({unicode: int}): the size of each file, in bytes; the
+            files that cannot be found are omitted.
+
+        """
+        return dict(
+            (digest, size) for digest, size
+            in self._map_backend(_compute_backend_size, digests, workers)
+            if size is not None)
+
+    def check_backend_integrity(self, delete=False, workers=None,
+                                checkpoint_path=None):
         """Check the integrity of the backend.
 
         Request all the files from the backend. For each of them the
         digest is recomputed and checked against the one recorded in
-        the backend.
+        the backend. The files are hashed in parallel by a pool of
+        processes, reading in large chunks.
 
         If mismatches are found, they are reported with ERROR
         severity. The method returns False if at least a mismatch is
         found, True otherwise.
 
+        If a checkpoint path is given, the outcome of each check is
+        appended to that file as soon as it is known, and the files
+        already listed there are not checked again. Hence, an
+        interrupted check can be resumed by running it again with the
+        same checkpoint path. Malformed lines (e.g., the last one, if
+        the check was interrupted while writing it) are ignored, and
+        their files checked again.
+
         delete (bool): if True, files with wrong digest are deleted.
+        workers (int|None): the number of processes to use; by default
+            one per CPU.
+        checkpoint_path (string|None): the file where to record the
+            progress, if any.
 
         """
         clean = True
-        for digest, _ in self.list():
-            d = Digester()
-            with self.backend.get_file(digest) as fobj:
-                buf = fobj.read(self.CHUNK_SIZE)
-                while len(buf) > 0:
-                    d.update(buf)
-                    buf = fobj.read(self.CHUNK_SIZE)
-            computed_digest = d.digest()
-            if digest != computed_digest:
-                logger.error("File with hash %s actually has hash %s",
-                             digest, computed_digest)
-                if delete:
-                    self.delete(digest)
-                clean = False
+
+        done = set()
+        mismatched = list()
+        # Whether the checkpoint ends with a partially written line.
+        truncated = False
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.split()
+                    truncated = not line.endswith("\n")
+                    if truncated or len(fields) != 2:
+                        # Probably written only partially, by a check
+                        # that was interrupted: the file is checked
+                        # again.
+                        logger.warning("Malformed line in checkpoint, "
+                                       "ignoring it.",
+                                       extra={"location": f.name})
+                        continue
+                    digest, computed_digest = fields
+                    done.add(digest)
+                    if digest != computed_digest:
+                        mismatched.append(digest)
+                        clean = False
+            logger.info("Resuming from checkpoint, %d files already "
+                        "checked.", len(done))
+
+        # The files found corrupted by the previous runs might have been
+        # kept (if the run didn't delete them or it was interrupted).
+        if delete:
+            for digest in mismatched:
+                self.delete(digest)
+
+        digests = [digest for digest, _ in self.list() if digest not in done]
+        logger.info("Checking %d files.", len(digests))
+
+        checkpoint = None
+        if checkpoint_path is not None:
+            checkpoint = open(checkpoint_path, "at", encoding="utf-8")
+            if truncated:
+                checkpoint.write("\n")
+        try:
+            results = self._map_backend(_compute_backend_digest, digests,
+                                        workers, self.SCAN_CHUNK_SIZE)
+            for count, (digest, computed_digest) in enumerate(results, 1):
+                if computed_digest is None:
+                    # Deleted while we were checking: nothing to do.
+                    continue
+                if digest != computed_digest:
+                    logger.error("File with hash %s actually has hash %s",
+                                 digest, computed_digest)
+                    if delete:
+                        self.delete(digest)
+                    clean = False
+                if checkpoint is not None:
+                    checkpoint.write("%s %s\n" % (digest, computed_digest))
+                    checkpoint.flush()
+                if count % 1000 == 0:
+                    logger.info("%d files checked.", count)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
 
         return clean
+
+
+class _BackendCall:
+    """Picklable partial application of a function to a backend, to
+    be sent to the worker processes of FileCacher._map_backend.
+
+    """
+
+    def __init__(self, func, backend, args):
+        self.func = func
+        self.backend = backend
+        self.args = args
+
+    def __call__(self, digest):
+        return self.func(self.backend, digest, *self.args)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Task-score-related database interface for SQLAlchemy.
+
+"""
+
+from sqlalchemy.orm import relationship
+from sqlalchemy.schema import Column, ForeignKey, UniqueConstraint
+from sqlalchemy.types import Integer, Float, Boolean, DateTime
+
+from cmscommon.datetime import make_datetime
+from . import Base, Participation, Task
+
+
+class TaskScore(Base):
+    """Class to store the score of a participation on a task.
+
+    It caches the result of cms.grading.scoring.task_score, which is
+    expensive as it looks at all the submissions of the participation
+    on the task. It's maintained by ScoringService and deleted when it
+    might be stale, in which case the score must be computed again.
+    Scores are not rounded.
+
+    This is derived data: it's not exported in dumps.
+
+    """
+    __tablename__ = 'task_scores'
+    __table_args__ = (
+        UniqueConstraint('participation_id', 'task_id'),
+    )
+
+    # Auto increment primary key.
+    id = Column(
+        Integer,
+        primary_key=True)
+
+    # Participation (id and object) the score belongs to.
+    participation_id = Column(
+        Integer,
+        ForeignKey(Participation.id,
+                   onupdate="CASCADE", ondelete="CASCADE"),
+        nullable=False,
+        index=True)
+    participation = relationship(
+        Participation)
+
+    # Task (id and object) the score is about.
+    task_id = Column(
+        Integer,
+        ForeignKey(Task.id,
+                   onupdate="CASCADE", ondelete="CASCADE"),
+        nullable=False,
+        index=True)
+    task = relationship(
+        Task)
+
+    # The score and whether it's partial, i.e., whether not all the
+    # submissions have been scored (see task_score), for the full
+    # score, the public score and the score of tokened submissions.
+    score = Column(
+        Float,
+        nullable=False)
+    partial = Column(
+        Boolean,
+        nullable=False)
+    public_score = Column(
+        Float,
+        nullable=False)
+    public_partial = Column(
+        Boolean,
+        nullable=False)
+    tokened_score = Column(
+        Float,
+        nullable=False)
+    tokened_partial = Column(
+        Boolean,
+        nullable=False)
+
+    # When the scores were last computed.
+    last_update = Column(
+        DateTime,
+        nullable=False,
+        default=make_datetime)
+
+    def get_score(self, public=False, only_tokened=False):
+        """Return one of the stored scores.
+
+        public (bool): whether to return the public score.
+        only_tokened (bool): whether to return the score of the tokened
+            submissions.
+
+        return ((float, bool)): the score and whether it's partial.
+
+        """
+        if public:
+            return self.public_score, self.public_partial
+        elif only_tokened:
+            return self.tokened_score, self.tokened_partial
+        else:
+            return self.score, self.partial
@@ -26,14 +26,14 @@
 import sys
 import logging
 
-from sqlalchemy import union
+from sqlalchemy import except_, union
 from sqlalchemy.exc import OperationalError
 
 from cms import ConfigError
 from . import SessionGen, Digest, Contest, Participation, Statement, \
     Attachment, Task, Manager, Dataset, Testcase, Submission, File, \
     SubmissionResult, Executable, UserTest, UserTestFile, UserTestManager, \
-    UserTestResult, UserTestExecutable, PrintJob
+    UserTestResult, UserTestExecutable, PrintJob, FSObject
 
 
 logger = logging.getLogger(__name__)
@@ -282,6 +282,46 @@ def enumerate_files(
     return (set): a set of strings, the digests of the file
                   referenced in the contest.
 
+    """
+    queries = _enumerate_files_queries(
+        session, contest, skip_submissions, skip_user_tests, skip_users,
+        skip_print_jobs, skip_generated)
+
+    # union(...).execute() would be executed outside of the session.
+    digests = set(r[0] for r in session.execute(union(*queries)))
+    digests.discard(Digest.TOMBSTONE)
+    return digests
+
+
+def enumerate_unreferenced_files(session):
+    """Enumerate all the files stored in the database (as FSObjects)
+    that are not referenced by any object.
+
+    The difference is computed by the database in a single query,
+    without transferring all the digests.
+
+    return (set): a set of strings, the digests of the unreferenced
+                  files.
+
+    """
+    queries = _enumerate_files_queries(session)
+    fsobject_q = session.query(FSObject).with_entities(FSObject.digest)
+    # except_(...).execute() would be executed outside of the session.
+    digests = set(r[0] for r in session.execute(except_(fsobject_q,
+                                                        *queries)))
+    digests.discard(Digest.TOMBSTONE)
+    return digests
+
+
+def _enumerate_files_queries(
+        session, contest=None,
+        skip_submissions=False, skip_user_tests=False, skip_users=False,
+        skip_print_jobs=False, skip_generated=False):
+    """Return the queries selecting the digests referenced by the
+    contest (see enumerate_files).
+
+    return ([Query]): queries each returning a column of digests.
+
     """
     contest_q = session.query(Contest)
     if contest is not None:
@@ -333,7 +373,4 @@ def enumerate_files(
                        .join(Participation.printjobs)
                        .with_entities(PrintJob.digest))
 
-    # union(...).execute() would be executed outside of the session.
-    digests = set(r[0] for r in session.execute(union(*queries)))
-    digests.discard(Digest.TOMBSTONE)
-    return digests
+    return queries
@@ -34,6 +34,7 @@ import gevent
 from gevent import subprocess
 
 from cms import config, rmtree
+from cms.db.filecacher import map_file
 from cmscommon.commands import pretty_print_cmdline
 
 
@@ -415,6 +416,19 @@ class SandboxBase(metaclass=ABCMeta):
             file_ = Truncator(file_, trunc_len)
         return file_
 
+    def get_file_mmap(self, path):
+        """Map a file in the sandbox in memory, given its relative path.
+
+        path (str): relative path of the file inside the sandbox.
+
+        return (mmap.mmap): a read-only view of the content of the
+            file, to be used as a context manager (see map_file).
+
+        """
+        logger.debug("Mapping file %s from sandbox.", path)
+        with open(self.relative_path(path), "rb") as file_:
+            return map_file(file_)
+
     def get_file_to_string(self, path, maxlen=1024):
         """Return the content of a file in the sandbox given its
         relative path.
@@ -426,9 +440,12 @@ class SandboxBase(metaclass=ABCMeta):
         return (string): the content of the file up to maxlen bytes.
 
         """
-        with self.get_file(path) as file_:
+        logger.debug("Retrieving file %s from sandbox.", path)
+        # Read directly from the raw file, since a buffer would only
+        # add a copy of the data.
+        with open(self.relative_path(path), "rb", buffering=0) as file_:
             if maxlen is None:
-                return file_.read()
+                return file_.readall()
             else:
                 return file_.read(maxlen)
 
@@ -308,6 +308,13 @@ class ScoreTypeGroup(ScoreTypeAlone):
 </div>
 {% endfor %}"""
 
+    def __init__(self, parameters, public_testcases):
+        """See ScoreType.__init__."""
+        # The targets of the subtasks, computed on first use (see
+        # _get_targets).
+        self._targets = None
+        super().__init__(parameters, public_testcases)
+
     def retrieve_target_testcases(self):
         """Return the list of the target testcases for each subtask.
 
@@ -355,18 +362,42 @@ class ScoreTypeGroup(ScoreTypeAlone):
             "In the score type parameters, the second value of each element "
             "must have the same type (int or unicode)")
 
+    def _get_targets(self):
+        """Return the targets of the subtasks, computing them only once.
+
+        Parameters and testcases of a score type never change, hence
+        neither do the targets.
+
+        return (([str], {str: int}, [[int]], [bool])): the codenames of
+            the testcases, the position of each of them in that list,
+            the positions of the testcases of each subtask and whether
+            each subtask has only public testcases.
+
+        """
+        if self._targets is None:
+            targets = self.retrieve_target_testcases()
+            codenames = sorted(self.public_testcases.keys())
+            positions = {codename: i for i, codename in enumerate(codenames)}
+            self._targets = (
+                codenames,
+                positions,
+                [[positions[codename] for codename in target]
+                 for target in targets],
+                [all(self.public_testcases[codename] for codename in target)
+                 for target in targets])
+        return self._targets
+
     def max_scores(self):
         """See ScoreType.max_score."""
         score = 0.0
         public_score = 0.0
         headers = list()
 
-        targets = self.retrieve_target_testcases()
+        _, _, _, all_public = self._get_targets()
 
         for st_idx, parameter in enumerate(self.parameters):
-            target = targets[st_idx]
             score += parameter[0]
-            if all(self.public_testcases[tc_idx] for tc_idx in target):
+            if all_public[st_idx]:
                 public_score += parameter[0]
             headers += ["Subtask %d (%g)" % (st_idx + 1, parameter[0])]
 
@@ -384,25 +415,36 @@ class ScoreTypeGroup(ScoreTypeAlone):
         public_subtasks = []
         ranking_details = []
 
-        targets = self.retrieve_target_testcases()
-        evaluations = {ev.codename: ev for ev in submission_result.evaluations}
+        codenames, positions, targets, all_public = self._get_targets()
+        # The evaluations, in the same order as codenames.
+        evaluations = [None] * len(codenames)
+        for ev in submission_result.evaluations:
+            position = positions.get(ev.codename)
+            if position is not None:
+                evaluations[position] = ev
 
         for st_idx, parameter in enumerate(self.parameters):
             target = targets[st_idx]
 
             testcases = []
             public_testcases = []
+            outcomes = []
             previous_tc_all_correct = True
-            for tc_idx in target:
-                tc_outcome = self.get_public_outcome(
-                    float(evaluations[tc_idx].outcome), parameter)
+            for position in target:
+                tc_idx = codenames[position]
+                evaluation = evaluations[position]
+                if evaluation is None:
+                    raise KeyError(tc_idx)
+                outcome = float(evaluation.outcome)
+                outcomes.append(outcome)
+                tc_outcome = self.get_public_outcome(outcome, parameter)
 
                 testcases.append({
                     "idx": tc_idx,
                     "outcome": tc_outcome,
-                    "text": evaluations[tc_idx].text,
-                    "time": evaluations[tc_idx].execution_time,
-                    "memory": evaluations[tc_idx].execution_memory,
+                    "text": evaluation.text,
+                    "time": evaluation.execution_time,
+                    "memory": evaluation.execution_memory,
                     "show_in_restricted_feedback": previous_tc_all_correct})
                 if self.public_testcases[tc_idx]:
                     public_testcases.append(testcases[-1])
@@ -414,9 +456,7 @@ class ScoreTypeGroup(ScoreTypeAlone):
                 else:
                     public_testcases.append({"idx": tc_idx})
 
-            st_score_fraction = self.reduce(
-                [float(evaluations[tc_idx].outcome) for tc_idx in target],
-                parameter)
+            st_score_fraction = self.reduce(outcomes, parameter)
             st_score = st_score_fraction * parameter[0]
 
             score += st_score
@@ -428,7 +468,7 @@ class ScoreTypeGroup(ScoreTypeAlone):
                 "score_fraction": st_score_fraction,
                 "max_score": parameter[0],
                 "testcases": testcases})
-            if all(self.public_testcases[tc_idx] for tc_idx in target):
+            if all_public[st_idx]:
                 public_score += st_score
                 public_subtasks.append(subtasks[-1])
             else:
@@ -23,20 +23,28 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 
 from sqlalchemy.orm import joinedload
 
-from cms.db import Submission
+from cms.db import Dataset, Participation, Submission, Task, TaskScore
 from cmscommon.constants import \
     SCORE_MODE_MAX, SCORE_MODE_MAX_SUBTASK, SCORE_MODE_MAX_TOKENED_LAST
+from cmscommon.datetime import make_datetime
 
 
 __all__ = [
     "compute_changes_for_dataset", "task_score",
+    "update_task_scores", "invalidate_task_scores", "get_task_score",
+    "get_task_scores",
 ]
 
 
+# For how many participations at once get_task_scores loads the
+# submissions on a task to compute the scores that are not stored.
+MISSING_SCORES_CHUNK_SIZE = 100
+
+
 SubmissionScoreDelta = namedtuple(
     'SubmissionScoreDelta',
     ['submission', 'old_score', 'new_score',
@@ -128,14 +136,33 @@ def task_score(participation, task,
     # submission_results table. Doing so means that this function should incur
     # no exta database queries.
 
+    submissions = [s for s in participation.submissions
+                   if s.task is task and s.official]
+    score, partial = _task_score(submissions, task, public, only_tokened)
+    if rounded:
+        score = round(score, task.score_precision)
+    return score, partial
+
+
+def _task_score(submissions, task, public, only_tokened):
+    """Return the score of some submissions on a task.
+
+    submissions ([Submission]): the official submissions of a
+        participation on the task.
+    task (Task): the task.
+    public (bool): see task_score.
+    only_tokened (bool): see task_score.
+
+    return ((float, bool)): the (unrounded) score and whether it's
+        partial, see task_score.
+
+    """
     if public and only_tokened:
         raise ValueError(
             "Requested public task score restricted to tokened submissions. "
             "This is a programming error: users have access to all public "
             "scores regardless of token status.")
 
-    submissions = [s for s in participation.submissions
-                   if s.task is task and s.official]
     if len(submissions) == 0:
         return 0.0, False
 
@@ -169,11 +196,259 @@ def task_score(participation, task,
         score = _task_score_max_tokened_last(score_details_tokened)
     else:
         raise ValueError("Unknown score mode '%s'" % task.score_mode)
+    return score, partial
+
+
+# Stored task scores (see TaskScore).
+
+def update_task_scores(session, task, participation_ids=None):
+    """Compute and store the scores on a task of some participations.
+
+    The submissions are loaded with a single query. Participations
+    without official submissions on the task get no TaskScore (and
+    lose the one they had), as their score is trivially zero.
+
+    The row of the task is locked (SELECT ... FOR UPDATE) before
+    reading the submissions, and invalidate_task_scores locks it for
+    share: hence the scores stored here are computed from data that
+    includes every change committed, or still to be committed, by
+    whoever invalidated them concurrently. Inserting a submission of
+    the task waits for the lock too, because of its foreign key.
+
+    session (Session): the database session to use.
+    task (Task): the task.
+    participation_ids ([int]|None): the participations to update, or
+        None for all those with submissions or scores on the task.
+
+    return (int): the number of stored scores.
+
+    """
+    session.query(Task.id)\
+        .filter(Task.id == task.id)\
+        .with_for_update()\
+        .one()
+
+    # The submissions may already be in the session, loaded before
+    # taking the lock: their data must be read again.
+    query = session.query(Submission)\
+        .filter(Submission.task == task)\
+        .filter(Submission.official.is_(True))\
+        .options(joinedload(Submission.token))\
+        .options(joinedload(Submission.results))\
+        .populate_existing()
+    stored_query = session.query(TaskScore)\
+        .filter(TaskScore.task == task)
+    if participation_ids is not None:
+        participation_ids = list(participation_ids)
+        if len(participation_ids) == 0:
+            return 0
+        query = query.filter(
+            Submission.participation_id.in_(participation_ids))
+        stored_query = stored_query.filter(
+            TaskScore.participation_id.in_(participation_ids))
+
+    submissions = defaultdict(list)
+    for submission in query.all():
+        submissions[submission.participation_id].append(submission)
+    stored = dict((task_score.participation_id, task_score)
+                  for task_score in stored_query.all())
+
+    for participation_id in set(stored.keys()) - set(submissions.keys()):
+        session.delete(stored[participation_id])
+
+    for participation_id, participation_submissions \
+            in submissions.items():
+        stored_score = stored.get(participation_id)
+        if stored_score is None:
+            stored_score = TaskScore(participation_id=participation_id,
+                                     task=task)
+            session.add(stored_score)
+        stored_score.score, stored_score.partial = _task_score(
+            participation_submissions, task, False, False)
+        stored_score.public_score, stored_score.public_partial = \
+            _task_score(participation_submissions, task, True, False)
+        stored_score.tokened_score, stored_score.tokened_partial = \
+            _task_score(participation_submissions, task, False, True)
+        stored_score.last_update = make_datetime()
+
+    return len(submissions)
+
+
+def invalidate_task_scores(session, contest_id=None, participation_id=None,
+                           task_id=None, submission_id=None,
+                           dataset_id=None):
+    """Delete the stored scores that some change might make stale.
+
+    This must be called, in the same transaction, by anything changing
+    the data that task_score looks at without updating the scores, so
+    that they are computed again until they are stored again. It locks
+    the rows of the tasks involved for share until the end of the
+    transaction, so that update_task_scores cannot store scores that
+    miss the change (see there).
+
+    The arguments have the same meaning as in get_submission_results:
+    the scores are those of the participations and tasks of the
+    submissions that would be selected.
+
+    session (Session): the database session to use.
+    contest_id (int|None): id of the contest, or None.
+    participation_id (int|None): id of the participation, or None.
+    task_id (int|None): id of the task, or None.
+    submission_id (int|None): id of the submission, or None.
+    dataset_id (int|None): id of the dataset, or None.
+
+    """
+    if submission_id is not None:
+        submission = Submission.get_from_id(submission_id, session)
+        if submission is None:
+            return
+        participation_id = submission.participation_id
+        task_id = submission.task_id
+    elif dataset_id is not None and task_id is None:
+        dataset = Dataset.get_from_id(dataset_id, session)
+        if dataset is None:
+            return
+        task_id = dataset.task_id
+
+    task_query = session.query(Task.id)
+    if task_id is not None:
+        task_query = task_query.filter(Task.id == task_id)
+    elif participation_id is not None:
+        task_query = task_query.filter(Task.contest_id.in_(
+            session.query(Participation.contest_id)
+            .filter(Participation.id == participation_id)))
+    elif contest_id is not None:
+        task_query = task_query.filter(Task.contest_id == contest_id)
+    task_ids = [row.id for row in task_query
+                .order_by(Task.id)
+                .with_for_update(read=True)
+                .all()]
+    if len(task_ids) == 0:
+        return
+
+    query = session.query(TaskScore)\
+        .filter(TaskScore.task_id.in_(task_ids))
+    if participation_id is not None:
+        query = query.filter(TaskScore.participation_id == participation_id)
+    query.delete(synchronize_session=False)
+
+
+def get_task_score(session, participation, task,
+                   public=False, only_tokened=False, rounded=False):
+    """Return the score of a contest's user on a task.
+
+    Like task_score, but use the stored score if there is one.
+
+    session (Session): the database session to use.
+    participation (Participation): see task_score.
+    task (Task): see task_score.
+    public (bool): see task_score.
+    only_tokened (bool): see task_score.
+    rounded (bool): see task_score.
+
+    return ((float, bool)): see task_score.
+
+    """
+    stored = session.query(TaskScore)\
+        .filter(TaskScore.participation == participation)\
+        .filter(TaskScore.task == task)\
+        .first()
+    if stored is None:
+        # Preload all the information required to compute the score.
+        session.query(Submission)\
+            .filter(Submission.participation == participation)\
+            .filter(Submission.task == task)\
+            .options(joinedload(Submission.token))\
+            .options(joinedload(Submission.results))\
+            .all()
+        return task_score(participation, task, public=public,
+                          only_tokened=only_tokened, rounded=rounded)
+    score, partial = stored.get_score(public=public,
+                                      only_tokened=only_tokened)
     if rounded:
         score = round(score, task.score_precision)
     return score, partial
 
 
+def get_task_scores(session, contest, participation_ids=None,
+                    rounded=False):
+    """Return the scores of some participations on all tasks of a contest.
+
+    The stored scores are read with a query for each task, fetching
+    only the needed columns, and so are the participations having
+    official submissions on it: the others have no stored score, as it
+    is trivially zero. Only the remaining scores are computed, loading
+    the submissions on the task of a few participations at a time, so
+    that the memory used doesn't depend on the size of the contest
+    (apart from the returned scores).
+
+    session (Session): the database session to use.
+    contest (Contest): the contest.
+    participation_ids ([int]|None): the ids of the participations, or
+        None for all those of the contest.
+    rounded (bool): whether to round the scores to the score_precision
+        of their task.
+
+    return ({(int, int): (float, bool)}): for each pair of participation
+        id and task id, the score and whether it's partial.
+
+    """
+    if participation_ids is None:
+        participation_ids = [
+            participation_id for participation_id, in
+            session.query(Participation.id)
+            .filter(Participation.contest == contest)]
+
+    result = dict()
+    for task in contest.tasks:
+        stored = dict(
+            (participation_id, (score, partial))
+            for participation_id, score, partial
+            in session.query(TaskScore.participation_id,
+                             TaskScore.score, TaskScore.partial)
+            .filter(TaskScore.task == task))
+        with_submissions = set(
+            participation_id for participation_id,
+            in session.query(Submission.participation_id)
+            .filter(Submission.task == task)
+            .filter(Submission.official.is_(True))
+            .group_by(Submission.participation_id))
+
+        missing = list()
+        for participation_id in participation_ids:
+            if participation_id in stored:
+                result[(participation_id, task.id)] = \
+                    stored[participation_id]
+            elif participation_id in with_submissions:
+                missing.append(participation_id)
+            else:
+                result[(participation_id, task.id)] = (0.0, False)
+
+        for i in range(0, len(missing), MISSING_SCORES_CHUNK_SIZE):
+            chunk = missing[i:i + MISSING_SCORES_CHUNK_SIZE]
+            # Populate the submissions on the task, their tokens and
+            # results, all at once.
+            submissions = defaultdict(list)
+            for submission in session.query(Submission)\
+                    .filter(Submission.task == task)\
+                    .filter(Submission.official.is_(True))\
+                    .filter(Submission.participation_id.in_(chunk))\
+                    .options(joinedload(Submission.token))\
+                    .options(joinedload(Submission.results))\
+                    .all():
+                submissions[submission.participation_id].append(submission)
+            for participation_id in chunk:
+                result[(participation_id, task.id)] = _task_score(
+                    submissions[participation_id], task, False, False)
+
+    if rounded:
+        precisions = dict((task.id, task.score_precision)
+                          for task in contest.tasks)
+        for key, (score, partial) in result.items():
+            result[key] = (round(score, precisions[key[1]]), partial)
+    return result
+
+
 def _task_score_max_tokened_last(score_details_tokened):
     """Compute score using the "max tokened last" score mode.
 
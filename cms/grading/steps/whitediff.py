@@ -80,8 +80,8 @@ def _white_diff(output, res):
     'sequence of characters ending with \n or EOF and beginning right
     after BOF or \n'. In particular, every line has *at most* one \n.
 
-    output (file): the first file to compare.
-    res (file): the second file to compare.
+    output (file): the first file to compare (or a memory map of it).
+    res (file): the second file to compare (or a memory map of it).
     return (bool): True if the two file are equal as explained above.
 
     """
@@ -117,9 +117,10 @@ def white_diff_fobj_step(output_fobj, correct_output_fobj):
     identical (or differ just by white spaces) and 0.0 if they don't. Calling
     this function means that the output file exists.
 
-    output_fobj (fileobj): file for the user output, opened in binary mode.
+    output_fobj (fileobj): file for the user output, opened in binary mode
+        (or a memory map of it).
     correct_output_fobj (fileobj): file for the correct output, opened in
-        binary mode.
+        binary mode (or a memory map of it).
 
     return ((float, [str])): the outcome as above and a description text.
 
@@ -145,8 +146,8 @@ def white_diff_step(sandbox, output_filename, correct_output_filename):
 
     """
     if sandbox.file_exists(output_filename):
-        with sandbox.get_file(output_filename) as out_file, \
-                sandbox.get_file(correct_output_filename) as res_file:
+        with sandbox.get_file_mmap(output_filename) as out_file, \
+                sandbox.get_file_mmap(correct_output_filename) as res_file:
             return white_diff_fobj_step(out_file, res_file)
     else:
         return 0.0, [
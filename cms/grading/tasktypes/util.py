@@ -34,6 +34,7 @@ import os
 import shutil
 
 from cms import config
+from cms.db.filecacher import map_file
 from cms.grading import JobException
 from cms.grading.Job import CompilationJob, EvaluationJob
 from cms.grading.Sandbox import Sandbox
@@ -263,11 +264,12 @@ def eval_output(file_cacher, job, checker_codename,
 
     else:
         if user_output_path is not None:
-            user_output_fobj = open(user_output_path, "rb")
+            with open(user_output_path, "rb") as user_output_fobj:
+                user_output_view = map_file(user_output_fobj)
         else:
-            user_output_fobj = file_cacher.get_file(user_output_digest)
-        with user_output_fobj:
-            with file_cacher.get_file(job.output) as correct_output_fobj:
+            user_output_view = file_cacher.get_file_mmap(user_output_digest)
+        with user_output_view:
+            with file_cacher.get_file_mmap(job.output) as correct_output_view:
                 outcome, text = white_diff_fobj_step(
-                    user_output_fobj, correct_output_fobj)
+                    user_output_view, correct_output_view)
         return True, outcome, text
@@ -21,7 +21,8 @@
 
 __all__ = [
     # rpc
-    "RPCError", "rpc_method", "RemoteServiceServer", "RemoteServiceClient",
+    "RPCError", "rpc_method", "rpc_batch_method", "RemoteServiceServer",
+    "RemoteServiceClient",
     # service
     "Service",
     # triggeredservice
@@ -39,7 +40,8 @@ __all__ = [
 
 from .PsycoGevent import make_psycopg_green
 from .priorityqueue import FakeQueueItem, PriorityQueue, QueueEntry, QueueItem
-from .rpc import RPCError, rpc_method, RemoteServiceServer, RemoteServiceClient
+from .rpc import RPCError, rpc_method, rpc_batch_method, \
+    RemoteServiceServer, RemoteServiceClient
 from .service import Service
 from .triggeredservice import Executor, TriggeredService
 from .web_rpc import RPCMiddleware
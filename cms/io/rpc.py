@@ -21,9 +21,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import functools
+import itertools
 import json
 import logging
 import socket
+import struct
+import time
 import traceback
 import uuid
 from weakref import WeakSet
@@ -34,6 +37,7 @@ import gevent.lock
 import gevent.socket
 
 from cms import Address, get_service_address
+from .rpcstats import RPCStats
 
 
 logger = logging.getLogger(__name__)
@@ -57,6 +61,25 @@ def rpc_method(func):
     return func
 
 
+def rpc_batch_method(name):
+    """Decorator for a method handling many calls of a RPC at once.
+
+    When a batch of calls (see RemoteServiceClient.execute_rpc)
+    contains consecutive calls to the RPC method with the given name,
+    they are passed together to the decorated method, which must
+    return their results in the same order. This allows, for example,
+    to use a single database session for all of them.
+
+    name (str): the name of the RPC method whose calls are handled.
+    return (function): the decorator.
+
+    """
+    def decorator(func):
+        func.rpc_batch_of = name
+        return func
+    return decorator
+
+
 class RemoteServiceBase:
     """Base class for both ends of a RPC connection.
 
@@ -73,10 +96,37 @@ class RemoteServiceBase:
     When the state changes the on_connect or on_disconnect handlers
     will be fired.
 
+    Messages are exchanged using one of two protocols. In the JSON one,
+    understood by all peers, each message is a line terminated by
+    "\r\n". In the framed one, each message is preceded by its length,
+    which allows to send messages of any size without scanning them
+    for the terminator. Each connection starts with the JSON protocol
+    and switches to the framed one if the client asks for it as its
+    first request and the server agrees (see RemoteServiceClient).
+
     """
     # Incoming messages larger than 1 MiB are dropped to avoid DOS
-    # attacks. XXX Check that this size is sensible.
+    # attacks. XXX Check that this size is sensible. This only applies
+    # to the JSON protocol, framed messages have their own limit.
     MAX_MESSAGE_SIZE = 1024 * 1024
+    # Incoming frames announcing a larger length are refused before
+    # reading them, for the same reason.
+    MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+    PROTOCOL_JSON = "json"
+    PROTOCOL_FRAMED = "framed-v1"
+    # The protocols this end is willing to use, other than JSON.
+    SUPPORTED_PROTOCOLS = (PROTOCOL_FRAMED,)
+    # The pseudo-method used by the client to ask for a protocol.
+    NEGOTIATION_METHOD = "__negotiate"
+    # The pseudo-method used to send many calls in a single request.
+    BATCH_METHOD = "__batch"
+
+    # Frames start with the length of the message as an unsigned
+    # 64-bit big-endian integer. The message is then read and written
+    # in chunks, without holding the socket's buffers for too long.
+    FRAME_HEADER = struct.Struct(">Q")
+    FRAME_CHUNK_SIZE = 1024 * 1024
 
     def __init__(self, remote_address):
         """Prepare to handle a connection with the given remote address.
@@ -99,6 +149,8 @@ class RemoteServiceBase:
         self._read_lock = gevent.lock.RLock()
         self._write_lock = gevent.lock.RLock()
 
+        self._protocol = self.PROTOCOL_JSON
+
     @property
     def connected(self):
         """Return whether we're connected to the other endpoint.
@@ -150,8 +202,17 @@ class RemoteServiceBase:
             raise RuntimeError("Already connected.")
 
         self._socket = sock
+        # Messages are flushed whole, so there is no point in having
+        # the kernel wait to coalesce them: that would only delay
+        # requests sent while waiting for a response.
+        try:
+            self._socket.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
         self._reader = self._socket.makefile('rb')
         self._writer = self._socket.makefile('wb')
+        self._protocol = self.PROTOCOL_JSON
         self._connection_event.set()
         # IPv4 addresses have two elements (host and port), IPv6 ones
         # have 4 elements (host, port, flowinfo and scopeid). We will
@@ -213,10 +274,12 @@ class RemoteServiceBase:
     def _read(self):
         """Receive a message from the socket.
 
-        Read from the socket until a "\\r\\n" is found. That is what we
-        consider a "message" in the communication protocol.
+        With the JSON protocol, read from the socket until a "\\r\\n"
+        is found. With the framed one, read the length and then the
+        message. That is what we consider a "message" in the
+        communication protocol.
 
-        return (bytes): the retrieved message.
+        return (bytes): the retrieved message (empty at EOF).
 
         raise (OSError): if reading fails.
 
@@ -228,17 +291,10 @@ class RemoteServiceBase:
             with self._read_lock:
                 if not self.connected:
                     raise OSError("Not connected.")
-                data = self._reader.readline(self.MAX_MESSAGE_SIZE)
-                # If there weren't a "\r\n" between the last message
-                # and the EOF we would have a false positive here.
-                # Luckily there is one.
-                if len(data) > 0 and not data.endswith(b"\r\n"):
-                    logger.error(
-                        "The client sent a message larger than %d bytes (that "
-                        "is MAX_MESSAGE_SIZE). Consider raising that value if "
-                        "the message seemed legit.", self.MAX_MESSAGE_SIZE)
-                    self.finalize("Client misbehaving.")
-                    raise OSError("Message too long.")
+                if self._protocol == self.PROTOCOL_FRAMED:
+                    data = self._read_frame()
+                else:
+                    data = self._read_line()
         except OSError as error:
             if self.connected:
                 logger.warning("Failed reading from socket: %s.", error)
@@ -251,10 +307,66 @@ class RemoteServiceBase:
 
         return data
 
+    def _read_line(self):
+        """Read a message of the JSON protocol.
+
+        return (bytes): the message, including the terminator.
+
+        raise (OSError): if reading fails or the message is too long.
+
+        """
+        data = self._reader.readline(self.MAX_MESSAGE_SIZE)
+        # If there weren't a "\r\n" between the last message
+        # and the EOF we would have a false positive here.
+        # Luckily there is one.
+        if len(data) > 0 and not data.endswith(b"\r\n"):
+            logger.error(
+                "The client sent a message larger than %d bytes (that "
+                "is MAX_MESSAGE_SIZE). Consider raising that value if "
+                "the message seemed legit.", self.MAX_MESSAGE_SIZE)
+            self.finalize("Client misbehaving.")
+            raise OSError("Message too long.")
+        return data
+
+    def _read_frame(self):
+        """Read a message of the framed protocol.
+
+        The buffer grows as the data arrives, so a bogus length doesn't
+        cause a big allocation.
+
+        return (bytearray): the message.
+
+        raise (OSError): if reading fails or the message is too long.
+
+        """
+        header = self._reader.read(self.FRAME_HEADER.size)
+        if len(header) == 0:
+            return b""
+        if len(header) < self.FRAME_HEADER.size:
+            raise OSError("Connection closed in the middle of a frame.")
+        length, = self.FRAME_HEADER.unpack(header)
+        if length > self.MAX_FRAME_SIZE:
+            logger.error(
+                "The client sent a frame of %d bytes, larger than %d "
+                "bytes (that is MAX_FRAME_SIZE). Consider raising that "
+                "value if the message seemed legit.", length,
+                self.MAX_FRAME_SIZE)
+            self.finalize("Client misbehaving.")
+            raise OSError("Message too long.")
+        data = bytearray()
+        while len(data) < length:
+            chunk = self._reader.read(
+                min(self.FRAME_CHUNK_SIZE, length - len(data)))
+            if len(chunk) == 0:
+                raise OSError("Connection closed in the middle of a frame.")
+            data += chunk
+        return data
+
     def _write(self, data):
         """Send a message to the socket.
 
-        Automatically append "\\r\\n" to make it a correct message.
+        With the JSON protocol, automatically append "\\r\\n" to make
+        it a correct message; with the framed one, prepend its length.
 
         data (bytes): the message to transmit.
 
@@ -264,7 +376,8 @@ class RemoteServiceBase:
         if not self.connected:
             raise OSError("Not connected.")
 
-        if len(data + b'\r\n') > self.MAX_MESSAGE_SIZE:
+        if self._protocol == self.PROTOCOL_JSON \
+                and len(data) + 2 > self.MAX_MESSAGE_SIZE:
             logger.error(
                 "A message wasn't sent to %r because it was larger than %d "
                 "bytes (that is MAX_MESSAGE_SIZE). Consider raising that "
@@ -272,13 +385,31 @@ class RemoteServiceBase:
                 self.MAX_MESSAGE_SIZE)
             # No need to call finalize.
             raise OSError("Message too long.")
+        if self._protocol == self.PROTOCOL_FRAMED \
+                and len(data) > self.MAX_FRAME_SIZE:
+            logger.error(
+                "A message wasn't sent to %r because it was larger than %d "
+                "bytes (that is MAX_FRAME_SIZE). Consider raising that "
+                "value if the message seemed legit.", self._repr_remote(),
+                self.MAX_FRAME_SIZE)
+            raise OSError("Message too long.")
 
         try:
             with self._write_lock:
                 if not self.connected:
                     raise OSError("Not connected.")
-                # Does the same as self._socket.sendall.
-                self._writer.write(data + b'\r\n')
+                # Does the same as self._socket.sendall, but we avoid
+                # concatenating the message with anything, as it might
+                # be big.
+                if self._protocol == self.PROTOCOL_FRAMED:
+                    self._writer.write(self.FRAME_HEADER.pack(len(data)))
+                    view = memoryview(data)
+                    for start in range(0, len(data), self.FRAME_CHUNK_SIZE):
+                        self._writer.write(
+                            view[start:start + self.FRAME_CHUNK_SIZE])
+                else:
+                    self._writer.write(data)
+                    self._writer.write(b'\r\n')
                 self._writer.flush()
         except OSError as error:
             self.finalize("Write failed.")
@@ -296,20 +427,27 @@ class RemoteServiceServer(RemoteServiceBase):
     the reader loop should be started by calling run.
 
     """
-    def __init__(self, local_service, remote_address):
+    def __init__(self, local_service, remote_address, stats=None):
         """Create a responder for the given service.
 
         local_service (Service): the object whose methods should be
             called via RPC.
+        stats (RPCStats|None): where to record the calls served, if
+            anywhere (it is usually shared by all the connections).
 
         For other arguments see RemoteServiceBase.
 
         """
         super().__init__(remote_address)
         self.local_service = local_service
+        self.stats = stats
 
         self.pending_incoming_requests_threads = WeakSet()
 
+        # Map from RPC method names to their batch handlers, computed
+        # when the first batch arrives.
+        self._batch_handlers = None
+
     def finalize(self, reason=""):
         """See RemoteServiceBase.finalize."""
         super().finalize(reason)
@@ -332,6 +470,7 @@ class RemoteServiceServer(RemoteServiceBase):
         it's therefore advisable to spawn a greenlet to call it.
 
         """
+        first = True
         while True:
             try:
                 data = self._read()
@@ -342,8 +481,54 @@ class RemoteServiceServer(RemoteServiceBase):
                 self.finalize("Connection closed.")
                 break
 
+            # The protocol can only be negotiated with the first
+            # message, and we need to switch to it before reading the
+            # next one, hence this is done synchronously.
+            if first:
+                first = False
+                if self.negotiate(data):
+                    continue
+
             gevent.spawn(self.process_data, data)
 
+    def negotiate(self, data):
+        """Handle the message if it is a protocol negotiation request.
+
+        Reply with the first of the protocols proposed by the client
+        that we support (or JSON if none), and switch to it.
+
+        data (bytes): the first message read from the socket.
+
+        return (bool): whether the message was a negotiation request.
+
+        """
+        if self.NEGOTIATION_METHOD.encode('utf-8') not in data \
+                or not self.SUPPORTED_PROTOCOLS:
+            return False
+        try:
+            request = json.loads(data.decode('utf-8'))
+            if request["__method"] != self.NEGOTIATION_METHOD:
+                return False
+            id_ = request["__id"]
+            proposed = request["__data"]["protocols"]
+        except (ValueError, TypeError, KeyError):
+            return False
+
+        protocol = next((p for p in proposed
+                         if p in self.SUPPORTED_PROTOCOLS),
+                        self.PROTOCOL_JSON)
+        response = {"__id": id_,
+                    "__data": protocol,
+                    "__error": None}
+        try:
+            self._write(json.dumps(response).encode('utf-8'))
+        except OSError:
+            return True
+        self._protocol = protocol
+        logger.debug("Using protocol %s with %s.",
+                     protocol, self._repr_remote())
+        return True
+
     def process_data(self, data):
         """Handle the message.
 
@@ -361,15 +546,129 @@ class RemoteServiceServer(RemoteServiceBase):
             logger.warning("Cannot parse incoming message, discarding.")
             return
 
-        self.process_incoming_request(message)
+        self.process_incoming_request(message, len(data))
+
+    def execute_method(self, method_name, data):
+        """Execute a method of the local service.
+
+        method_name (str): the name of the method.
+        data (dict): the keyword arguments to pass to it.
+
+        return ((object, str|None)): the value returned by the method
+            and the error (None if successful).
+
+        """
+        if not hasattr(self.local_service, method_name):
+            return None, "Method %s doesn't exist." % method_name
+
+        method = getattr(self.local_service, method_name)
+        if not getattr(method, "rpc_callable", False):
+            return None, "Method %s isn't callable." % method_name
+
+        try:
+            return method(**data), None
+        except Exception as error:
+            return None, "%s: %s\n%s" % \
+                (error.__class__.__name__, error, traceback.format_exc())
+
+    def execute_batch(self, calls):
+        """Execute a batch of calls of methods of the local service.
+
+        Runs of consecutive calls to a method with a batch handler (see
+        rpc_batch_method) are passed to it at once, if the method is
+        callable; the other calls are executed one at a time.
 
-    def process_incoming_request(self, request):
+        Each call is recorded in the statistics under its own method
+        (the batch request itself is not, so that the calls and their
+        time are not counted twice); process_incoming_request then
+        splits the traffic of the batch evenly among them.
+
+        calls ([(str, dict)]): the method names and keyword arguments
+            of the calls.
+
+        return ([(object, str|None)]): for each call, the returned
+            value and the error (None if successful).
+
+        """
+        results = []
+        for method_name, group in itertools.groupby(
+                calls, key=lambda call: call[0]):
+            data = [call[1] for call in group]
+            handler = self._get_batch_handler(method_name)
+            if handler is None or len(data) == 1:
+                for item in data:
+                    start = time.monotonic()
+                    value, error = self.execute_method(method_name, item)
+                    self._record(method_name, time.monotonic() - start,
+                                 error is not None)
+                    results.append((value, error))
+                continue
+            start = time.monotonic()
+            try:
+                values = handler(data)
+                if len(values) != len(data):
+                    raise ValueError(
+                        "Batch handler returned %d results for %d calls."
+                        % (len(values), len(data)))
+            except Exception as error:
+                error = "%s: %s\n%s" % \
+                    (error.__class__.__name__, error, traceback.format_exc())
+                group_results = [(None, error) for _ in data]
+            else:
+                group_results = [(value, None) for value in values]
+            # Each call is accounted an equal share of the time.
+            duration = (time.monotonic() - start) / len(data)
+            for _, error in group_results:
+                self._record(method_name, duration, error is not None)
+            results.extend(group_results)
+        return results
+
+    def _record(self, method_name, duration, error, bytes_in=0,
+                bytes_out=0):
+        """Record a call in the statistics, if we keep them.
+
+        method_name (str): the name of the method called.
+        duration (float): how long the call took, in seconds.
+        error (bool): whether the call failed.
+        bytes_in (int): the size of the request.
+        bytes_out (int): the size of the response.
+
+        """
+        if self.stats is not None:
+            self.stats.record(method_name, duration, error, bytes_in,
+                              bytes_out)
+
+    def _get_batch_handler(self, method_name):
+        """Return the batch handler for the given RPC method, if any.
+
+        method_name (str): the name of the RPC method.
+
+        return (function|None): the bound batch handler, or None if
+            the service has none or the method isn't RPC callable.
+
+        """
+        if self._batch_handlers is None:
+            self._batch_handlers = dict()
+            service_class = type(self.local_service)
+            for name in dir(service_class):
+                batch_of = getattr(
+                    getattr(service_class, name, None), "rpc_batch_of", None)
+                if batch_of is not None:
+                    self._batch_handlers[batch_of] = \
+                        getattr(self.local_service, name)
+        method = getattr(self.local_service, method_name, None)
+        if not getattr(method, "rpc_callable", False):
+            return None
+        return self._batch_handlers.get(method_name)
+
+    def process_incoming_request(self, request, size=0):
         """Handle the request.
 
         Parse the request, execute the method it asks for, format the
         result and send the response.
 
         request (dict): the JSON-decoded request.
+        size (int): the size of the encoded request.
 
         """
         # Validate the request.
@@ -390,29 +689,45 @@ class RemoteServiceServer(RemoteServiceBase):
                     "__error": None}
 
         method_name = request["__method"]
+        start = time.monotonic()
+        # The calls of a well-formed batch are recorded by
+        # execute_batch, each under its own method.
+        batch_calls = None
 
-        if not hasattr(self.local_service, method_name):
-            response["__error"] = "Method %s doesn't exist." % method_name
-        else:
-            method = getattr(self.local_service, method_name)
-
-            if not getattr(method, "rpc_callable", False):
-                response["__error"] = "Method %s isn't callable." % method_name
+        if method_name == self.BATCH_METHOD:
+            try:
+                response["__data"] = self.execute_batch(
+                    request["__data"]["calls"])
+            except (TypeError, ValueError, KeyError):
+                response["__error"] = "Malformed batch."
             else:
-                try:
-                    response["__data"] = method(**request["__data"])
-                except Exception as error:
-                    response["__error"] = "%s: %s\n%s" % \
-                        (error.__class__.__name__, error,
-                         traceback.format_exc())
+                batch_calls = request["__data"]["calls"]
+        else:
+            response["__data"], response["__error"] = \
+                self.execute_method(method_name, request["__data"])
 
         # Encode it.
         try:
             data = json.dumps(response).encode('utf-8')
         except (TypeError, ValueError):
             logger.warning("JSON encoding failed.", exc_info=True)
+            if batch_calls is None:
+                self._record(method_name, time.monotonic() - start, True,
+                             size)
             return
 
+        if batch_calls is None:
+            self._record(method_name, time.monotonic() - start,
+                         response["__error"] is not None, size, len(data))
+        elif self.stats is not None:
+            # Each call is accounted an equal share of the traffic.
+            count = len(batch_calls)
+            for i, (call_method, _) in enumerate(batch_calls):
+                self.stats.add_bytes(
+                    call_method,
+                    size * (i + 1) // count - size * i // count,
+                    len(data) * (i + 1) // count - len(data) * i // count)
+
         # Send it.
         try:
             self._write(data)
@@ -435,6 +750,11 @@ class RemoteServiceClient(RemoteServiceBase):
     the reader loop should be started by calling run.
 
     """
+    # Batched calls (see execute_rpc) are sent after waiting this long
+    # (in seconds) for more, or as soon as there are this many.
+    BATCH_WINDOW = 0.01
+    MAX_BATCH_SIZE = 1000
+
     def __init__(self, remote_service_coord, auto_retry=None):
         """Create a caller for the service at the given coords.
 
@@ -459,20 +779,68 @@ class RemoteServiceClient(RemoteServiceBase):
 
         self._loop = None
 
+        # Set when requests can be sent, i.e., when the protocol of the
+        # current connection has been agreed upon.
+        self._negotiated = gevent.event.Event()
+        self._negotiation_id = None
+
+        # The calls waiting to be sent in the next batch, as tuples of
+        # method name, keyword arguments and AsyncResult.
+        self._batch = list()
+
+        # The round trips of the calls issued, and, for each pending
+        # request, when it was sent and its size.
+        self.stats = RPCStats()
+        self._pending_outgoing_requests_sent = dict()
+
     def _repr_remote(self):
         """See RemoteServiceBase._repr_remote."""
         return "%s:%d (%r)" % (self.remote_address +
                                (self.remote_service_coord,))
 
+    def initialize(self, sock, plus):
+        """See RemoteServiceBase.initialize.
+
+        Also propose to the server to switch to a better protocol
+        (which old servers will answer with an error). Until the
+        server's answer arrives, requests are held back.
+
+        """
+        self._negotiated.clear()
+        super().initialize(sock, plus)
+
+        if not self.SUPPORTED_PROTOCOLS:
+            self._negotiated.set()
+            return
+
+        self._negotiation_id = uuid.uuid4().hex
+        request = {"__id": self._negotiation_id,
+                   "__method": self.NEGOTIATION_METHOD,
+                   "__data": {"protocols": list(self.SUPPORTED_PROTOCOLS)}}
+        try:
+            self._write(json.dumps(request).encode('utf-8'))
+        except OSError:
+            # Log messages have already been produced.
+            pass
+
     def finalize(self, reason=""):
         """See RemoteServiceBase.finalize."""
         super().finalize(reason)
 
-        for result in self.pending_outgoing_requests_results.values():
+        # Wake up the requests waiting for the negotiation, they will
+        # then fail as we are not connected.
+        self._negotiation_id = None
+        self._negotiated.set()
+
+        for id_, result in self.pending_outgoing_requests_results.items():
             result.set_exception(RPCError(reason))
+            sent, request_size = self._pending_outgoing_requests_sent[id_]
+            self.stats.record(self.pending_outgoing_requests[id_]["__method"],
+                              time.monotonic() - sent, True, 0, request_size)
 
         self.pending_outgoing_requests.clear()
         self.pending_outgoing_requests_results.clear()
+        self._pending_outgoing_requests_sent.clear()
 
     def _connect(self):
         """Establish a connection and initialize that socket.
@@ -549,8 +917,42 @@ class RemoteServiceClient(RemoteServiceBase):
                 self.finalize("Connection closed.")
                 break
 
+            # The answer to the negotiation is the first message, and
+            # we need to switch protocol before reading the next one.
+            if self._negotiation_id is not None:
+                self.process_negotiation_response(data)
+                continue
+
             gevent.spawn(self.process_data, data)
 
+    def process_negotiation_response(self, data):
+        """Switch to the protocol chosen by the server.
+
+        Servers that don't support negotiation reply with an error, in
+        which case we stay with JSON.
+
+        data (bytes): the first message read from the socket.
+
+        """
+        protocol = self.PROTOCOL_JSON
+        try:
+            response = json.loads(data.decode('utf-8'))
+            if response["__id"] != self._negotiation_id:
+                raise ValueError("Unexpected response.")
+        except (ValueError, TypeError, KeyError):
+            self.disconnect("Bad response received")
+            logger.warning("Cannot parse negotiation response.")
+            return
+        if response.get("__error") is None \
+                and response.get("__data") in self.SUPPORTED_PROTOCOLS:
+            protocol = response["__data"]
+
+        self._protocol = protocol
+        self._negotiation_id = None
+        self._negotiated.set()
+        logger.debug("Using protocol %s with %s.",
+                     protocol, self._repr_remote())
+
     def process_data(self, data):
         """Handle the message.
 
@@ -568,15 +970,16 @@ class RemoteServiceClient(RemoteServiceBase):
             logger.warning("Cannot parse incoming message, discarding.")
             return
 
-        self.process_incoming_response(message)
+        self.process_incoming_response(message, len(data))
 
-    def process_incoming_response(self, response):
+    def process_incoming_response(self, response, size=0):
         """Handle the response.
 
         Parse the response, determine the request it's for and its
         associated result and fill it.
 
         response (dict): the JSON-decoded response.
+        size (int): the size of the encoded response.
 
         """
         # Validate the response.
@@ -596,6 +999,10 @@ class RemoteServiceClient(RemoteServiceBase):
         result = self.pending_outgoing_requests_results.pop(id_)
         error = response["__error"]
 
+        sent, request_size = self._pending_outgoing_requests_sent.pop(id_)
+        self.stats.record(request["__method"], time.monotonic() - sent,
+                          error is not None, size, request_size)
+
         if error is not None:
             err_msg = "%s signaled RPC for method %s was unsuccessful: %s." % (
                 self.remote_service_coord, request["__method"], error)
@@ -604,16 +1011,61 @@ class RemoteServiceClient(RemoteServiceBase):
         else:
             result.set(response["__data"])
 
-    def execute_rpc(self, method, data):
+    def execute_rpc(self, method, data, batch=False):
         """Send an RPC request to the remote service.
 
+        Batched calls are not sent immediately, but collected for a
+        short while (see BATCH_WINDOW) and then sent in a single
+        request, if the remote service supports it. This is meant for
+        calls whose result is not waited for, as it delays them, and
+        they may be executed after calls issued later without batching.
+
         method (string): the name of the method to call.
         data (dict): keyword arguments to pass to the methods.
+        batch (bool): whether the call can be batched with others.
 
         return (AsyncResult): an object that holds (or will hold) the
             result of the call, either the value or the error that
             prevented successful completion.
 
+        """
+        result = gevent.event.AsyncResult()
+
+        if not batch:
+            self._execute(method, data, result)
+        else:
+            self._batch.append((method, data, result))
+            if len(self._batch) >= self.MAX_BATCH_SIZE:
+                gevent.spawn(self._flush_batch)
+            elif len(self._batch) == 1:
+                gevent.spawn_later(self.BATCH_WINDOW, self._flush_batch)
+
+        return result
+
+    def _execute(self, method, data, result):
+        """Send an RPC request, reporting encoding errors in result.
+
+        method (string): the name of the method to call.
+        data (dict): keyword arguments to pass to the methods.
+        result (AsyncResult): the object that will hold the result.
+
+        """
+        try:
+            self._send_request(method, data, result)
+        except (TypeError, ValueError):
+            logger.error("JSON encoding failed.", exc_info=True)
+            result.set_exception(RPCError("JSON encoding failed."))
+
+    def _send_request(self, method, data, result):
+        """Send an RPC request to the remote service.
+
+        method (string): the name of the method to call.
+        data (dict): keyword arguments to pass to the methods.
+        result (AsyncResult): the object that will hold the result.
+
+        raise (TypeError, ValueError): if the request cannot be
+            encoded (in which case result is left untouched).
+
         """
         # Determine the ID.
         id_ = uuid.uuid4().hex
@@ -623,28 +1075,87 @@ class RemoteServiceClient(RemoteServiceBase):
                    "__method": method,
                    "__data": data}
 
-        result = gevent.event.AsyncResult()
-
         # Encode it.
-        try:
-            data = json.dumps(request).encode('utf-8')
-        except (TypeError, ValueError):
-            logger.error("JSON encoding failed.", exc_info=True)
-            result.set_exception(RPCError("JSON encoding failed."))
-            return result
+        data = json.dumps(request).encode('utf-8')
 
-        # Send it.
+        # Send it, once we know how.
+        if self.connected:
+            self._negotiated.wait()
+        sent = time.monotonic()
         try:
             self._write(data)
         except OSError:
             result.set_exception(RPCError("Write failed."))
-            return result
+            return
 
         # Store it.
         self.pending_outgoing_requests[id_] = request
         self.pending_outgoing_requests_results[id_] = result
+        self._pending_outgoing_requests_sent[id_] = (sent, len(data))
 
-        return result
+    def _flush_batch(self):
+        """Send the calls collected so far.
+
+        They are sent in a single request if the remote service is
+        able to handle it (that is, if it speaks the framed protocol),
+        otherwise one by one.
+
+        """
+        calls, self._batch = self._batch, list()
+        if len(calls) == 0:
+            return
+
+        if self.connected:
+            self._negotiated.wait()
+
+        if len(calls) > 1 and self._protocol == self.PROTOCOL_FRAMED:
+            batch_result = gevent.event.AsyncResult()
+            try:
+                self._send_request(
+                    self.BATCH_METHOD,
+                    {"calls": [[method, data] for method, data, _ in calls]},
+                    batch_result)
+            except (TypeError, ValueError):
+                # Sending them one by one makes only the culprit fail.
+                pass
+            else:
+                batch_result.rawlink(
+                    functools.partial(self._process_batch_result, calls))
+                return
+
+        for method, data, result in calls:
+            self._execute(method, data, result)
+
+    def _process_batch_result(self, calls, batch_result):
+        """Fill the results of the calls of a batch.
+
+        calls ([(str, dict, AsyncResult)]): the calls of the batch.
+        batch_result (AsyncResult): the result of the batch request,
+            holding the value and error of each call.
+
+        """
+        if not batch_result.successful():
+            for _, _, result in calls:
+                result.set_exception(batch_result.exception)
+            return
+
+        values = batch_result.value
+        if len(values) != len(calls):
+            logger.error(
+                "%s replied to a batch of %d calls with %d results.",
+                self.remote_service_coord, len(calls), len(values))
+        for _, _, result in calls[len(values):]:
+            result.set_exception(
+                RPCError("Missing result in the batch reply."))
+
+        for (method, _, result), (value, error) in zip(calls, values):
+            if error is not None:
+                logger.error(
+                    "%s signaled RPC for method %s was unsuccessful: %s.",
+                    self.remote_service_coord, method, error)
+                result.set_exception(RPCError(error))
+            else:
+                result.set(value)
 
     def __getattr__(self, method):
         """Syntactic sugar to enable a transparent proxy.
@@ -658,7 +1169,9 @@ class RemoteServiceClient(RemoteServiceBase):
         call to the returned function to be notified when the RPC ends.
         The callback should be a callable able to receive the data and
         (optionally) the plus object as positional args and the error
-        as a keyword arg. It will be run in a dedicated greenlet.
+        as a keyword arg. It will be run in a dedicated greenlet. A
+        "batch" item set to True allows the call to be batched (see
+        execute_rpc).
 
         method (string): the name of the accessed method.
         return (function): a proxy to a RPC.
@@ -694,7 +1207,8 @@ class RemoteServiceClient(RemoteServiceBase):
             """
             callback = data.pop("callback", None)
             plus = data.pop("plus", None)
-            result = self.execute_rpc(method=method, data=data)
+            batch = data.pop("batch", False)
+            result = self.execute_rpc(method=method, data=data, batch=batch)
             if callback is not None:
                 callback = functools.partial(run_callback, callback, plus)
                 result.rawlink(functools.partial(gevent.spawn, callback))
@@ -728,6 +1242,8 @@ class FakeRemoteServiceClient(RemoteServiceClient):
         self.remote_service_coord = remote_service_coord
         self.pending_outgoing_requests = dict()
         self.pending_outgoing_requests_results = dict()
+        self._pending_outgoing_requests_sent = dict()
+        self.stats = RPCStats()
         self.auto_retry = auto_retry
 
     def connect(self):
@@ -738,7 +1254,7 @@ class FakeRemoteServiceClient(RemoteServiceClient):
         """Do nothing, as this is a fake client."""
         return True
 
-    def execute_rpc(self, method, data):
+    def execute_rpc(self, method, data, batch=False):
         """Just return an AsyncResult encoding an error."""
         result = gevent.event.AsyncResult()
         result.set_exception(
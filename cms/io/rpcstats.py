@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Counters and latency histograms for RPC methods.
+
+All structures have a fixed size, independent of the number of calls
+recorded, so that they can be kept for the whole life of a service.
+
+"""
+
+import bisect
+import time
+
+
+class Histogram:
+    """A histogram of durations with exponentially growing buckets.
+
+    """
+    # The upper bounds (in seconds) of the buckets, from 100us to
+    # about 52s; a last bucket holds the larger values.
+    BOUNDS = tuple(0.0001 * 2 ** i for i in range(20))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """Record a duration.
+
+        value (float): the duration, in seconds.
+
+        """
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        """Return an upper bound for the given percentile.
+
+        fraction (float): the percentile, between 0 and 1.
+
+        return (float|None): the upper bound of the bucket containing
+            the percentile (the maximum, for the last bucket), or None
+            if there are no values.
+
+        """
+        count = sum(self.counts)
+        if count == 0:
+            return None
+        threshold = fraction * count
+        seen = 0
+        for bound, bucket_count in zip(self.BOUNDS, self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return min(bound, self.max)
+        return self.max
+
+    def export(self):
+        """Return a JSON-encodable summary of the histogram.
+
+        return (dict): the bucket bounds and counts, the sum and the
+            maximum of the values, and the median and 99th percentile.
+
+        """
+        return {
+            "bounds": list(self.BOUNDS),
+            "counts": list(self.counts),
+            "total": self.total,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+        }
+
+
+class MethodStats:
+    """Statistics about the calls of a single RPC method.
+
+    """
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.durations = Histogram()
+
+    def export(self):
+        """Return a JSON-encodable version of the statistics.
+
+        return (dict): the counters and the histogram of durations.
+
+        """
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "durations": self.durations.export(),
+        }
+
+
+class RPCStats:
+    """Statistics about the RPC methods served or called by a service.
+
+    For a server the durations are the time spent in the handlers, for
+    a client they are round-trip times.
+
+    """
+    # Method names come from the other end of the connection, so we
+    # bound how many we keep track of; the calls to the other methods
+    # are counted together.
+    MAX_METHODS = 256
+    OTHER_METHODS = "(other)"
+
+    def __init__(self):
+        self.since = time.time()
+        self.methods = dict()
+
+    def record(self, method, duration, error=False, bytes_in=0,
+               bytes_out=0):
+        """Record a call.
+
+        method (str): the name of the method.
+        duration (float): how long the call took, in seconds.
+        error (bool): whether the call failed.
+        bytes_in (int): the size of the received message.
+        bytes_out (int): the size of the sent message.
+
+        """
+        stats = self.methods.get(method)
+        if stats is None:
+            if len(self.methods) >= self.MAX_METHODS:
+                method = self.OTHER_METHODS
+            stats = self.methods.setdefault(method, MethodStats())
+        stats.calls += 1
+        if error:
+            stats.errors += 1
+        stats.bytes_in += bytes_in
+        stats.bytes_out += bytes_out
+        stats.durations.add(duration)
+
+    def add_bytes(self, method, bytes_in=0, bytes_out=0):
+        """Account some traffic to a method, without counting a call.
+
+        method (str): the name of the method.
+        bytes_in (int): the size of the received data.
+        bytes_out (int): the size of the sent data.
+
+        """
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods.get(self.OTHER_METHODS)
+        if stats is not None:
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+
+    def export(self):
+        """Return a JSON-encodable version of the statistics.
+
+        return (dict): the time since the statistics are collected and
+            the statistics of each method (see MethodStats.export).
+
+        """
+        return {
+            "since": self.since,
+            "methods": dict((method, stats.export())
+                            for method, stats in self.methods.items()),
+        }
@@ -46,6 +46,7 @@ from cms.log import root_logger, shell_handler, ServiceFilter, \
     DetailedFormatter, LogServiceHandler, FileHandler
 from .rpc import rpc_method, RemoteServiceServer, RemoteServiceClient, \
     FakeRemoteServiceClient
+from .rpcstats import RPCStats
 
 
 logger = logging.getLogger(__name__)
@@ -87,6 +88,9 @@ class Service:
         # Dictionaries of (to be) connected RemoteServiceClients.
         self.remote_services = {}
 
+        # Statistics of the RPCs served, for all connections.
+        self._rpc_stats = RPCStats()
+
         self.initialize_logging()
 
         # We setup the listening address for services which want to
@@ -159,7 +163,8 @@ class Service:
 
         """
         address = Address(address[0], address[1])
-        remote_service = RemoteServiceServer(self, address)
+        remote_service = RemoteServiceServer(self, address,
+                                             stats=self._rpc_stats)
         remote_service.handle(sock)
 
     def connect_to(self, coord, on_connect=None, on_disconnect=None,
@@ -343,6 +348,22 @@ class Service:
         """
         return string
 
+    @rpc_method
+    def rpc_stats(self):
+        """Return statistics about the RPCs served and issued.
+
+        return (dict): the statistics of the RPCs served, under
+            "server", and of those issued to each remote service (as
+            "name,shard"), under "clients" (see RPCStats.export).
+
+        """
+        return {
+            "server": self._rpc_stats.export(),
+            "clients": dict(("%s,%d" % coord, service.stats.export())
+                            for coord, service
+                            in self.remote_services.items()),
+        }
+
     @rpc_method
     def quit(self, reason=""):
         """Shut down the service
@@ -45,7 +45,11 @@
 
 import logging
 import sys
+import time
+from collections import deque
 
+import gevent
+import gevent.event
 import gevent.lock
 
 from cmscommon.terminal import colors, add_color_to_string, has_color_support
@@ -98,7 +102,19 @@ class LogServiceHandler(logging.Handler):
     For args, we just format them into msg to produce the message. We
     then store the message as msg and drop args.
 
+    Records are not sent one by one: they are put in a buffer, which a
+    background greenlet ships in batches to LogService. When the buffer
+    is full, records below WARNING are dropped (and counted); the others
+    are dropped only when the buffer reaches twice its size.
+
     """
+    # Maximum number of records waiting to be shipped.
+    MAX_QUEUE_SIZE = 10000
+    # Maximum number of records shipped in a single RPC.
+    BATCH_SIZE = 500
+    # How long (in seconds) to wait for more records before shipping.
+    SHIP_INTERVAL = 0.1
+
     def __init__(self, log_service):
         """Initialize the handler.
 
@@ -110,6 +126,14 @@ class LogServiceHandler(logging.Handler):
         logging.Handler.__init__(self)
         self._log_service = log_service
 
+        self._queue = deque()
+        self._queue_not_empty = gevent.event.Event()
+        self._shipper = None
+        # Number of records dropped because the buffer was full, in
+        # total and since the last report.
+        self.dropped = 0
+        self._dropped_unreported = 0
+
     def createLock(self):
         """Set self.lock to a new gevent RLock.
 
@@ -117,7 +141,7 @@ class LogServiceHandler(logging.Handler):
         self.lock = gevent.lock.RLock()
 
     def emit(self, record):
-        """Pickle and emit a record to LogService.
+        """Pickle and enqueue a record to be sent to LogService.
 
         Taken from CPython's SocketHandler (see link in the file header),
         combining emit and makePickle, and adapted to not pickle the dictionary
@@ -125,6 +149,12 @@ class LogServiceHandler(logging.Handler):
 
         """
         try:
+            if len(self._queue) >= self.MAX_QUEUE_SIZE and \
+                    (record.levelno < logging.WARNING
+                     or len(self._queue) >= 2 * self.MAX_QUEUE_SIZE):
+                self.dropped += 1
+                self._dropped_unreported += 1
+                return
             ei = record.exc_info
             if ei:
                 # just to get traceback text into record.exc_text ...
@@ -138,10 +168,74 @@ class LogServiceHandler(logging.Handler):
             d['exc_info'] = None
             # Issue #25685: delete 'message' if present: redundant with 'msg'
             d.pop('message', None)
-            self._log_service.Log(**d)
+            self._queue.append(d)
+            self._queue_not_empty.set()
+            if self._shipper is None:
+                self._shipper = gevent.spawn(self._ship_forever)
         except Exception:
             self.handleError(record)
 
+    def flush(self):
+        """Send all buffered records, without waiting for LogService.
+
+        """
+        while self._queue or self._dropped_unreported > 0:
+            self._ship_batch()
+
+    def _ship_forever(self):
+        """Ship the buffered records as they arrive.
+
+        Wait for each batch to be acknowledged before shipping the next
+        one, so that the buffer fills when LogService falls behind.
+
+        """
+        while True:
+            self._queue_not_empty.wait()
+            gevent.sleep(self.SHIP_INTERVAL)
+            while self._queue or self._dropped_unreported > 0:
+                self._ship_batch().wait()
+            self._queue_not_empty.clear()
+
+    def _ship_batch(self):
+        """Send the oldest buffered records to LogService.
+
+        return (AsyncResult): the result of the RPC.
+
+        """
+        records = [self._queue.popleft()
+                   for _ in range(min(self.BATCH_SIZE, len(self._queue)))]
+        if self._dropped_unreported > 0:
+            records.append(self._make_dropped_record())
+            self._dropped_unreported = 0
+        result = self._log_service.LogBatch(records=records)
+        if self._log_service.connected and result.ready() \
+                and not result.successful():
+            # The RPC failed while connected, hence before being sent
+            # because some record cannot be encoded: send them one by
+            # one to lose only those.
+            for record in records:
+                self._log_service.Log(**record)
+        return result
+
+    def _make_dropped_record(self):
+        """Return a record reporting how many records were dropped.
+
+        return (dict): the attributes of the record.
+
+        """
+        record = logging.makeLogRecord({
+            "name": __name__,
+            "levelno": logging.WARNING,
+            "levelname": logging.getLevelName(logging.WARNING),
+            "msg": "%d log records were dropped because the buffer to "
+                   "LogService was full." % self._dropped_unreported,
+        })
+        for filter_ in self.filters:
+            filter_.filter(record)
+        d = dict(record.__dict__)
+        d['args'] = None
+        return d
+
 
 def get_color_hash(string):
     """Deterministically return a color based on the string's content.
@@ -352,6 +446,145 @@ class ServiceFilter(logging.Filter):
         return True
 
 
+class _CallSite:
+    """The state of a call site of a logger with a RateLimitFilter."""
+
+    def __init__(self):
+        # Number of records seen from this call site.
+        self.seen = 0
+        # End of the current window and records let through in it.
+        self.window_end = 0.0
+        self.passed = 0
+        # Records suppressed and not yet reported, and the last one.
+        self.suppressed = 0
+        self.last_suppressed = None
+        self.report = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Limit the number of records each call site of a logger emits.
+
+    The filter is meant to be attached to a logger (not to a handler),
+    so that suppressed records are dropped before being formatted.
+    Records from the same call site (same file and line) are first
+    sampled, keeping one out of every "sample", and then rate limited,
+    keeping at most "rate" of them every "period" seconds. When some
+    records of a call site are suppressed, a summary record with their
+    number and the last of their messages is logged at the end of the
+    period. Records at WARNING or above are never suppressed.
+
+    """
+    def __init__(self, logger, rate=None, period=1.0, sample=1):
+        """Initialize a filter for the given logger.
+
+        logger (Logger): the logger the filter is attached to, used to
+            log the summaries.
+        rate (int|None): how many records per period each call site
+            can emit, or None for no limit.
+        period (float): the length of the period, in seconds.
+        sample (int): keep one record out of this many.
+
+        """
+        logging.Filter.__init__(self, "")
+        self.logger = logger
+        self.rate = rate
+        self.period = period
+        self.sample = sample
+        self._sites = dict()
+
+    def filter(self, record):
+        """Decide whether to let a record through.
+
+        record (LogRecord): data for a log message.
+
+        return (bool): whether to keep the record or not.
+
+        """
+        if record.levelno >= logging.WARNING \
+                or getattr(record, "suppressed_summary", False):
+            return True
+
+        site = self._sites.get((record.pathname, record.lineno))
+        if site is None:
+            site = self._sites.setdefault((record.pathname, record.lineno),
+                                          _CallSite())
+        site.seen += 1
+        if (site.seen - 1) % self.sample != 0:
+            return self._suppress(site, record)
+
+        if self.rate is not None:
+            now = time.monotonic()
+            if now >= site.window_end:
+                site.window_end = now + self.period
+                site.passed = 0
+            if site.passed >= self.rate:
+                return self._suppress(site, record)
+            site.passed += 1
+        return True
+
+    def _suppress(self, site, record):
+        """Count a suppressed record and schedule its report.
+
+        site (_CallSite): the call site of the record.
+        record (LogRecord): the record.
+
+        return (bool): False.
+
+        """
+        site.suppressed += 1
+        site.last_suppressed = record
+        if site.report is None:
+            site.report = gevent.spawn_later(self.period, self._report, site)
+        return False
+
+    def _report(self, site):
+        """Log a summary of the records suppressed at a call site.
+
+        site (_CallSite): the call site.
+
+        """
+        record = site.last_suppressed
+        summary = self.logger.makeRecord(
+            self.logger.name, record.levelno, record.pathname,
+            record.lineno, "%d similar messages suppressed, last one: %s",
+            (site.suppressed, record.getMessage()), None, record.funcName,
+            {"suppressed_summary": True})
+        site.suppressed = 0
+        site.last_suppressed = None
+        site.report = None
+        self.logger.handle(summary)
+
+    def flush(self):
+        """Immediately report all suppressed records."""
+        for site in list(self._sites.values()):
+            if site.report is not None:
+                site.report.kill(block=False)
+                self._report(site)
+
+
+# The rate limiting filters installed by set_rate_limits.
+_rate_limit_filters = dict()
+
+
+def set_rate_limits(limits):
+    """Set the rate limits of the given loggers.
+
+    Previously set limits are removed.
+
+    limits ({str: dict}): for each logger name, the keyword arguments
+        of its RateLimitFilter (rate, period and sample).
+
+    """
+    for name, filter_ in _rate_limit_filters.items():
+        logging.getLogger(name).removeFilter(filter_)
+    _rate_limit_filters.clear()
+    for name, arguments in limits.items():
+        logger = logging.getLogger(name)
+        filter_ = RateLimitFilter(logger, **arguments)
+        logger.addFilter(filter_)
+        _rate_limit_filters[name] = filter_
+
+
 class OperationAdapter(logging.LoggerAdapter):
     """Helper to attach operation to messages.
 
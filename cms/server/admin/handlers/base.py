@@ -230,6 +230,7 @@ class BaseHandler(CommonRequestHandler):
             self.service.add_notification(
                 make_datetime(),
                 "Operation successful.", "")
+            self.service.contest_updated()
             return True
 
     def get_current_user(self):
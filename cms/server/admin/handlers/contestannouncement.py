@@ -57,7 +57,8 @@ class AddAnnouncementHandler(BaseHandler):
             ann = Announcement(make_datetime(), subject, text,
                                contest=self.contest, admin=self.current_user)
             self.sql_session.add(ann)
-            self.try_commit()
+            if self.try_commit():
+                self.service.communication_sent(self.contest.id)
         else:
             self.service.add_notification(
                 make_datetime(), "Subject is mandatory.", "")
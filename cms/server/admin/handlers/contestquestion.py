@@ -108,6 +108,9 @@ class QuestionReplyHandler(BaseHandler):
                         question.participation.user.username,
                         question.participation.contest.name,
                         question_id)
+            self.service.communication_sent(
+                question.participation.contest_id,
+                question.participation.user.username)
 
         self.redirect(ref)
 
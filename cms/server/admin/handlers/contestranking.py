@@ -28,32 +28,52 @@
 
 import csv
 import io
+from abc import ABCMeta, abstractmethod
 
 from sqlalchemy.orm import joinedload
 
-from cms.db import Contest
-from cms.grading.scoring import task_score
+from cms.db import Contest, Participation, Team, User
+from cms.grading.scoring import get_task_scores
 from .base import BaseHandler, require_permission
 
 
 class RankingHandler(BaseHandler):
     """Shows the ranking for a contest.
 
+    The CSV and TXT exports don't load the participations as objects:
+    they fetch the needed columns and the scores (see get_task_scores).
+    The text is written at once, as AWS (a WSGIApplication) sends the
+    response only when the handler finishes anyway.
+
     """
     @require_permission(BaseHandler.AUTHENTICATED)
     def get(self, contest_id, format="online"):
         # This validates the contest id.
-        self.safe_get_item(Contest, contest_id)
+        self.contest = self.safe_get_item(Contest, contest_id)
+
+        if format == "txt":
+            self.set_header("Content-Type", "text/plain")
+            self.set_header("Content-Disposition",
+                            "attachment; filename=\"ranking.txt\"")
+            self.export(TxtRankingWriter)
+            return
+        elif format == "csv":
+            self.set_header("Content-Type", "text/csv")
+            self.set_header("Content-Disposition",
+                            "attachment; filename=\"ranking.csv\"")
+            self.export(CsvRankingWriter)
+            return
 
-        # This massive joined load gets all the information which we will need
-        # to generating the rankings.
         self.contest = self.sql_session.query(Contest)\
             .filter(Contest.id == contest_id)\
             .options(joinedload('participations'))\
-            .options(joinedload('participations.submissions'))\
-            .options(joinedload('participations.submissions.token'))\
-            .options(joinedload('participations.submissions.results'))\
+            .options(joinedload('participations.user'))\
+            .options(joinedload('participations.team'))\
             .first()
+        # The scores come mostly from the stored task scores; only
+        # the missing ones are computed from the submissions.
+        scores = get_task_scores(self.sql_session, self.contest,
+                                 rounded=True)
 
         # Preprocess participations: get data about teams, scores
         show_teams = False
@@ -64,7 +84,7 @@ class RankingHandler(BaseHandler):
             total_score = 0.0
             partial = False
             for task in self.contest.tasks:
-                t_score, t_partial = task_score(p, task, rounded=True)
+                t_score, t_partial = scores[(p.id, task.id)]
                 p.scores.append((t_score, t_partial))
                 total_score += t_score
                 partial = partial or t_partial
@@ -73,59 +93,150 @@ class RankingHandler(BaseHandler):
 
         self.r_params = self.render_params()
         self.r_params["show_teams"] = show_teams
-        if format == "txt":
-            self.set_header("Content-Type", "text/plain")
-            self.set_header("Content-Disposition",
-                            "attachment; filename=\"ranking.txt\"")
-            self.render("ranking.txt", **self.r_params)
-        elif format == "csv":
-            self.set_header("Content-Type", "text/csv")
-            self.set_header("Content-Disposition",
-                            "attachment; filename=\"ranking.csv\"")
+        self.render("ranking.html", **self.r_params)
+
+    def export(self, writer_class):
+        """Write the ranking of the visible participations.
+
+        writer_class (type): the RankingWriter subclass to use.
+
+        """
+        contest = self.contest
+        tasks = contest.tasks
+
+        # Username, first name, last name and team name.
+        participations = self.sql_session.query(
+            Participation.id, User.username, User.first_name,
+            User.last_name, Team.name)\
+            .join(User, Participation.user_id == User.id)\
+            .outerjoin(Team, Participation.team_id == Team.id)\
+            .filter(Participation.contest == contest)\
+            .filter(Participation.hidden.is_(False))\
+            .order_by(Participation.id)\
+            .all()
+        scores = get_task_scores(
+            self.sql_session, contest,
+            participation_ids=[p[0] for p in participations], rounded=True)
+
+        rows = []
+        show_teams = False
+        for participation_id, username, first_name, last_name, team \
+                in participations:
+            show_teams = show_teams or team is not None
+            task_scores = [scores[(participation_id, task.id)]
+                           for task in tasks]
+            total_score = (
+                round(sum(score for score, _ in task_scores),
+                      contest.score_precision),
+                any(partial for _, partial in task_scores))
+            rows.append((total_score, username,
+                         "%s %s" % (first_name, last_name), team or "",
+                         task_scores))
+        del participations, scores
+        rows.sort(key=lambda row: row[0], reverse=True)
+
+        writer = writer_class(contest, show_teams)
+        self.write(writer.header()
+                   + "".join(writer.row(*row) for row in rows))
+        self.finish()
+
+
+class RankingWriter(metaclass=ABCMeta):
+    """Format the lines of a ranking export.
 
-            output = io.StringIO()  # untested
-            writer = csv.writer(output)
+    """
+    def __init__(self, contest, show_teams):
+        """Initialize the writer.
+
+        contest (Contest): the contest.
+        show_teams (bool): whether to add a column for the teams.
+
+        """
+        self.contest = contest
+        self.show_teams = show_teams
 
-            include_partial = True
+    @abstractmethod
+    def header(self):
+        """Return the header line(s).
 
-            contest = self.r_params["contest"]
+        return (str): the text, including the final newline.
 
-            row = ["Username", "User"]
-            if show_teams:
-                row.append("Team")
-            for task in contest.tasks:
-                row.append(task.name)
-                if include_partial:
-                    row.append("P")
+        """
+        pass
 
-            row.append("Global")
-            if include_partial:
-                row.append("P")
+    @abstractmethod
+    def row(self, total_score, username, name, team, task_scores):
+        """Return the line of a participation.
 
-            writer.writerow(row)
+        total_score ((float, bool)): the total score and whether it's
+            partial.
+        username (str): the username of the participant.
+        name (str): their first and last name.
+        team (str): the name of their team, or the empty string.
+        task_scores ([(float, bool)]): the score on each task and
+            whether it's partial.
 
-            for p in sorted(contest.participations,
-                            key=lambda p: p.total_score, reverse=True):
-                if p.hidden:
-                    continue
+        return (str): the text, including the final newline.
 
-                row = [p.user.username,
-                       "%s %s" % (p.user.first_name, p.user.last_name)]
-                if show_teams:
-                    row.append(p.team.name if p.team else "")
-                assert len(contest.tasks) == len(p.scores)
-                for t_score, t_partial in p.scores:  # Custom field, see above
-                    row.append(t_score)
-                    if include_partial:
-                        row.append("*" if t_partial else "")
+        """
+        pass
 
-                total_score, partial = p.total_score  # Custom field, see above
-                row.append(total_score)
-                if include_partial:
-                    row.append("*" if partial else "")
 
-                writer.writerow(row)  # untested
+class CsvRankingWriter(RankingWriter):
+    """Format the ranking as CSV, with a column telling if each score
+    is partial.
 
-            self.finish(output.getvalue())
-        else:
-            self.render("ranking.html", **self.r_params)
+    """
+    def _format(self, row):
+        output = io.StringIO()
+        csv.writer(output).writerow(row)
+        return output.getvalue()
+
+    def header(self):
+        row = ["Username", "User"]
+        if self.show_teams:
+            row.append("Team")
+        for task in self.contest.tasks:
+            row.append(task.name)
+            row.append("P")
+        row.append("Global")
+        row.append("P")
+        return self._format(row)
+
+    def row(self, total_score, username, name, team, task_scores):
+        row = [username, name]
+        if self.show_teams:
+            row.append(team)
+        for t_score, t_partial in task_scores + [total_score]:
+            row.append(t_score)
+            row.append("*" if t_partial else "")
+        return self._format(row)
+
+
+class TxtRankingWriter(RankingWriter):
+    """Format the ranking as a fixed-width table, with partial scores
+    marked by an asterisk.
+
+    """
+    def header(self):
+        line = "%20s %30s" % ("Username", "User")
+        if self.show_teams:
+            line += "%30s" % "Team"
+        line += " "
+        for task in self.contest.tasks:
+            line += "%14s " % task.name
+        line += "%8s\n" % "Global"
+        return line
+
+    def row(self, total_score, username, name, team, task_scores):
+        line = "%20s %30s" % (username, name)
+        if self.show_teams:
+            line += "%30s" % team
+        line += " "
+        for task, (t_score, t_partial) in zip(self.contest.tasks,
+                                              task_scores):
+            line += "%%13.%dlf" % task.score_precision % t_score
+            line += "* " if t_partial else "  "
+        line += "%%7.%dlf" % self.contest.score_precision % total_score[0]
+        line += "*" if total_score[1] else " "
+        return line + "\n"
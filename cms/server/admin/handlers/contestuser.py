@@ -275,5 +275,6 @@ class MessageHandler(BaseHandler):
         if self.try_commit():
             logger.info("Message submitted to user %s in contest %s.",
                         user.username, self.contest.name)
+            self.service.communication_sent(self.contest.id, user.username)
 
         self.redirect(self.url("contest", contest_id, "user", user_id, "edit"))
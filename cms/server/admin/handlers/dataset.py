@@ -46,7 +46,8 @@ except ImportError:
 
 from cms.db import Dataset, Manager, Message, Participation, \
     Session, Submission, Task, Testcase
-from cms.grading.scoring import compute_changes_for_dataset
+from cms.grading.scoring import compute_changes_for_dataset, \
+    invalidate_task_scores
 from cmscommon.datetime import make_datetime
 from cmscommon.importers import import_testcases_from_zipfile
 from .base import BaseHandler, require_permission
@@ -284,10 +285,13 @@ class ActivateDatasetHandler(BaseHandler):
         task = dataset.task
 
         task.active_dataset = dataset
+        invalidate_task_scores(self.sql_session, task_id=task.id)
 
         if self.try_commit():
             self.service.proxy_service.dataset_updated(
                 task_id=task.id)
+            self.service.scoring_service.dataset_updated(
+                task_id=task.id)
 
             # This kicks off judging of any submissions which were previously
             # unloved, but are now part of an autojudged taskset.
@@ -300,7 +304,7 @@ class ActivateDatasetHandler(BaseHandler):
         datetime = make_datetime()
 
         r = re.compile('notify_([0-9]+)$')
-        count = 0
+        recipients = list()
         for k in self.request.arguments:
             m = r.match(k)
             if not m:
@@ -311,12 +315,15 @@ class ActivateDatasetHandler(BaseHandler):
                               self.get_argument("message_text", ""),
                               participation=participation)
             self.sql_session.add(message)
-            count += 1
+            recipients.append((participation.contest_id,
+                               participation.user.username))
 
         if self.try_commit():
             self.service.add_notification(
                 make_datetime(),
-                "Messages sent to %d users." % count, "")
+                "Messages sent to %d users." % len(recipients), "")
+            for contest_id, username in recipients:
+                self.service.communication_sent(contest_id, username)
 
         self.redirect(self.url("task", task.id))
 
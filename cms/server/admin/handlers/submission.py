@@ -30,6 +30,7 @@ import logging
 
 from cms.db import Dataset, File, Submission
 from cms.grading.languagemanager import get_language
+from cms.grading.scoring import invalidate_task_scores
 from cmscommon.datetime import make_datetime
 from .base import BaseHandler, FileHandler, require_permission
 
@@ -123,7 +124,13 @@ class SubmissionOfficialStatusHandler(BaseHandler):
         should_make_official = self.get_argument("official", "yes") == "yes"
 
         submission.official = should_make_official
+        invalidate_task_scores(self.sql_session,
+                               participation_id=submission.participation_id,
+                               task_id=submission.task_id)
         if self.try_commit():
+            self.service.scoring_service.update_task_score(
+                participation_id=submission.participation_id,
+                task_id=submission.task_id)
             logger.info("Submission '%s' by user %s in contest %s has "
                         "been made %s",
                         submission.id,
@@ -27,6 +27,7 @@ from cms.db import Admin, SessionGen
 RPCS_ALLOWED_FOR_AUTHENTICATED = [
     ("AdminWebServer", "submissions_status"),
     ("ResourceService", "get_resources"),
+    ("ResourceService", "get_rpc_stats"),
     ("EvaluationService", "workers_status"),
     ("EvaluationService", "queue_status"),
     ("LogService", "last_messages"),
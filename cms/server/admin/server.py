@@ -83,6 +83,11 @@ class AdminWebServer(WebService):
             ServiceCoord("ProxyService", 0),
             must_be_present=ranking_enabled)
 
+        self.contest_web_servers = []
+        for i in range(get_service_shards("ContestWebServer")):
+            self.contest_web_servers.append(self.connect_to(
+                ServiceCoord("ContestWebServer", i)))
+
         self.resource_services = []
         for i in range(get_service_shards("ResourceService")):
             self.resource_services.append(self.connect_to(
@@ -104,6 +109,25 @@ class AdminWebServer(WebService):
         """
         self.notifications.append((timestamp, subject, text))
 
+    def communication_sent(self, contest_id, username=None):
+        """Tell the ContestWebServers that a communication was sent.
+
+        contest_id (int): the ID of the contest.
+        username (str|None): the user it was sent to, or None for an
+            announcement to the whole contest.
+
+        """
+        for contest_web_server in self.contest_web_servers:
+            contest_web_server.communication_sent(contest_id=contest_id,
+                                                  username=username)
+
+    def contest_updated(self):
+        """Tell the ContestWebServers that some contest has changed.
+
+        """
+        for contest_web_server in self.contest_web_servers:
+            contest_web_server.contest_updated()
+
     @staticmethod
     @rpc_method
     def submissions_status(contest_id):
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A cache of the contests served by CWS.
+
+"""
+
+import time
+
+from sqlalchemy.orm import joinedload, subqueryload
+
+from cms.db import Contest, SessionGen, Task
+
+
+class ContestCache:
+    """Keep the contests and their tasks in memory.
+
+    A contest is loaded together with its tasks and with the data of
+    them that most pages need (active dataset, statements and
+    attachments). It's then kept detached from any session, and each
+    request gets a copy merged into its own session without querying
+    the database (see Session.merge with load=False). The request can
+    use it as if it loaded it itself: any other data is lazily loaded
+    as usual.
+
+    The cache must be invalidated when a contest changes, which
+    AdminWebServer does through an RPC. Entries also expire after TTL
+    seconds, in case of changes made by other means (e.g., scripts).
+
+    """
+
+    TTL = 60.0
+
+    def __init__(self):
+        # For each contest ID, the detached contest and when it was
+        # loaded.
+        self._contests = dict()
+        # The ID of each contest, by name.
+        self._ids = dict()
+        # Incremented at each invalidation, so that the contests being
+        # loaded at that time don't get cached.
+        self._generation = 0
+
+    def invalidate(self):
+        """Drop all the contests."""
+        self._contests.clear()
+        self._ids.clear()
+        self._generation += 1
+
+    def get(self, session, contest_id=None, name=None):
+        """Return a contest, given its ID or its name.
+
+        session (Session): the session to attach the contest to.
+        contest_id (int|None): the ID of the contest.
+        name (str|None): the name of the contest, used if the ID is
+            None.
+
+        return (Contest|None): the contest in the given session, or
+            None if it doesn't exist.
+
+        """
+        if contest_id is None:
+            contest_id = self._ids.get(name)
+        entry = self._contests.get(contest_id)
+        if entry is None or time.monotonic() > entry[1] + self.TTL:
+            generation = self._generation
+            contest = self._load(contest_id, name)
+            if contest is None:
+                return None
+            entry = (contest, time.monotonic())
+            if generation == self._generation:
+                self._contests[contest.id] = entry
+                self._ids[contest.name] = contest.id
+        return session.merge(entry[0], load=False)
+
+    @staticmethod
+    def _load(contest_id, name):
+        """Load a contest, detached from any session.
+
+        contest_id (int|None): the ID of the contest.
+        name (str|None): its name, used if the ID is None.
+
+        return (Contest|None): the contest, or None if it doesn't
+            exist.
+
+        """
+        with SessionGen() as session:
+            query = session.query(Contest).options(
+                subqueryload(Contest.tasks)
+                .joinedload(Task.active_dataset),
+                subqueryload(Contest.tasks)
+                .subqueryload(Task.statements),
+                subqueryload(Contest.tasks)
+                .subqueryload(Task.attachments))
+            if contest_id is not None:
+                query = query.filter(Contest.id == contest_id)
+            else:
+                query = query.filter(Contest.name == name)
+            contest = query.first()
+            # Detach the objects before the session is rolled back,
+            # which would expire them.
+            session.expunge_all()
+        return contest
@@ -42,6 +42,7 @@ from .tasksubmission import \
     SubmitHandler, \
     TaskSubmissionsHandler, \
     SubmissionStatusHandler, \
+    SubmissionStatusWaitHandler, \
     SubmissionDetailsHandler, \
     SubmissionFileHandler, \
     UseTokenHandler
@@ -76,6 +77,7 @@ HANDLERS = [
 
     (r"/tasks/(.*)/submit", SubmitHandler),
     (r"/tasks/(.*)/submissions", TaskSubmissionsHandler),
+    (r"/tasks/(.*)/submissions/wait", SubmissionStatusWaitHandler),
     (r"/tasks/(.*)/submissions/([1-9][0-9]*)", SubmissionStatusHandler),
     (r"/tasks/(.*)/submissions/([1-9][0-9]*)/details",
      SubmissionDetailsHandler),
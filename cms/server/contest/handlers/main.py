@@ -281,10 +281,19 @@ class LogoutHandler(ContestHandler):
 class NotificationsHandler(ContestHandler):
     """Displays notifications.
 
+    If the wait argument is given and there are no notifications, the
+    request waits for some to arrive (up to WAIT_TIMEOUT seconds)
+    before replying, so that clients can ask again right away instead
+    of polling.
+
     """
 
     refresh_cookie = False
 
+    # How long a request waits for notifications (less than the read
+    # timeout of the usual reverse proxies).
+    WAIT_TIMEOUT = 50.0
+
     @tornado_web.authenticated
     @multi_contest
     def get(self):
@@ -294,6 +303,39 @@ class NotificationsHandler(ContestHandler):
         if last_notification is not None:
             last_notification = make_datetime(float(last_notification))
 
+        if self.get_argument("wait", None) is None:
+            res = self.get_notifications(participation, last_notification)
+            self.write(json.dumps(res))
+            return
+
+        participation_id = participation.id
+        keys = [("contest", self.contest.id),
+                ("user", participation.user.username)]
+        with self.service.notification_watcher.watch(keys) as wait:
+            res = self.get_notifications(participation, last_notification)
+            if len(res) == 0:
+                # Don't hold a database connection while waiting.
+                self.sql_session.close()
+                if wait(self.WAIT_TIMEOUT):
+                    self.timestamp = make_datetime()
+                    participation = Participation.get_from_id(
+                        participation_id, self.sql_session)
+                    res = self.get_notifications(participation,
+                                                 last_notification)
+
+        self.write(json.dumps(res))
+
+    def get_notifications(self, participation, last_notification):
+        """Return the notifications to send to a contestant.
+
+        participation (Participation): the contestant.
+        last_notification (datetime|None): the time of the last
+            communication they already received.
+
+        return ([dict]): the communications after last_notification
+            and the pending simple notifications, which are dropped.
+
+        """
         res = get_communications(self.sql_session, participation,
                                  self.timestamp, after=last_notification)
 
@@ -309,7 +351,7 @@ class NotificationsHandler(ContestHandler):
                             "level": notification[3]})
             del notifications[username]
 
-        self.write(json.dumps(res))
+        return res
 
 
 class PrintingHandler(ContestHandler):
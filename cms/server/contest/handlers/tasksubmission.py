@@ -46,9 +46,9 @@ except ImportError:
 from sqlalchemy.orm import joinedload
 
 from cms import config, FEEDBACK_LEVEL_FULL
-from cms.db import Submission, SubmissionResult
+from cms.db import Submission, SubmissionResult, Task
 from cms.grading.languagemanager import get_language
-from cms.grading.scoring import task_score
+from cms.grading.scoring import get_task_score
 from cms.server import multi_contest
 from cms.server.contest.submission import get_submission_count, \
     UnacceptableSubmission, accept_submission
@@ -98,7 +98,7 @@ class SubmitHandler(ContestHandler):
             self.notify_error(e.subject, e.text, e.text_params)
         else:
             self.service.evaluation_service.new_submission(
-                submission_id=submission.id)
+                submission_id=submission.id, batch=True)
             self.notify_success(N_("Submission received"),
                                 N_("Your submission has been received "
                                    "and is currently being evaluated."))
@@ -133,10 +133,11 @@ class TaskSubmissionsHandler(ContestHandler):
             .options(joinedload(Submission.results))\
             .all()
 
-        public_score, is_public_score_partial = task_score(
-            participation, task, public=True, rounded=True)
-        tokened_score, is_tokened_score_partial = task_score(
-            participation, task, only_tokened=True, rounded=True)
+        public_score, is_public_score_partial = get_task_score(
+            self.sql_session, participation, task, public=True, rounded=True)
+        tokened_score, is_tokened_score_partial = get_task_score(
+            self.sql_session, participation, task, only_tokened=True,
+            rounded=True)
         # These two should be the same, anyway.
         is_score_partial = is_public_score_partial or is_tokened_score_partial
 
@@ -204,17 +205,12 @@ class SubmissionStatusHandler(ContestHandler):
             "task_is_score_partial" as partial info is the same for both.
 
         """
-        # Just to preload all information required to compute the task score.
-        self.sql_session.query(Submission)\
-            .filter(Submission.participation == participation)\
-            .filter(Submission.task == task)\
-            .options(joinedload(Submission.token))\
-            .options(joinedload(Submission.results))\
-            .all()
         data["task_public_score"], public_score_is_partial = \
-            task_score(participation, task, public=True, rounded=True)
+            get_task_score(self.sql_session, participation, task,
+                           public=True, rounded=True)
         data["task_tokened_score"], tokened_score_is_partial = \
-            task_score(participation, task, only_tokened=True, rounded=True)
+            get_task_score(self.sql_session, participation, task,
+                           only_tokened=True, rounded=True)
         # These two should be the same, anyway.
         data["task_score_is_partial"] = \
             public_score_is_partial or tokened_score_is_partial
@@ -283,6 +279,100 @@ class SubmissionStatusHandler(ContestHandler):
         self.write(data)
 
 
+class SubmissionStatusWaitHandler(ContestHandler):
+    """Wait until the status of some submissions changes.
+
+    The client passes the statuses it knows, as "num:status" values of
+    the submission argument. The reply comes as soon as one of them
+    differs (or after WAIT_TIMEOUT seconds) and lists the numbers of
+    those that do: the client can then ask SubmissionStatusHandler
+    for their details, and wait again.
+
+    A single request waits for all the submissions of the page, so
+    that they don't take up all the connections the browser allows.
+
+    """
+
+    refresh_cookie = False
+
+    # How long a request waits for a change (less than the read
+    # timeout of the usual reverse proxies).
+    WAIT_TIMEOUT = 50.0
+
+    @tornado_web.authenticated
+    @actual_phase_required(0, 3)
+    @multi_contest
+    def get(self, task_name):
+        task = self.get_task(task_name)
+        if task is None:
+            raise tornado_web.HTTPError(404)
+
+        known = dict()
+        for value in self.get_arguments("submission"):
+            num, _, status = value.partition(":")
+            known[num] = status
+
+        participation_id = self.current_user.id
+        task_id = task.id
+        submissions = self.get_known_submissions(participation_id, task,
+                                                 known)
+        keys = [("submission", submission.id)
+                for submission in submissions.values()]
+        with self.service.notification_watcher.watch(keys) as wait:
+            changed = self.get_changed(task, submissions, known)
+            if len(changed) == 0 and len(submissions) > 0:
+                # Don't hold a database connection while waiting.
+                self.sql_session.close()
+                if wait(self.WAIT_TIMEOUT):
+                    task = Task.get_from_id(task_id, self.sql_session)
+                    submissions = self.get_known_submissions(
+                        participation_id, task, known)
+                    changed = self.get_changed(task, submissions, known)
+
+        self.write({"changed": changed})
+
+    def get_known_submissions(self, participation_id, task, known):
+        """Return the submissions the client knows about.
+
+        participation_id (int): the id of the contestant.
+        task (Task): the task of the submissions.
+        known ({str: str}): the known statuses, by submission number.
+
+        return ({int: Submission}): the submissions, by number.
+
+        """
+        submissions = self.sql_session.query(Submission) \
+            .filter(Submission.participation_id == participation_id) \
+            .filter(Submission.task == task) \
+            .order_by(Submission.timestamp) \
+            .all()
+        return {num: submission
+                for num, submission in enumerate(submissions, 1)
+                if str(num) in known}
+
+    @staticmethod
+    def get_changed(task, submissions, known):
+        """Return the numbers of the submissions whose status changed.
+
+        task (Task): the task of the submissions.
+        submissions ({int: Submission}): the submissions, by number.
+        known ({str: str}): the known statuses, by submission number.
+
+        return ([int]): the numbers of the submissions whose status is
+            not the known one.
+
+        """
+        changed = list()
+        for num, submission in submissions.items():
+            sr = submission.get_result(task.active_dataset)
+            # implicit compiling state while result is not created
+            status = sr.get_status() if sr is not None \
+                else SubmissionResult.COMPILING
+            if str(status) != known[str(num)]:
+                changed.append(num)
+        return changed
+
+
 class SubmissionDetailsHandler(ContestHandler):
 
     refresh_cookie = False
@@ -398,6 +488,10 @@ class UseTokenHandler(ContestHandler):
             # token has been played.
             self.service.proxy_service.submission_tokened(
                 submission_id=submission.id)
+            # The tokened score has changed.
+            self.service.scoring_service.update_task_score(
+                participation_id=submission.participation_id,
+                task_id=task.id, batch=True)
 
             logger.info("Token played by user %s on task %s.",
                         self.current_user.user.username, task.name)
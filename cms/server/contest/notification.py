@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Let the requests of CWS wait for something to happen.
+
+"""
+
+from contextlib import contextmanager
+
+import gevent
+import gevent.event
+
+
+class NotificationWatcher:
+    """Wake up the requests waiting for some notification.
+
+    Requests wait on some keys (e.g., a contest, for its announcements,
+    or a user, for their messages) and are woken up as soon as one of
+    them is notified. All the requests waiting on a key share the same
+    event, so that notifying one reaches all of them at once.
+
+    It's process-local: it only knows about the notifications it's
+    told about, by the handlers and the RPC methods of its own CWS.
+
+    """
+    def __init__(self):
+        # For each key, the event the next notification will set and
+        # the number of requests waiting on it.
+        self._waiting = dict()
+
+    def notify(self, key):
+        """Wake up the requests waiting on the given key.
+
+        key (object): a hashable key.
+
+        """
+        if key in self._waiting:
+            event, _ = self._waiting.pop(key)
+            event.set()
+
+    @contextmanager
+    def watch(self, keys):
+        """Watch the given keys, to wait for them later.
+
+        The notifications sent after entering the context are not
+        missed, even if they come before starting to wait: hence the
+        state can be checked after entering it, and waited for only if
+        nothing has changed yet.
+
+        keys ([object]): the keys to watch.
+
+        yield (function): a function that takes a timeout (in seconds)
+            and waits until one of the keys is notified or the timeout
+            expires, returning whether it was notified.
+
+        """
+        watched = list()
+        for key in keys:
+            if key not in self._waiting:
+                self._waiting[key] = [gevent.event.Event(), 0]
+            self._waiting[key][1] += 1
+            watched.append((key, self._waiting[key][0]))
+
+        def wait(timeout):
+            events = [event for _, event in watched]
+            return len(gevent.wait(events, timeout=timeout, count=1)) > 0
+
+        try:
+            yield wait
+        finally:
+            for key, event in watched:
+                # The entry may have been replaced after a notification.
+                entry = self._waiting.get(key)
+                if entry is not None and entry[0] is event:
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self._waiting[key]
@@ -42,9 +42,11 @@ import logging
 from werkzeug.middleware.shared_data import SharedDataMiddleware
 
 from cms import ConfigError, ServiceCoord, config
-from cms.io import WebService
+from cms.io import WebService, rpc_method
 from cms.locale import get_translations
+from cms.server.contest.cache import ContestCache
 from cms.server.contest.jinja2_toolbox import CWS_ENVIRONMENT
+from cms.server.contest.notification import NotificationWatcher
 from cmscommon.binary import hex_to_bin
 from .handlers import HANDLERS
 from .handlers.base import ContestListHandler
@@ -113,6 +115,15 @@ class ContestWebServer(WebService):
         # of tuples (timestamp, subject, text).
         self.notifications = {}
 
+        # The requests waiting for new notifications, which are woken
+        # up when a user (by username) or a contest (by ID) receives
+        # some, or when the status of a submission (by ID) changes.
+        self.notification_watcher = NotificationWatcher()
+
+        # The contests served, with their tasks, kept in memory until
+        # AdminWebServer tells that they have changed.
+        self.contest_cache = ContestCache()
+
         # Retrieve the available translations.
         self.translations = get_translations()
 
@@ -145,3 +156,45 @@ class ContestWebServer(WebService):
         if username not in self.notifications:
             self.notifications[username] = []
         self.notifications[username].append((timestamp, subject, text, level))
+        self.notification_watcher.notify(("user", username))
+
+    @rpc_method
+    def submission_status_changed(self, submission_id):
+        """Notice that the status of a submission has changed.
+
+        Usually called by EvaluationService, after compiling or
+        evaluating a submission, and by ScoringService, after scoring
+        it, to wake up the contestants waiting for it.
+
+        submission_id (int): the ID of the submission.
+
+        """
+        self.notification_watcher.notify(("submission", submission_id))
+
+    @rpc_method
+    def communication_sent(self, contest_id, username=None):
+        """Notice that a communication has been sent to contestants.
+
+        Usually called by AdminWebServer, after adding an announcement
+        to a contest or a message or an answer for a user, to wake up
+        the contestants waiting for them.
+
+        contest_id (int): the ID of the contest.
+        username (str|None): the user it was sent to, or None if it
+            was sent to the whole contest.
+
+        """
+        if username is None:
+            self.notification_watcher.notify(("contest", contest_id))
+        else:
+            self.notification_watcher.notify(("user", username))
+
+    @rpc_method
+    def contest_updated(self):
+        """Notice that the data of some contest has changed.
+
+        Usually called by AdminWebServer, after each change, to drop
+        the contests kept in memory.
+
+        """
+        self.contest_cache.invalidate()
@@ -65,11 +65,18 @@ CMS.CWSUtils.create_url_builder = function(url_root) {
 };
 
 
-CMS.CWSUtils.prototype.update_notifications = function(hush) {
+CMS.CWSUtils.prototype.update_notifications = function(hush, wait) {
     var self = this;
-    $.get(
+    var params = {};
+    if (this.last_notification !== null) {
+        params["last_notification"] = this.last_notification;
+    }
+    if (wait) {
+        params["wait"] = 1;
+    }
+    return $.get(
         this.contest_url("notifications"),
-        this.last_notification !== null ? {"last_notification": this.last_notification} : {},
+        params,
         function(data) {
             for (var i = 0; i < data.length; i += 1) {
                 self.display_notification(
@@ -88,6 +95,24 @@ CMS.CWSUtils.prototype.update_notifications = function(hush) {
 };
 
 
+/**
+ * Keep a request for notifications open: the server replies as soon
+ * as there are new ones, and then a new request is made. If this
+ * doesn't work (e.g., the connection is lost), fall back to asking
+ * every 30 seconds until it does.
+ */
+CMS.CWSUtils.prototype.wait_notifications = function() {
+    var self = this;
+    this.update_notifications(false, true)
+        .done(function() {
+            self.wait_notifications();
+        })
+        .fail(function() {
+            setTimeout(function() { self.wait_notifications(); }, 30000);
+        });
+};
+
+
 CMS.CWSUtils.prototype.display_notification = function(type, timestamp,
                                                        subject, text,
                                                        level, hush) {
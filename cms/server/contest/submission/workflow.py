@@ -31,6 +31,7 @@ import logging
 
 from cms import config
 from cms.db import Submission, File, UserTestManager, UserTestFile, UserTest
+from cms.grading.scoring import invalidate_task_scores
 from cmscommon.datetime import make_timestamp
 from .check import check_max_number, check_min_interval
 from .file_matching import InvalidFilesOrLanguage, match_files_and_language
@@ -207,6 +208,11 @@ def accept_submission(sql_session, file_cacher, participation, task, timestamp,
         sql_session.add(File(
             filename=codename, digest=digest, submission=submission))
 
+    # The new submission is not scored yet.
+    if official:
+        invalidate_task_scores(sql_session, participation_id=participation.id,
+                               task_id=task.id)
+
     return submission
 
 
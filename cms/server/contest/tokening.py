@@ -29,6 +29,7 @@ import logging
 
 from cms import TOKEN_MODE_DISABLED, TOKEN_MODE_INFINITE
 from cms.db import Token, Submission
+from cms.grading.scoring import invalidate_task_scores
 
 
 __all__ = [
@@ -361,4 +362,9 @@ def accept_token(sql_session, submission, timestamp):
     token = Token(timestamp, submission=submission)
     sql_session.add(token)
 
+    # The tokened score might have changed.
+    invalidate_task_scores(sql_session,
+                           participation_id=submission.participation_id,
+                           task_id=submission.task_id)
+
     return token
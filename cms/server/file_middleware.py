@@ -86,8 +86,11 @@ class FileServerMiddleware:
         mimetype = original_response.mimetype
 
         try:
-            fobj = self.file_cacher.get_file(digest)
-            size = self.file_cacher.get_size(digest)
+            # Serving from a memory map lets concurrent downloads of the
+            # same file share its pages, and the map is also the cheapest
+            # way to know the size (no need to ask the backend).
+            view = self.file_cacher.get_file_mmap(digest)
+            size = len(view)
         except KeyError:
             return NotFound()
         except TombstoneError:
@@ -106,7 +109,7 @@ class FileServerMiddleware:
         response.cache_control.no_cache = True
         response.cache_control.private = True
         response.response = \
-            wrap_file(environ, fobj, buffer_size=FileCacher.CHUNK_SIZE)
+            wrap_file(environ, view, buffer_size=FileCacher.CHUNK_SIZE)
         response.direct_passthrough = True
 
         try:
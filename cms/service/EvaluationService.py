@@ -45,7 +45,8 @@ from cms.db import SessionGen, Digest, Dataset, Evaluation, Submission, \
     SubmissionResult, Testcase, UserTest, UserTestResult, get_submissions, \
     get_submission_results, get_datasets_to_judge
 from cms.grading.Job import JobGroup
-from cms.io import Executor, TriggeredService, rpc_method
+from cms.grading.scoring import invalidate_task_scores
+from cms.io import Executor, TriggeredService, rpc_method, rpc_batch_method
 from .esoperations import ESOperation, get_relevant_operations, \
     get_submissions_operations, get_user_tests_operations, \
     submission_get_operations, submission_to_evaluate, \
@@ -286,6 +287,13 @@ class EvaluationService(TriggeredService):
         self.scoring_service = self.connect_to(
             ServiceCoord("ScoringService", 0))
 
+        # The ContestWebServers show the status of the submissions to
+        # the contestants, as soon as it changes.
+        self.contest_web_servers = []
+        for i in range(get_service_shards("ContestWebServer")):
+            self.contest_web_servers.append(self.connect_to(
+                ServiceCoord("ContestWebServer", i)))
+
         self.add_executor(EvaluationExecutor(self))
         self.start_sweeper(117.0)
 
@@ -675,6 +683,7 @@ class EvaluationService(TriggeredService):
             logger.info("Submission %d(%d) was compiled successfully.",
                         submission_result.submission_id,
                         submission_result.dataset_id)
+            self.submission_status_changed(submission_result)
 
         # If instead submission failed compilation, we inform
         # ScoringService of the new submission. We need to commit
@@ -685,7 +694,9 @@ class EvaluationService(TriggeredService):
                         submission_result.dataset_id)
             self.scoring_service.new_evaluation(
                 submission_id=submission_result.submission_id,
-                dataset_id=submission_result.dataset_id)
+                dataset_id=submission_result.dataset_id,
+                batch=True)
+            self.submission_status_changed(submission_result)
 
         # If compilation failed for our fault, we log the error.
         elif submission_result.compilation_outcome is None:
@@ -728,7 +739,9 @@ class EvaluationService(TriggeredService):
                         submission_result.dataset_id)
             self.scoring_service.new_evaluation(
                 submission_id=submission_result.submission_id,
-                dataset_id=submission_result.dataset_id)
+                dataset_id=submission_result.dataset_id,
+                batch=True)
+            self.submission_status_changed(submission_result)
 
         # Evaluation unsuccessful, we log the error.
         else:
@@ -746,6 +759,23 @@ class EvaluationService(TriggeredService):
         # Enqueue next steps to be done (e.g., if evaluation failed).
         self.submission_enqueue_operations(submission)
 
+    def submission_status_changed(self, submission_result):
+        """Tell the ContestWebServers that a submission has progressed.
+
+        Only the results on the active dataset are shown to the
+        contestants, so the others are ignored.
+
+        submission_result (SubmissionResult): the submission result,
+            whose changes have been committed.
+
+        """
+        submission = submission_result.submission
+        if submission_result.dataset_id != submission.task.active_dataset_id:
+            return
+        for contest_web_server in self.contest_web_servers:
+            contest_web_server.submission_status_changed(
+                submission_id=submission.id, batch=True)
+
     def user_test_compilation_ended(self, user_test_result):
         """Actions to be performed when we have a user test that has
         ended compilation. In particular: we queue evaluation if
@@ -829,17 +859,35 @@ class EvaluationService(TriggeredService):
 
         submission_id (int): the id of the new submission.
 
+        """
+        self.new_submission_batch([{"submission_id": submission_id}])
+
+    @rpc_batch_method("new_submission")
+    def new_submission_batch(self, calls):
+        """Handle many calls to new_submission in a single session.
+
+        calls ([dict]): the arguments of each call.
+
+        return ([None]): the result of each call.
+
         """
         with SessionGen() as session:
-            submission = Submission.get_from_id(submission_id, session)
-            if submission is None:
-                logger.error("[new_submission] Couldn't find submission "
-                             "%d in the database.", submission_id)
-                return
+            submission_ids = [call["submission_id"] for call in calls]
+            if len(submission_ids) > 1:
+                # Populate the identity map of the session.
+                session.query(Submission) \
+                    .filter(Submission.id.in_(submission_ids)).all()
+            for submission_id in submission_ids:
+                submission = Submission.get_from_id(submission_id, session)
+                if submission is None:
+                    logger.error("[new_submission] Couldn't find submission "
+                                 "%d in the database.", submission_id)
+                    continue
 
-            self.submission_enqueue_operations(submission)
+                self.submission_enqueue_operations(submission)
 
             session.commit()
+        return [None] * len(calls)
 
     @rpc_method
     def new_user_test(self, user_test_id):
@@ -972,6 +1020,10 @@ class EvaluationService(TriggeredService):
             for submission in submissions:
                 self.submission_enqueue_operations(submission)
 
+            # The invalidated results are not scored anymore.
+            invalidate_task_scores(session, contest_id, participation_id,
+                                   task_id, submission_id, dataset_id)
+
             session.commit()
         logger.info("Invalidate successfully completed.")
 
@@ -23,14 +23,16 @@
 
 """
 
+import itertools
 import logging
 import os
-import time
 from collections import deque
 
 from cms import config, mkdir
 from cms.io import Service, rpc_method
-from cms.log import root_logger, shell_handler, FileHandler, DetailedFormatter
+from cms.log import root_logger, shell_handler, DetailedFormatter
+from .logstore import LogStore, query_logs, service_key, submission_key, \
+    user_test_key
 
 
 logger = logging.getLogger(__name__)
@@ -53,23 +55,17 @@ class LogService(Service):
             logger.error("Cannot create necessary directories.")
             self.exit()
             return
-        log_filename = "%d.log" % int(time.time())
+        self.log_dir = log_dir
 
-        # Install a global file handler.
-        self.file_handler = FileHandler(os.path.join(log_dir, log_filename),
-                                        mode='w', encoding='utf-8')
+        # Install a global handler writing to the indexed store (which
+        # also provides a symlink to the latest log file).
+        self.file_handler = LogStore(log_dir,
+                                     config.log_rotation_size,
+                                     config.log_rotation_interval)
         self.file_handler.setLevel(logging.DEBUG)
         self.file_handler.setFormatter(DetailedFormatter(False))
         root_logger.addHandler(self.file_handler)
 
-        # Provide a symlink to the latest log file.
-        try:
-            os.remove(os.path.join(log_dir, "last.log"))
-        except OSError:
-            pass
-        os.symlink(log_filename,
-                   os.path.join(log_dir, "last.log"))
-
         self._last_messages = deque(maxlen=self.LAST_MESSAGES_COUNT)
 
     @rpc_method
@@ -117,6 +113,51 @@ class LogService(Service):
                 "timestamp": record.created,
                 "exc_text": getattr(record, "exc_text", None)})
 
+    @rpc_method
+    def LogBatch(self, records):
+        """Log many messages.
+
+        records ([dict]): the attributes of each LogRecord, as the
+            keyword arguments of Log.
+
+        """
+        for record in records:
+            self.Log(**record)
+
     @rpc_method
     def last_messages(self):
         return list(self._last_messages)
+
+    @rpc_method
+    def query_logs(self, service_name=None, service_shard=0,
+                   submission_id=None, user_test_id=None, since=None,
+                   until=None, limit=1000):
+        """Return the stored log messages matching the given criteria.
+
+        service_name (str|None): return only the messages of this
+            service, with the given service_shard.
+        service_shard (int): see service_name.
+        submission_id (int|None): return only the messages about this
+            submission.
+        user_test_id (int|None): return only the messages about this
+            user test.
+        since (float|None): return only the messages created after
+            this time (approximately, see query_logs).
+        until (float|None): return only the messages created before
+            this time (approximately).
+        limit (int): the maximum number of messages to return.
+
+        return ([str]): the formatted messages, oldest first.
+
+        """
+        keys = list()
+        if service_name is not None:
+            keys.append(service_key(service_name, service_shard))
+        if submission_id is not None:
+            keys.append(submission_key(submission_id))
+        if user_test_id is not None:
+            keys.append(user_test_key(user_test_id))
+
+        self.file_handler.flush()
+        return list(itertools.islice(
+            query_logs(self.log_dir, keys, since, until), limit))
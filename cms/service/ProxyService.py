@@ -28,6 +28,7 @@
 
 """
 
+import gzip
 import json
 import logging
 import string
@@ -42,8 +43,10 @@ from sqlalchemy import not_
 from cms import config
 from cms.db import SessionGen, Contest, Participation, Task, Submission, \
     get_submissions
-from cms.io import Executor, QueueItem, TriggeredService, rpc_method
+from cms.io import Executor, QueueItem, TriggeredService, rpc_method, \
+    rpc_batch_method
 from cmscommon.datetime import make_timestamp
+from cmscommon.digest import json_digest
 
 
 logger = logging.getLogger(__name__)
@@ -69,37 +72,6 @@ def encode_id(entity_id):
     return encoded_id
 
 
-def safe_put_data(ranking, resource, data, operation):
-    """Send some data to ranking using a PUT request.
-
-    ranking (bytes): the URL of ranking server.
-    resource (bytes): the relative path of the entity.
-    data (dict): the data to JSON-encode and send.
-    operation (unicode): a human-readable description of the operation
-        we're performing (to produce log messages).
-
-    raise (CannotSendError): in case of communication errors.
-
-    """
-    try:
-        url = urljoin(ranking, resource)
-        # XXX With requests-1.2 auth is automatically extracted from
-        # the URL: there is no need for this.
-        auth = urlsplit(url)
-        res = requests.put(url, json.dumps(data),
-                           auth=(auth.username, auth.password),
-                           headers={'content-type': 'application/json'},
-                           verify=config.https_certfile)
-    except requests.exceptions.RequestException as error:
-        msg = "%s while %s: %s." % (type(error).__name__, operation, error)
-        logger.warning(msg)
-        raise CannotSendError(msg)
-    if 400 <= res.status_code < 600:
-        msg = "Status %s while %s." % (res.status_code, operation)
-        logger.warning(msg)
-        raise CannotSendError(msg)
-
-
 def safe_url(url):
     """Return a sanitized URL without sensitive information.
 
@@ -138,6 +110,13 @@ class ProxyExecutor(Executor):
     to minimize the number of actual HTTP requests: they'll be at most
     one per entity type.
 
+    Entities that the ranking already has, with the same data, are not
+    sent again: the executor asks the ranking for the digests of the
+    entities it holds and then keeps them up-to-date with what it
+    sends. All requests go through a single HTTP session, reusing the
+    connections, and their bodies are compressed if the ranking
+    accepts it.
+
     Each entity type is identified by a integral class-level constant.
 
     """
@@ -181,6 +160,102 @@ class ProxyExecutor(Executor):
         self._ranking = ranking
         self._visible_ranking = safe_url(ranking)
 
+        # XXX With requests-1.2 auth is automatically extracted from
+        # the URL: there is no need for this.
+        auth = urlsplit(ranking)
+        self._session = requests.Session()
+        self._session.auth = (auth.username, auth.password)
+        self._session.verify = config.https_certfile
+
+        # Whether the ranking accepts gzip-compressed bodies, as told
+        # by the Accept-Encoding header of its responses (RFC 7694).
+        self._gzip = False
+
+        # For each entity type, the digests of the entities held by the
+        # ranking, by key, or None if they have to be fetched.
+        self._digests = [None] * self.TYPE_COUNT
+
+    def forget_digests(self):
+        """Fetch again what the ranking has before sending data.
+
+        """
+        self._digests = [None] * self.TYPE_COUNT
+
+    def _request(self, method, resource, operation, **kwargs):
+        """Send a request to the ranking.
+
+        method (str): the HTTP method.
+        resource (str): the relative path of the entities.
+        operation (str): a human-readable description of the operation
+            we're performing (to produce log messages).
+        kwargs (dict): further arguments for requests.
+
+        return (requests.Response): the response of the ranking.
+
+        raise (CannotSendError): in case of communication errors.
+
+        """
+        try:
+            res = self._session.request(
+                method, urljoin(self._ranking, resource), **kwargs)
+        except requests.exceptions.RequestException as error:
+            msg = "%s while %s: %s." % (type(error).__name__, operation,
+                                        error)
+            logger.warning(msg)
+            raise CannotSendError(msg)
+        if 400 <= res.status_code < 600:
+            msg = "Status %s while %s." % (res.status_code, operation)
+            logger.warning(msg)
+            raise CannotSendError(msg)
+        self._gzip = "gzip" in res.headers.get("Accept-Encoding", "")
+        return res
+
+    def _fetch_digests(self, name):
+        """Return the digests of the entities held by the ranking.
+
+        name (str): the resource path of the entity type.
+
+        return ({str: str}): the digest of each entity, by key.
+
+        raise (CannotSendError): in case of communication errors.
+
+        """
+        operation = "fetching %s from ranking %s" % (
+            name, self._visible_ranking)
+        res = self._request("GET", "%s/" % name, operation,
+                            params={"digests": ""},
+                            headers={"Accept": "application/json"})
+        try:
+            data = res.json()
+        except ValueError as error:
+            msg = "Invalid JSON while %s: %s." % (operation, error)
+            logger.warning(msg)
+            raise CannotSendError(msg)
+        # Older rankings ignore the parameter and send the whole data.
+        return {key: value if isinstance(value, str) else json_digest(value)
+                for key, value in data.items()}
+
+    def _put_data(self, name, data):
+        """Send some entities to the ranking using a PUT request.
+
+        name (str): the resource path of the entity type.
+        data ({str: dict}): the data of the entities, by key.
+
+        raise (CannotSendError): in case of communication errors.
+
+        """
+        operation = "sending %s to ranking %s" % (
+            name, self._visible_ranking)
+        logger.debug(operation.capitalize())
+
+        body = json.dumps(data).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self._gzip:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self._request("PUT", "%s/" % name, operation,
+                      data=body, headers=headers)
+
     def execute(self, entries):
         """Consume (i.e. send) the data put in the queue, forever.
 
@@ -213,16 +288,27 @@ class ProxyExecutor(Executor):
                     # We abuse the resource path as the English
                     # (plural) name for the entity type.
                     name = self.RESOURCE_PATHS[i]
-                    operation = "sending %s to ranking %s" % (
-                                    name, self._visible_ranking)
 
-                    logger.debug(operation.capitalize())
-                    safe_put_data(
-                        self._ranking, "%s/" % name, data[i], operation)
+                    if self._digests[i] is None:
+                        self._digests[i] = self._fetch_digests(name)
+                    digests = self._digests[i]
+
+                    # Send only what the ranking doesn't have yet.
+                    new_digests = dict()
+                    for key, value in data[i].items():
+                        digest = json_digest(value)
+                        if digests.get(key) != digest:
+                            new_digests[key] = digest
+                    if len(new_digests) > 0:
+                        self._put_data(name, {key: data[i][key]
+                                              for key in new_digests})
+                        digests.update(new_digests)
                     data[i].clear()
 
         except CannotSendError:
-            # A log message has already been produced.
+            # A log message has already been produced. The ranking
+            # might have been restarted, or its data deleted.
+            self.forget_digests()
             gevent.sleep(self.FAILURE_WAIT)
         except:
             # Whoa! That's unexpected!
@@ -451,10 +537,13 @@ class ProxyService(TriggeredService):
 
         This method is usually called via RPC when someone knows that
         some basic data (i.e. contest, tasks or users) changed and
-        rankings need to be updated.
+        rankings need to be updated. What the rankings hold is fetched
+        again, so that only the entities that differ are sent.
 
         """
         logger.info("Reinitializing rankings.")
+        for executor in self._executors:
+            executor.forget_digests()
         self.initialize()
 
     @rpc_method
@@ -470,37 +559,73 @@ class ProxyService(TriggeredService):
 
         """
         with SessionGen() as session:
-            submission = Submission.get_from_id(submission_id, session)
+            self._submission_scored(session, submission_id)
 
-            if submission is None:
-                logger.error("[submission_scored] Received score request for "
-                             "unexistent submission id %s.", submission_id)
-                raise KeyError("Submission not found.")
+    @rpc_batch_method("submission_scored")
+    def submission_scored_batch(self, calls):
+        """Notice that some submissions have been scored.
 
-            # ScoringService sent us a submission of another contest, they
-            # do not know about our contest_id in multicontest setup.
-            if submission.task.contest_id != self.contest_id:
-                logger.debug("Ignoring submission %d of contest %d "
-                             "(this ProxyService considers contest %d only).",
-                             submission.id, submission.task.contest_id,
-                             self.contest_id)
-                return
+        Handle many calls to submission_scored using a single session,
+        and loading all the submissions with a single query. Unknown
+        submissions are logged and skipped.
 
-            if submission.participation.hidden:
-                logger.info("[submission_scored] Score for submission %d "
-                            "not sent because the participation is hidden.",
-                            submission_id)
-                return
+        calls ([dict]): the arguments of each call.
 
-            if not submission.official:
-                logger.info("[submission_scored] Score for submission %d "
-                            "not sent because the submission is not official.",
-                            submission_id)
-                return
+        return ([None]): the result of each call.
 
-            # Update RWS.
-            for operation in self.operations_for_score(submission):
-                self.enqueue(operation)
+        """
+        with SessionGen() as session:
+            submission_ids = [call["submission_id"] for call in calls]
+            # Populate the identity map of the session.
+            session.query(Submission) \
+                .filter(Submission.id.in_(submission_ids)).all()
+            for submission_id in submission_ids:
+                try:
+                    self._submission_scored(session, submission_id)
+                except KeyError:
+                    pass
+        return [None] * len(calls)
+
+    def _submission_scored(self, session, submission_id):
+        """Send the score of a submission to the rankings, if needed.
+
+        session (Session): the database session to use.
+        submission_id (int): the id of the submission that changed.
+
+        raise (KeyError): if the submission doesn't exist.
+
+        """
+        submission = Submission.get_from_id(submission_id, session)
+
+        if submission is None:
+            logger.error("[submission_scored] Received score request for "
+                         "unexistent submission id %s.", submission_id)
+            raise KeyError("Submission not found.")
+
+        # ScoringService sent us a submission of another contest, they
+        # do not know about our contest_id in multicontest setup.
+        if submission.task.contest_id != self.contest_id:
+            logger.debug("Ignoring submission %d of contest %d "
+                         "(this ProxyService considers contest %d only).",
+                         submission.id, submission.task.contest_id,
+                         self.contest_id)
+            return
+
+        if submission.participation.hidden:
+            logger.info("[submission_scored] Score for submission %d "
+                        "not sent because the participation is hidden.",
+                        submission_id)
+            return
+
+        if not submission.official:
+            logger.info("[submission_scored] Score for submission %d "
+                        "not sent because the submission is not official.",
+                        submission_id)
+            return
+
+        # Update RWS.
+        for operation in self.operations_for_score(submission):
+            self.enqueue(operation)
 
     @rpc_method
     def submission_tokened(self, submission_id):
@@ -33,6 +33,7 @@ import time
 from collections import defaultdict, deque
 from shlex import quote as shell_quote
 
+import gevent
 import psutil
 from gevent import subprocess
 
@@ -49,6 +50,8 @@ B_TO_MB = 1024 * 1024
 
 MAX_RESOURCE_SECONDS = 11 * 60  # MAX time window for remote resource query
 
+RPC_STATS_TIMEOUT = 2  # How long to wait for the RPC stats of a service
+
 PSUTIL_PROC_ATTRS = \
     ["cmdline", "cpu_times", "create_time", "memory_info", "num_threads"]
 
@@ -419,6 +422,33 @@ class ResourceService(Service):
         result.reverse()
         return result
 
+    @rpc_method
+    def get_rpc_stats(self):
+        """Return the RPC statistics of the local services.
+
+        Services that are not connected or that don't answer in time
+        are omitted; the connections are opened at the first request,
+        so the following ones will include them if they are running.
+
+        return (dict): a map from the services (as name,shard) to their
+            RPC statistics (see Service.rpc_stats).
+
+        """
+        results = dict()
+        for service in self._local_services:
+            if service == self._my_coord:
+                continue
+            remote_service = self.connect_to(service)
+            if remote_service.connected:
+                results[service] = remote_service.rpc_stats()
+        gevent.wait(list(results.values()), timeout=RPC_STATS_TIMEOUT)
+
+        stats = dict(("%s" % (service,), result.value)
+                     for service, result in results.items()
+                     if result.ready() and result.successful())
+        stats["%s" % (self._my_coord,)] = self.rpc_stats()
+        return stats
+
     @rpc_method
     def kill_service(self, service):
         """Restart the service. Note that after calling successfully
@@ -26,9 +26,16 @@
 """
 
 import logging
+from collections import defaultdict
 
-from cms import ServiceCoord, config
-from cms.db import SessionGen, Submission, Dataset, get_submission_results
+import gevent.lock
+from sqlalchemy import and_
+from sqlalchemy.orm import joinedload, subqueryload
+
+from cms import ServiceCoord, config, get_service_shards
+from cms.db import SessionGen, Submission, SubmissionResult, Dataset, \
+    Task, TaskScore, get_submission_results
+from cms.grading.scoring import invalidate_task_scores, update_task_scores
 from cms.io import Executor, TriggeredService, rpc_method
 from cmscommon.datetime import make_datetime
 from .scoringoperations import ScoringOperation, get_operations
@@ -38,78 +45,158 @@ logger = logging.getLogger(__name__)
 
 
 class ScoringExecutor(Executor):
-    def __init__(self, proxy_service):
-        super().__init__()
+    """Executor scoring submission results in batches.
+
+    The operations of a batch are grouped by dataset: for each one the
+    dataset, its testcases and the score type are loaded once, and the
+    submission results (with their submissions and evaluations) with a
+    couple of queries. Results are committed once per dataset.
+
+    """
+
+    # Maximum number of operations executed together.
+    MAX_OPERATIONS_PER_BATCH = 500
+
+    def __init__(self, proxy_service, contest_web_servers,
+                 task_scores_lock):
+        super().__init__(batch_executions=True)
         self.proxy_service = proxy_service
+        self.contest_web_servers = contest_web_servers
+        self.task_scores_lock = task_scores_lock
+
+    def max_operations_per_batch(self):
+        """Return the maximum number of operations in a batch."""
+        return ScoringExecutor.MAX_OPERATIONS_PER_BATCH
 
-    def execute(self, entry):
-        """Assign a score to a submission result.
+    def execute(self, entries):
+        """Assign a score to some submission results.
 
-        This is the core of ScoringService: here we retrieve the result
-        from the database, check if it is in the correct status,
-        instantiate its ScoreType, compute its score, store it back in
-        the database and tell ProxyService to update RWS if needed.
+        This is the core of ScoringService: here we retrieve the results
+        from the database, check if they are in the correct status,
+        instantiate their ScoreType, compute their score, store them
+        back in the database, update the stored task scores and tell
+        ProxyService to update RWS, and ContestWebServer to update the
+        contestants' pages, if needed. Errors on single operations are
+        logged and don't stop the others.
 
-        entry (QueueEntry): entry containing the operation to perform.
+        entries ([QueueEntry]): entries containing the operations to
+            perform.
 
         """
-        operation = entry.item
-        with SessionGen() as session:
-            # Obtain submission.
-            submission = Submission.get_from_id(operation.submission_id,
-                                                session)
-            if submission is None:
-                raise ValueError("Submission %d not found in the database." %
-                                 operation.submission_id)
-
-            # Obtain dataset.
-            dataset = Dataset.get_from_id(operation.dataset_id, session)
-            if dataset is None:
-                raise ValueError("Dataset %d not found in the database." %
-                                 operation.dataset_id)
-
-            # Obtain submission result.
-            submission_result = submission.get_result(dataset)
-
-            # It means it was not even compiled (for some reason).
+        submission_ids_by_dataset = defaultdict(list)
+        for entry in entries:
+            operation = entry.item
+            submission_ids_by_dataset[operation.dataset_id].append(
+                operation.submission_id)
+
+        for dataset_id, submission_ids in submission_ids_by_dataset.items():
+            with SessionGen() as session:
+                scored = self._score_dataset(session, dataset_id,
+                                             submission_ids)
+                # Store them, together with the new task scores.
+                with self.task_scores_lock:
+                    if len(scored) > 0:
+                        update_task_scores(
+                            session, scored[0].task,
+                            set(s.participation_id for s in scored))
+                    session.commit()
+
+                # Calls from the same greenlet are sent to ProxyService
+                # (and to each ContestWebServer) in a single batch.
+                for submission in scored:
+                    self.proxy_service.submission_scored(
+                        submission_id=submission.id, batch=True)
+                    for contest_web_server in self.contest_web_servers:
+                        contest_web_server.submission_status_changed(
+                            submission_id=submission.id, batch=True)
+
+    def _score_dataset(self, session, dataset_id, submission_ids):
+        """Score some submission results of a dataset.
+
+        session (Session): the database session to use.
+        dataset_id (int): the id of the dataset.
+        submission_ids ([int]): the ids of the submissions to score.
+
+        return ([Submission]): the scored submissions whose scores must
+            be sent to the rankings, i.e., those of the active dataset.
+
+        """
+        # Obtain dataset.
+        dataset = Dataset.get_from_id(dataset_id, session)
+        if dataset is None:
+            logger.error("Dataset %d not found in the database, cannot "
+                         "score %d submissions.",
+                         dataset_id, len(submission_ids))
+            return []
+        is_active = dataset is dataset.task.active_dataset
+        # Populate the identity map with the testcases, so that the
+        # evaluations can get their codenames without more queries.
+        dataset.testcases
+
+        # Obtain submission results.
+        submission_results = dict(
+            (sr.submission_id, sr)
+            for sr in session.query(SubmissionResult)
+            .filter(SubmissionResult.dataset_id == dataset_id)
+            .filter(SubmissionResult.submission_id.in_(submission_ids))
+            .options(joinedload(SubmissionResult.submission))
+            .options(subqueryload(SubmissionResult.evaluations))
+            .all())
+
+        # Instantiate the score type.
+        try:
+            score_type = dataset.score_type_object
+        except Exception:
+            logger.error("Cannot instantiate the score type of dataset "
+                         "%d, cannot score %d submissions.",
+                         dataset_id, len(submission_ids), exc_info=True)
+            return []
+
+        scored = []
+        for submission_id in submission_ids:
+            submission_result = submission_results.get(submission_id)
+
+            # It means it was not even compiled (for some reason), or
+            # that the submission doesn't exist.
             if submission_result is None:
-                raise ValueError("Submission result %d(%d) was not found." %
-                                 (operation.submission_id,
-                                  operation.dataset_id))
+                logger.error("Submission result %d(%d) was not found.",
+                             submission_id, dataset_id)
+                continue
 
             # Check if it's ready to be scored.
             if not submission_result.needs_scoring():
                 if submission_result.scored():
                     logger.info("Submission result %d(%d) is already scored.",
-                                operation.submission_id, operation.dataset_id)
-                    return
+                                submission_id, dataset_id)
                 else:
-                    raise ValueError("The state of the submission result "
-                                     "%d(%d) doesn't allow scoring." %
-                                     (operation.submission_id,
-                                      operation.dataset_id))
-
-            # Instantiate the score type.
-            score_type = dataset.score_type_object
+                    logger.error("The state of the submission result "
+                                 "%d(%d) doesn't allow scoring.",
+                                 submission_id, dataset_id)
+                continue
 
             # Compute score and fill it in the database.
-            submission_result.score, \
-                submission_result.score_details, \
-                submission_result.public_score, \
-                submission_result.public_score_details, \
-                submission_result.ranking_score_details = \
-                score_type.compute_score(submission_result)
-
-            # Store it.
-            session.commit()
+            try:
+                submission_result.score, \
+                    submission_result.score_details, \
+                    submission_result.public_score, \
+                    submission_result.public_score_details, \
+                    submission_result.ranking_score_details = \
+                    score_type.compute_score(submission_result)
+            except Exception:
+                logger.error("Unexpected error when scoring submission "
+                             "result %d(%d).", submission_id, dataset_id,
+                             exc_info=True)
+                continue
 
             # If dataset is the active one, update RWS.
-            if dataset is submission.task.active_dataset:
+            if is_active:
+                submission = submission_result.submission
                 logger.info(
                     "Submission scored %.1f seconds after submission",
                     (make_datetime() - submission.timestamp).total_seconds())
-                self.proxy_service.submission_scored(
-                    submission_id=submission.id)
+                scored.append(submission)
+
+        return scored
 
 
 class ScoringService(TriggeredService):
@@ -137,7 +224,20 @@ class ScoringService(TriggeredService):
             ServiceCoord("ProxyService", 0),
             must_be_present=ranking_enabled)
 
-        self.add_executor(ScoringExecutor(self.proxy_service))
+        # Set up communication with ContestWebServers, which show the
+        # scores to the contestants as soon as they're computed.
+        self.contest_web_servers = []
+        for i in range(get_service_shards("ContestWebServer")):
+            self.contest_web_servers.append(self.connect_to(
+                ServiceCoord("ContestWebServer", i)))
+
+        # Held while writing TaskScores, so that concurrent updates
+        # don't try to create the same one.
+        self.task_scores_lock = gevent.lock.RLock()
+
+        self.add_executor(ScoringExecutor(self.proxy_service,
+                                          self.contest_web_servers,
+                                          self.task_scores_lock))
         self.start_sweeper(347.0)
 
     def _missing_operations(self):
@@ -153,8 +253,76 @@ class ScoringService(TriggeredService):
             for operation, timestamp in get_operations(session):
                 self.enqueue(operation, timestamp=timestamp)
                 counter += 1
+        self._store_missing_task_scores()
         return counter
 
+    def _store_missing_task_scores(self):
+        """Store the task scores that have been invalidated.
+
+        Scores are invalidated when something they depend on changes;
+        usually, they are stored again soon, when the submissions are
+        scored, but this catches the other cases.
+
+        """
+        with SessionGen() as session, self.task_scores_lock:
+            missing = session.query(Submission.task_id,
+                                    Submission.participation_id)\
+                .outerjoin(TaskScore, and_(
+                    TaskScore.task_id == Submission.task_id,
+                    TaskScore.participation_id
+                    == Submission.participation_id))\
+                .filter(Submission.official.is_(True))\
+                .filter(TaskScore.id.is_(None))\
+                .distinct().all()
+            participation_ids = defaultdict(set)
+            for task_id, participation_id in missing:
+                participation_ids[task_id].add(participation_id)
+            for task_id, ids in participation_ids.items():
+                update_task_scores(session, Task.get_from_id(task_id, session),
+                                   ids)
+            session.commit()
+        if len(missing) > 0:
+            logger.info("Stored %d missing task scores.", len(missing))
+
+    @rpc_method
+    def update_task_score(self, participation_id, task_id):
+        """Compute again the score of a participation on a task.
+
+        Called when something changes the score without changing the
+        submission results, for example when a token is played.
+
+        participation_id (int): the id of the participation.
+        task_id (int): the id of the task.
+
+        """
+        with SessionGen() as session, self.task_scores_lock:
+            task = Task.get_from_id(task_id, session)
+            if task is None:
+                logger.error("[update_task_score] Task %d not found.",
+                             task_id)
+                return
+            update_task_scores(session, task, [participation_id])
+            session.commit()
+
+    @rpc_method
+    def dataset_updated(self, task_id):
+        """Compute again the scores of all participations on a task.
+
+        Called when the active dataset or the score mode of the task
+        change.
+
+        task_id (int): the id of the task.
+
+        """
+        with SessionGen() as session, self.task_scores_lock:
+            task = Task.get_from_id(task_id, session)
+            if task is None:
+                logger.error("[dataset_updated] Task %d not found.", task_id)
+                return
+            count = update_task_scores(session, task)
+            session.commit()
+        logger.info("Stored %d task scores for task %d.", count, task_id)
+
     @rpc_method
     def new_evaluation(self, submission_id, dataset_id):
         """Schedule the given submission result for scoring.
@@ -219,6 +387,8 @@ class ScoringService(TriggeredService):
                         ScoringOperation(sr.submission_id, sr.dataset_id),
                         sr.submission.timestamp))
 
+            invalidate_task_scores(session, contest_id, participation_id,
+                                   task_id, submission_id, dataset_id)
             session.commit()
 
         for item, timestamp in temp_queue:
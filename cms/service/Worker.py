@@ -118,6 +118,12 @@ class Worker(Service):
         if self.work_lock.acquire(False):
             try:
                 logger.info("Starting job group.")
+                if self._fake_worker_time is None:
+                    # Start fetching the files of all the jobs, so that
+                    # the downloads for the later ones overlap with the
+                    # execution of the earlier ones.
+                    self.file_cacher.prefetch(
+                        Worker._get_job_group_digests(job_group))
                 for job in job_group.jobs:
                     logger.info("Starting job.",
                                 extra={"operation": job.info})
@@ -159,6 +165,27 @@ class Worker(Service):
             self._finalize(start_time)
             raise JobException(err_msg)
 
+    @staticmethod
+    def _get_job_group_digests(job_group):
+        """Return the digests of all files needed by a job group.
+
+        job_group (JobGroup): the job group.
+
+        return ([unicode]): the digests, without duplicates, in the
+            order in which the jobs will probably need them.
+
+        """
+        digests = dict()
+        for job in job_group.jobs:
+            for files in (job.files, job.managers, job.executables):
+                for file_ in files.values():
+                    digests[file_.digest] = None
+            if isinstance(job, EvaluationJob):
+                for digest in (job.input, job.output):
+                    if digest is not None:
+                        digests[digest] = None
+        return list(digests)
+
     def _fake_work(self, job):
         """Fill the job with fake success data after waiting for some time."""
         time.sleep(self._fake_worker_time)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A rotating and indexed store for the log records of LogService.
+
+Records are written, formatted as text, to segment files named after
+the time they were started (T.log, or T-N.log if more segments are
+started in the same second). Each segment has an index (T.idx) with a
+JSON line for each block of records written at once, holding:
+- offset: the position of the block in the segment;
+- lengths: the length of each record of the block;
+- start and end: the minimum and maximum creation time of the records;
+- keys: for each key, the positions in the block of the records that
+  have it.
+The keys of a record are the coordinates of the service that produced
+it (e.g., "Worker,2") and the submissions and user tests mentioned in
+its operation or message (e.g., "submission:42"). Queries read the
+indices and then only the records that match.
+
+"""
+
+import json
+import logging
+import os
+import re
+import time
+
+import gevent
+import gevent.event
+import gevent.lock
+
+
+logger = logging.getLogger(__name__)
+
+
+ENTITY_RE = re.compile(r"\b(submission|user test) (\d+)", re.IGNORECASE)
+SEGMENT_RE = re.compile(r"^([0-9]+)(?:-([0-9]+))?\.idx$")
+
+
+def service_key(name, shard):
+    """Return the key of the records of the given service."""
+    return "%s,%d" % (name, shard)
+
+
+def submission_key(submission_id):
+    """Return the key of the records about the given submission."""
+    return "submission:%d" % submission_id
+
+
+def user_test_key(user_test_id):
+    """Return the key of the records about the given user test."""
+    return "user_test:%d" % user_test_id
+
+
+def get_record_keys(record):
+    """Return the keys under which to index a record.
+
+    record (LogRecord): the record.
+
+    return ({str}): its keys.
+
+    """
+    keys = set()
+    if hasattr(record, "service_name") and hasattr(record, "service_shard"):
+        keys.add(service_key(record.service_name, int(record.service_shard)))
+    for text in (getattr(record, "operation", None), record.getMessage()):
+        if not text:
+            continue
+        for kind, entity_id in ENTITY_RE.findall(text):
+            keys.add("%s:%s" % (kind.lower().replace(" ", "_"), entity_id))
+    return keys
+
+
+class LogStore(logging.Handler):
+    """A logging handler writing to an indexed, rotating store.
+
+    Records are buffered in memory and written by a background
+    greenlet, at most FLUSH_INTERVAL seconds after they arrive (or
+    sooner, if the buffer grows beyond MAX_BUFFER_SIZE bytes).
+
+    """
+    FLUSH_INTERVAL = 1.0
+    MAX_BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, directory, rotation_size=None,
+                 rotation_interval=None):
+        """Initialize the store.
+
+        directory (str): where to put segments and indices; it must
+            exist.
+        rotation_size (int|None): the size (in bytes) after which a
+            segment is closed and a new one started, or None.
+        rotation_interval (float|None): the time (in seconds) after
+            which a segment is closed and a new one started, or None.
+
+        """
+        logging.Handler.__init__(self)
+        self.directory = directory
+        self.rotation_size = rotation_size
+        self.rotation_interval = rotation_interval
+
+        # Formatted records, their creation time and keys.
+        self._buffer = list()
+        self._buffer_size = 0
+        self._flush_requested = gevent.event.Event()
+        self._flusher = None
+
+        self._segment = None
+        self._index = None
+        self._segment_started = None
+
+    def createLock(self):
+        """Set self.lock to a new gevent RLock.
+
+        """
+        self.lock = gevent.lock.RLock()
+
+    def emit(self, record):
+        """Buffer a record to be written.
+
+        record (LogRecord): the record.
+
+        """
+        try:
+            text = (self.format(record) + "\n").encode("utf-8")
+            self._buffer.append((text, record.created,
+                                 get_record_keys(record)))
+            self._buffer_size += len(text)
+            if self._flusher is None:
+                self._flusher = gevent.spawn(self._flush_forever)
+            if self._buffer_size >= self.MAX_BUFFER_SIZE:
+                self._flush_requested.set()
+        except Exception:
+            self.handleError(record)
+
+    def _flush_forever(self):
+        """Write the buffered records periodically."""
+        while True:
+            self._flush_requested.wait(timeout=self.FLUSH_INTERVAL)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except OSError:
+                logger.error("Cannot write log records.", exc_info=True)
+
+    def flush(self):
+        """Write the buffered records as a new block.
+
+        raise (OSError): if writing fails.
+
+        """
+        with self.lock:
+            if len(self._buffer) == 0:
+                return
+            records, self._buffer = self._buffer, list()
+            self._buffer_size = 0
+
+            if self._must_rotate():
+                self._rotate()
+
+            keys = dict()
+            for position, (_, _, record_keys) in enumerate(records):
+                for key in record_keys:
+                    keys.setdefault(key, []).append(position)
+            entry = {
+                "offset": self._segment.tell(),
+                "lengths": [len(text) for text, _, _ in records],
+                "start": min(created for _, created, _ in records),
+                "end": max(created for _, created, _ in records),
+                "keys": keys,
+            }
+
+            self._segment.write(b"".join(text for text, _, _ in records))
+            self._segment.flush()
+            # The index is written after the data, so that it never
+            # refers to data that is not there.
+            self._index.write(json.dumps(entry) + "\n")
+            self._index.flush()
+
+    def _must_rotate(self):
+        """Return whether to start a new segment before writing."""
+        if self._segment is None:
+            return True
+        if self.rotation_size is not None \
+                and self._segment.tell() >= self.rotation_size:
+            return True
+        if self.rotation_interval is not None \
+                and time.time() >= \
+                self._segment_started + self.rotation_interval:
+            return True
+        return False
+
+    def _rotate(self):
+        """Close the current segment (if any) and start a new one."""
+        self._close_segment()
+
+        self._segment_started = time.time()
+        base = "%d" % int(self._segment_started)
+        counter = 0
+        while True:
+            name = base if counter == 0 else "%s-%d" % (base, counter)
+            try:
+                self._segment = open(
+                    os.path.join(self.directory, name + ".log"), "xb")
+                break
+            except FileExistsError:
+                counter += 1
+        self._index = open(os.path.join(self.directory, name + ".idx"),
+                           "wt", encoding="utf-8")
+
+        # Provide a symlink to the latest log file.
+        try:
+            os.remove(os.path.join(self.directory, "last.log"))
+        except OSError:
+            pass
+        os.symlink(name + ".log", os.path.join(self.directory, "last.log"))
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = None
+            self._index = None
+
+    def close(self):
+        """Write the buffered records and close the files."""
+        with self.lock:
+            try:
+                self.flush()
+            finally:
+                self._close_segment()
+                if self._flusher is not None:
+                    self._flusher.kill(block=False)
+                    self._flusher = None
+        logging.Handler.close(self)
+
+
+def _list_segments(directory):
+    """Return the indexed segments in the directory, oldest first.
+
+    directory (str): the directory of a LogStore.
+
+    return ([str]): the paths of the segments, without extension.
+
+    """
+    segments = list()
+    for filename in os.listdir(directory):
+        match = SEGMENT_RE.match(filename)
+        if match is not None:
+            segments.append(((int(match.group(1)), int(match.group(2) or 0)),
+                             os.path.join(directory, filename[:-4])))
+    return [path for _, path in sorted(segments)]
+
+
+def query_logs(directory, keys=(), since=None, until=None):
+    """Yield the stored records matching the given criteria.
+
+    Only the indices and the matching records are read. Time bounds
+    are checked on whole blocks, hence some records slightly outside
+    of them can be returned.
+
+    directory (str): the directory of a LogStore.
+    keys ([str]): the keys that the records must all have (see
+        service_key, submission_key and user_test_key).
+    since (float|None): return only records created after this time.
+    until (float|None): return only records created before this time.
+
+    yield (str): the formatted records, oldest segment first.
+
+    """
+    for path in _list_segments(directory):
+        try:
+            index = open(path + ".idx", "rt", encoding="utf-8")
+            segment = open(path + ".log", "rb")
+        except OSError:
+            continue
+        with index, segment:
+            for line in index:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line might be still being written.
+                    continue
+                if since is not None and entry["end"] < since:
+                    continue
+                if until is not None and entry["start"] > until:
+                    continue
+
+                lengths = entry["lengths"]
+                if len(keys) == 0:
+                    positions = range(len(lengths))
+                else:
+                    matching = [set(entry["keys"].get(key, ()))
+                                for key in keys]
+                    positions = sorted(set.intersection(*matching))
+                if len(positions) == 0:
+                    continue
+
+                offsets = [entry["offset"]]
+                for length in lengths[:-1]:
+                    offsets.append(offsets[-1] + length)
+                for position in positions:
+                    segment.seek(offsets[position])
+                    yield segment.read(lengths[position]) \
+                        .decode("utf-8").rstrip("\n")
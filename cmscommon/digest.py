@@ -18,12 +18,13 @@
 
 import hashlib
 import io
+import json
 
 from cmscommon.binary import bin_to_hex
 
 
 __all__ = [
-    "Digester", "bytes_digest", "path_digest"
+    "Digester", "bytes_digest", "json_digest", "path_digest"
 ]
 
 
@@ -58,6 +59,22 @@ def bytes_digest(b):
     return d.digest()
 
 
+def json_digest(data):
+    """Return the digest of some JSON-encodable data.
+
+    The data is encoded in a canonical way (with sorted keys and no
+    whitespace), so that equal data has the same digest even if it was
+    built, or decoded, in different ways.
+
+    data (object): some JSON-encodable data.
+
+    return (str): digest of the data.
+
+    """
+    return bytes_digest(json.dumps(
+        data, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
 def path_digest(path):
     """Return the digest of the content of a file, given by its path.
 
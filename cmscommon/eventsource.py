@@ -18,12 +18,10 @@
 
 import re
 import time
-from collections import deque
-from weakref import WeakSet
 
 from gevent import Timeout
+from gevent.event import Event
 from gevent.pywsgi import WSGIHandler
-from gevent.queue import Queue, Empty
 from werkzeug.exceptions import NotAcceptable
 from werkzeug.wrappers import Request
 
@@ -80,9 +78,10 @@ class Publisher:
 
     Publish-subscribe is actually an improper name, as there's just one
     "topic", making it a simple broadcast system. The publisher class
-    is responsible for receiving messages to be sent, keeping them in
-    a cache for a while, instantiating subscribers, each with its own
-    queue, and pushing new messages to all these queues.
+    is responsible for receiving messages to be sent, encoding them
+    once and keeping them in a ring buffer, and instantiating
+    subscribers, which read from the buffer at their own pace. Hence
+    sending a message doesn't depend on the number of subscribers.
 
     """
     def __init__(self, size):
@@ -91,31 +90,74 @@ class Publisher:
         size (int): the number of messages to keep in cache.
 
         """
-        # We use a deque as it's efficient to add messages to one end
-        # and have the ones at the other end be dropped when the total
-        # number exceeds the given limit.
-        self._cache = deque(maxlen=size)
-        # We use a WeakSet as we want queues to be vanish automatically
-        # when no one else is using (i.e. fetching from) them.
-        self._sub_queues = WeakSet()
-
-    def put(self, event, data):
+        self._size = size
+        # The ring buffer: the message with index i (counting from
+        # the first ever published) is in position i % size, as long
+        # as it's one of the last size messages. For each one we keep
+        # its key (which grows with i), its encoding and the value
+        # that allows it to be coalesced.
+        self._keys = [None] * size
+        self._msgs = [None] * size
+        self._coalesce = [None] * size
+        # The number of messages published so far.
+        self._count = 0
+        # The key of the last message dropped from the buffer (or the
+        # time the publisher was created): clients whose last message
+        # is older than it may have missed some.
+        self._dropped_key = int(time.time() * 1_000_000)
+        # Set (and replaced) when a message is published.
+        self._new_message = Event()
+
+    def _first(self):
+        """Return the index of the oldest message in the buffer."""
+        return max(0, self._count - self._size)
+
+    def _key(self, index):
+        return self._keys[index % self._size]
+
+    def put(self, event, data, coalesce=None):
         """Dispatch a new item to all subscribers.
 
         See format_event for details about the parameters.
 
         event (unicode): the type of event the client will receive.
         data (unicode): the associated data.
+        coalesce (object|None): if not None, a subscriber that finds
+            this message together with later ones having the same
+            value receives only the last of them (i.e., the message
+            supersedes the earlier ones).
 
         """
-        # Number of microseconds since epoch.
+        # Number of microseconds since epoch, but always increasing.
         key = int(time.time() * 1_000_000)
+        if self._count > 0:
+            key = max(key, self._key(self._count - 1) + 1)
         msg = format_event("%x" % key, event, data)
-        # Put into cache.
-        self._cache.append((key, msg))
-        # Send to all subscribers.
-        for queue in self._sub_queues:
-            queue.put(msg)
+        # Put into the buffer, overwriting the oldest message.
+        position = self._count % self._size
+        if self._count >= self._size:
+            self._dropped_key = self._keys[position]
+        self._keys[position] = key
+        self._msgs[position] = msg
+        self._coalesce[position] = coalesce
+        self._count += 1
+        # Wake up all subscribers.
+        new_message, self._new_message = self._new_message, Event()
+        new_message.set()
+
+    def get_last_event_id(self):
+        """Return the ID of the last message published.
+
+        A subscriber obtained with it receives exactly the messages
+        published afterwards.
+
+        return (unicode): the ID of the last message (or, if none has
+            been published, one that precedes all of them).
+
+        """
+        if self._count == 0:
+            return "%x" % self._dropped_key
+        return "%x" % self._key(self._count - 1)
 
     def get_subscriber(self, last_event_id=None):
         """Obtain a new subscriber.
@@ -131,23 +173,28 @@ class Publisher:
         return (Subscriber): a new subscriber instance.
 
         """
-        queue = Queue()
+        index = self._count
+        reinit = False
         # If a valid last_event_id is provided see if cache can supply
         # missed events.
         if last_event_id is not None and \
                 re.match("^[0-9A-Fa-f]+$", last_event_id):
             last_event_key = int(last_event_id, 16)
-            if len(self._cache) > 0 and last_event_key >= self._cache[0][0]:
-                # All missed events are in cache.
-                for key, msg in self._cache:
-                    if key > last_event_key:
-                        queue.put(msg)
+            if last_event_key >= self._dropped_key:
+                # All missed events are in cache: find the first one
+                # with binary search.
+                low, high = self._first(), self._count
+                while low < high:
+                    middle = (low + high) // 2
+                    if self._key(middle) > last_event_key:
+                        high = middle
+                    else:
+                        low = middle + 1
+                index = low
             else:
                 # Some events may be missing. Ask to reinit.
-                queue.put(b"event:reinit\n\n")
-        # Store the queue and return a subscriber bound to it.
-        self._sub_queues.add(queue)
-        return Subscriber(queue)
+                reinit = True
+        return Subscriber(self, index, reinit)
 
 
 class Subscriber:
@@ -157,39 +204,67 @@ class Subscriber:
     it.
 
     """
-    def __init__(self, queue):
+    REINIT = b"event:reinit\n\n"
+
+    def __init__(self, publisher, index, reinit=False):
         """Create a new subscriber.
 
-        Make it wait for messages on the given queue, managed by the
-        Publisher.
+        Make it read the messages of the given publisher, starting
+        from the given one.
 
-        queue (Queue): a message queue.
+        publisher (Publisher): the publisher.
+        index (int): the index of the first message to receive.
+        reinit (bool): whether to tell the client to reinit first.
 
         """
-        self._queue = queue
+        self._pub = publisher
+        self._index = index
+        self._reinit = reinit
 
     def get(self):
         """Retrieve new messages.
 
         Obtain all messages that were put in the associated publisher
         since this method was last called, or (on the first call) since
-        the last_event_id given to get_subscriber.
+        the last_event_id given to get_subscriber. If some of them have
+        already been removed from the cache (because this subscriber is
+        too slow) a reinit message is sent instead and the subscriber
+        skips to the next new message.
 
         return ([objects]): the items put in the publisher, in order
             (actually, returns a generator, not a list).
 
-        raise (OutdatedError): if some of the messages it's supposed to
-            retrieve have already been removed from the cache.
-
         """
+        pub = self._pub
         # Block until we have something to do.
-        self._queue.peek()
-        # Fetch all items that are immediately available.
-        try:
-            while True:
-                yield self._queue.get_nowait()
-        except Empty:
-            pass
+        while not self._reinit and self._index >= pub._count:
+            pub._new_message.wait()
+        if self._index < pub._first():
+            self._reinit = True
+            self._index = pub._count
+        if self._reinit:
+            self._reinit = False
+            yield self.REINIT
+
+        end = pub._count
+        indices = range(self._index, end)
+        self._index = end
+        # Drop the messages superseded by later ones.
+        if len(indices) > 1:
+            superseded = set()
+            kept = list()
+            for index in reversed(indices):
+                coalesce = pub._coalesce[index % pub._size]
+                if coalesce is not None:
+                    if coalesce in superseded:
+                        continue
+                    superseded.add(coalesce)
+                kept.append(index)
+            indices = reversed(kept)
+        # Take the messages before yielding them, as more may arrive
+        # meanwhile and overwrite them.
+        for msg in [pub._msgs[index % pub._size] for index in indices]:
+            yield msg
 
 
 class EventSource:
@@ -213,13 +288,17 @@ class EventSource:
 
     _CACHE_SIZE = 250
 
-    def __init__(self):
+    def __init__(self, size=None):
         """Create an event source.
 
+        size (int|None): the number of events kept for the clients
+            that reconnect, or None for _CACHE_SIZE.
+
         """
-        self._pub = Publisher(self._CACHE_SIZE)
+        self._pub = Publisher(size if size is not None
+                              else self._CACHE_SIZE)
 
-    def send(self, event, data):
+    def send(self, event, data, coalesce=None):
         """Send the event to the stream.
 
         Intended for subclasses to push new events to clients. See
@@ -227,9 +306,20 @@ class EventSource:
 
         event (unicode): the type of the event.
         data (unicode): the data of the event.
+        coalesce (object|None): see Publisher.put.
+
+        """
+        self._pub.put(event, data, coalesce)
+
+    def get_last_event_id(self):
+        """Return the ID of the last event sent.
+
+        See Publisher.get_last_event_id.
+
+        return (unicode): the ID.
 
         """
-        self._pub.put(event, data)
+        return self._pub.get_last_event_id()
 
     def __call__(self, environ, start_response):
         """Execute this instance as a WSGI application.
@@ -22,6 +22,7 @@
 and removes unreferenced file objects from the file store. If required,
 it also replaces all the executable digests in the database with a
 tombstone digest, to make executables removable in the clean pass.
+Optionally, it verifies that the remaining files match their digest.
 
 """
 
@@ -29,8 +30,9 @@ import argparse
 import logging
 import sys
 
-from cms.db import SessionGen, Digest, Executable, enumerate_files
-from cms.db.filecacher import FileCacher
+from cms.db import SessionGen, Digest, Executable, enumerate_files, \
+    enumerate_unreferenced_files
+from cms.db.filecacher import DBBackend, FileCacher
 
 
 logger = logging.getLogger()
@@ -45,20 +47,27 @@ def make_tombstone(session):
     logger.info("Replaced %d executables with the tombstone.", count)
 
 
-def clean_files(session, dry_run):
-    filecacher = FileCacher()
+def find_orphans(session, filecacher):
+    if isinstance(filecacher.backend, DBBackend):
+        # Let the database compute the difference.
+        return enumerate_unreferenced_files(session)
     files = set(file[0] for file in filecacher.list())
     logger.info("A total number of %d files are present in the file store",
                 len(files))
     found_digests = enumerate_files(session)
     logger.info("Found %d digests while scanning", len(found_digests))
-    files -= found_digests
+    return files - found_digests
+
+
+def clean_files(session, dry_run, workers=None):
+    filecacher = FileCacher()
+    files = find_orphans(session, filecacher)
     logger.info("%d digests are orphan.", len(files))
-    total_size = 0
-    for orphan in files:
-        total_size += filecacher.get_size(orphan)
+    sizes = filecacher.get_sizes(files, workers)
     logger.info("Orphan files take %s bytes of disk space",
-                "{:,}".format(total_size))
+                "{:,}".format(sum(sizes.values())))
+    # Deletions are committed one at a time, so an interrupted run
+    # resumes from where it stopped when launched again.
     if not dry_run:
         for count, orphan in enumerate(files):
             filecacher.delete(orphan)
@@ -67,19 +76,38 @@ def clean_files(session, dry_run):
         logger.info("All orphan files have been deleted")
 
 
+def check_files(workers=None, checkpoint_path=None):
+    filecacher = FileCacher()
+    if filecacher.check_backend_integrity(
+            workers=workers, checkpoint_path=checkpoint_path):
+        logger.info("All files have the expected digest")
+        return True
+    return False
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Remove unused file objects from the database. "
         "If -t is specified, also replace all executables with the tombstone")
     parser.add_argument("-t", "--tombstone", action="store_true")
     parser.add_argument("-n", "--dry-run", action="store_true")
+    parser.add_argument("-c", "--check", action="store_true",
+                        help="also verify the digest of all stored files")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="number of processes to use (default: one per "
+                        "CPU)")
+    parser.add_argument("--checkpoint", action="store",
+                        help="file where to record the progress of the "
+                        "check, to be able to resume it")
     args = parser.parse_args()
     with SessionGen() as session:
         if args.tombstone:
             make_tombstone(session)
-        clean_files(session, args.dry_run)
+        clean_files(session, args.dry_run, args.jobs)
         if not args.dry_run:
             session.commit()
+    if args.check and not check_files(args.jobs, args.checkpoint):
+        return 1
     return 0
 
 
@@ -44,6 +44,7 @@ import sys
 from cms import utf8_decoder
 from cms.db import SessionGen, User, Team, Participation, Task, Contest
 from cms.db.filecacher import FileCacher
+from cms.grading.scoring import invalidate_task_scores
 from cmscontrib.importing import ImportDataError, update_contest, update_task
 from cmscontrib.loaders import choose_loader, build_epilog
 
@@ -219,6 +220,8 @@ class ContestImporter:
                     "Could not reimport task \"%s\"." % taskname)
             logger.info("Task \"%s\" data has changed, updating it.", taskname)
             update_task(task, new_task, get_statements=not self.no_statements)
+            # The score type and its parameters may have changed.
+            invalidate_task_scores(session, task_id=task.id)
 
         else:
             # Task is in the DB, has changed, and the user didn't ask to update
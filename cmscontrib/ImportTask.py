@@ -42,6 +42,7 @@ import sys
 from cms import utf8_decoder
 from cms.db import SessionGen, Task
 from cms.db.filecacher import FileCacher
+from cms.grading.scoring import invalidate_task_scores
 from cmscontrib.importing import ImportDataError, contest_from_db, update_task
 from cmscontrib.loaders import choose_loader, build_epilog
 
@@ -149,6 +150,8 @@ class TaskImporter:
             logger.info(
                 "Task \"%s\" data has changed, updating it.", task.name)
             update_task(task, new_task, get_statements=not self.no_statement)
+            # The score type and its parameters may have changed.
+            invalidate_task_scores(session, task_id=task.id)
         else:
             logger.info("Task \"%s\" data has not changed.", task.name)
 
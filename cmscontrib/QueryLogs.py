@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This script prints the log messages stored by LogService about a
+submission, a user test or a service, using the indices of the log
+files instead of scanning them.
+
+"""
+
+import argparse
+import itertools
+import os
+import sys
+from datetime import datetime
+
+from cms import config
+from cms.service.logstore import query_logs, service_key, submission_key, \
+    user_test_key
+
+
+def parse_time(value):
+    """Parse a local date and time given in ISO format."""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid date: %r" % value)
+
+
+def parse_service(value):
+    """Parse a service coordinate given as name,shard."""
+    name, _, shard = value.partition(",")
+    try:
+        return service_key(name, int(shard or 0))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid service: %r" % value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the log messages collected by LogService.")
+    parser.add_argument("-s", "--service", action="store", type=parse_service,
+                        help="only messages of this service, as name,shard")
+    parser.add_argument("--submission", action="store", type=int,
+                        help="only messages about this submission id")
+    parser.add_argument("--user-test", action="store", type=int,
+                        help="only messages about this user test id")
+    parser.add_argument("--since", action="store", type=parse_time,
+                        help="only messages after this local time, "
+                        "e.g. 2024-05-20T10:30")
+    parser.add_argument("--until", action="store", type=parse_time,
+                        help="only messages before this local time")
+    parser.add_argument("-n", "--limit", action="store", type=int,
+                        help="print at most this many messages")
+    parser.add_argument("-d", "--directory", action="store",
+                        default=os.path.join(config.log_dir, "cms"),
+                        help="the directory of the log files of LogService")
+    args = parser.parse_args()
+
+    keys = list()
+    if args.service is not None:
+        keys.append(args.service)
+    if args.submission is not None:
+        keys.append(submission_key(args.submission))
+    if args.user_test is not None:
+        keys.append(user_test_key(args.user_test))
+
+    records = query_logs(args.directory, keys, args.since, args.until)
+    for record in itertools.islice(records, args.limit):
+        print(record)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
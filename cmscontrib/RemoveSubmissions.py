@@ -26,12 +26,17 @@ import sys
 from cms import utf8_decoder
 from cms.db import Participation, SessionGen, Submission, Task, User, \
     ask_for_contest
+from cms.grading.scoring import invalidate_task_scores
 
 
 def ask_and_remove(session, submissions):
     ans = input("This will delete %d submissions. Are you sure? [y/N] "
                 % len(submissions)).strip().lower()
     if ans in ["y", "yes"]:
+        for participation_id, task_id in set(
+                (s.participation_id, s.task_id) for s in submissions):
+            invalidate_task_scores(session, participation_id=participation_id,
+                                   task_id=task_id)
         for submission in submissions:
             session.delete(submission)
         session.commit()
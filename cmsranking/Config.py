@@ -56,6 +56,21 @@ class Config:
 
         # Buffers
         self.buffer_size = 100  # Needs to be strictly positive.
+        # Minimum time (in seconds) between two rebuilds of the snapshot.
+        self.snapshot_interval = 1.0
+
+        # Storage.
+        # "journal" (snapshots and an append-only journal) or "files"
+        # (a file per entity).
+        self.store_format = "journal"
+        self.journal_flush_interval = 0.5  # In seconds.
+
+        # Replication.
+        # Base URL of the RWS to replicate, or None if this is the one
+        # receiving data from ProxyService.
+        self.primary_url = None
+        # Number of changes kept for the replicas that reconnect.
+        self.replication_buffer_size = 10000  # Strictly positive.
 
         # File system.
         # TODO: move to cmscommon as it is used both here and in cms/conf.py
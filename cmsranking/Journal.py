@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""An append-only journal persisting the content of a Store.
+
+The directory of the journal contains a snapshot of the whole content
+(snapshot.N, a JSON object mapping keys to data) and the changes made
+after it (journal.N, a JSON array per line: [key, data] for a creation
+or an update, [key, null] for a deletion). The current content is
+obtained replaying the journal on the snapshot with the largest N.
+
+Changes are buffered in memory and appended by a background greenlet
+(at most FLUSH_INTERVAL seconds after they are made, or sooner if many
+accumulate), so that who makes them doesn't wait for the disk. When the
+journal grows larger than the snapshot a new snapshot is written (and N
+incremented), so that replaying stays cheap. The data is encoded in the
+calling greenlet, but the files are written (and synced) in the thread
+pool of the gevent hub, so that the other greenlets keep running.
+
+"""
+
+import json
+import logging
+import os
+import re
+
+import gevent
+import gevent.event
+import gevent.lock
+
+
+logger = logging.getLogger(__name__)
+
+
+FILE_RE = re.compile(r"^(snapshot|journal)\.([0-9]+)$")
+
+
+class Journal:
+    """The journal and the snapshots of a single Store.
+
+    """
+    FLUSH_INTERVAL = 0.5
+    MAX_BUFFER_RECORDS = 10000
+    # A snapshot is written when the journal holds more records than
+    # both this value and the number of entities in the last snapshot.
+    MIN_COMPACTION_RECORDS = 10000
+
+    def __init__(self, path, get_state, flush_interval=None):
+        """Initialize the journal.
+
+        path (str): the directory of the journal; it must exist.
+        get_state (function): called without arguments, it returns
+            the current content of the store, as a dict from keys to
+            data (i.e., including the changes not written yet).
+        flush_interval (float|None): the maximum time (in seconds)
+            that a change is kept in memory before being written, or
+            None for FLUSH_INTERVAL.
+
+        """
+        self._path = path
+        self._get_state = get_state
+        self._flush_interval = flush_interval \
+            if flush_interval is not None else self.FLUSH_INTERVAL
+
+        self._seq = None
+        self._file = None
+        self._records = 0
+        self._snapshot_size = 0
+
+        self._buffer = list()
+        self._lock = gevent.lock.RLock()
+        self._flush_requested = gevent.event.Event()
+        self._flusher = None
+
+    def _file_path(self, kind, seq):
+        return os.path.join(self._path, "%s.%d" % (kind, seq))
+
+    def _list_files(self):
+        """Return the sequence numbers of the snapshots and journals.
+
+        return (([int], [int])): the numbers of the snapshots and
+            those of the journals, sorted.
+
+        """
+        found = {"snapshot": [], "journal": []}
+        for name in os.listdir(self._path):
+            match = FILE_RE.match(name)
+            if match is not None:
+                found[match.group(1)].append(int(match.group(2)))
+        return sorted(found["snapshot"]), sorted(found["journal"])
+
+    def load(self):
+        """Read the content stored in the journal.
+
+        Also prepare the journal to be appended to, compacting it if
+        it's not empty.
+
+        return (dict|None): the stored content, as a dict from keys to
+            data, or None if the directory doesn't contain a journal
+            (i.e., it has never been used or it has the layout with a
+            file per entity).
+
+        raise (OSError): if the files cannot be read or written.
+        raise (ValueError): if the snapshot is not valid JSON.
+
+        """
+        snapshots, _ = self._list_files()
+        if len(snapshots) == 0:
+            return None
+        self._seq = snapshots[-1]
+
+        with open(self._file_path("snapshot", self._seq), "rt",
+                  encoding="utf-8") as snapshot:
+            state = json.load(snapshot)
+        self._snapshot_size = len(state)
+
+        records = 0
+        try:
+            journal = open(self._file_path("journal", self._seq), "rt",
+                           encoding="utf-8")
+        except FileNotFoundError:
+            pass
+        else:
+            with journal:
+                for line in journal:
+                    try:
+                        key, data = json.loads(line)
+                    except ValueError:
+                        # The last line might have been written only
+                        # partially: it's lost, and so are the
+                        # following ones (if any).
+                        logger.warning("Truncated journal, ignoring "
+                                       "its tail.",
+                                       extra={"location": journal.name})
+                        break
+                    if data is None:
+                        state.pop(key, None)
+                    else:
+                        state[key] = data
+                    records += 1
+
+        # Start from a fresh journal: this also gets rid of any
+        # partially written record.
+        if records > 0:
+            self.compact(state)
+        else:
+            self._open()
+            self._remove_older()
+        return state
+
+    def _open(self):
+        """Open the current journal for appending."""
+        self._file = open(self._file_path("journal", self._seq), "ab")
+        self._records = 0
+
+    def _remove_older(self):
+        """Delete the snapshots and journals before the current one."""
+        snapshots, journals = self._list_files()
+        for kind, seqs in [("snapshot", snapshots), ("journal", journals)]:
+            for seq in seqs:
+                if seq < self._seq:
+                    try:
+                        os.remove(self._file_path(kind, seq))
+                    except OSError:
+                        logger.warning("Cannot remove old %s %d.", kind, seq,
+                                       exc_info=True)
+
+    def compact(self, state):
+        """Write a new snapshot and start a new, empty journal.
+
+        state (dict): the content to write in the snapshot, as a dict
+            from keys to data; it must include the effects of all the
+            changes already written to the journal.
+
+        raise (OSError): if the files cannot be written.
+
+        """
+        with self._lock:
+            seq = self._seq + 1 if self._seq is not None else 0
+            path = self._file_path("snapshot", seq)
+            data = json.dumps(state).encode("utf-8")
+            gevent.get_hub().threadpool.apply(
+                self._write_snapshot, (path, data))
+
+            if self._file is not None:
+                self._file.close()
+            self._seq = seq
+            self._snapshot_size = len(state)
+            self._open()
+            self._remove_older()
+
+    @staticmethod
+    def _write_snapshot(path, data):
+        """Write a snapshot atomically (run in the thread pool).
+
+        path (str): the path of the snapshot.
+        data (bytes): its content.
+
+        """
+        with open(path + ".tmp", "wb") as snapshot:
+            snapshot.write(data)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.rename(path + ".tmp", path)
+
+    def _write_records(self, data):
+        """Append to the journal and sync it (run in the thread pool).
+
+        data (bytes): the encoded records.
+
+        """
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def put(self, key, data):
+        """Record the creation or the update of an entity.
+
+        key (str): the key of the entity.
+        data (dict): its new data.
+
+        """
+        self._append(key, data)
+
+    def delete(self, key):
+        """Record the deletion of an entity.
+
+        key (str): the key of the entity.
+
+        """
+        self._append(key, None)
+
+    def _append(self, key, data):
+        self._buffer.append((key, data))
+        if self._flusher is None:
+            self._flusher = gevent.spawn(self._flush_forever)
+        if len(self._buffer) >= self.MAX_BUFFER_RECORDS:
+            self._flush_requested.set()
+
+    def _flush_forever(self):
+        """Write the buffered changes periodically."""
+        while True:
+            self._flush_requested.wait(timeout=self._flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except OSError:
+                logger.error("Cannot write the journal.", exc_info=True)
+
+    def flush(self):
+        """Write the buffered changes, compacting if needed.
+
+        raise (OSError): if writing fails.
+
+        """
+        with self._lock:
+            if len(self._buffer) == 0:
+                return
+            records, self._buffer = self._buffer, list()
+
+            # The lock is held while writing, so that the records of
+            # concurrent flushes are written in order.
+            encoded = b"".join(
+                (json.dumps([key, data]) + "\n").encode("utf-8")
+                for key, data in records)
+            gevent.get_hub().threadpool.apply(self._write_records,
+                                              (encoded,))
+            self._records += len(records)
+
+            # The state may include changes made after the buffer has
+            # been taken: they will be written again to the new
+            # journal, and replaying them again is harmless.
+            if self._records > max(self.MIN_COMPACTION_RECORDS,
+                                   self._snapshot_size):
+                self.compact(self._get_state())
+
+    def close(self):
+        """Write the buffered changes and close the journal."""
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                if self._flusher is not None:
+                    self._flusher.kill(block=False)
+                    self._flusher = None
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
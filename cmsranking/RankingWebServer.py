@@ -18,6 +18,7 @@
 
 import argparse
 import functools
+import gzip
 import json
 import logging
 import os
@@ -26,12 +27,13 @@ import re
 import shutil
 import signal
 import time
+import zlib
 from datetime import datetime
 
 import gevent
 from gevent.pywsgi import WSGIServer
 from werkzeug.exceptions import HTTPException, BadRequest, Unauthorized, \
-    Forbidden, NotFound, NotAcceptable, UnsupportedMediaType
+    Forbidden, NotFound, NotAcceptable, UnsupportedMediaType, Gone
 from werkzeug.routing import Map, Rule
 from werkzeug.wrappers import Request, Response
 from werkzeug.wsgi import responder, wrap_file, SharedDataMiddleware, \
@@ -39,10 +41,12 @@ from werkzeug.wsgi import responder, wrap_file, SharedDataMiddleware, \
 
 # Needed for initialization. Do not remove.
 import cmsranking.Logger  # noqa
+from cmscommon.digest import json_digest
 from cmscommon.eventsource import EventSource
 from cmsranking.Config import Config
 from cmsranking.Contest import Contest
 from cmsranking.Entity import InvalidData
+from cmsranking.Replica import REPLICATED_STORES, Replica
 from cmsranking.Scoring import ScoringStore
 from cmsranking.Store import Store
 from cmsranking.Subchange import Subchange
@@ -55,6 +59,10 @@ from cmsranking.User import User
 logger = logging.getLogger(__name__)
 
 
+# Smaller bodies aren't worth compressing.
+MIN_COMPRESSED_SIZE = 1024
+
+
 class CustomUnauthorized(Unauthorized):
 
     def __init__(self, realm_name):
@@ -72,11 +80,13 @@ class CustomUnauthorized(Unauthorized):
 
 class StoreHandler:
 
-    def __init__(self, store, username, password, realm_name):
+    def __init__(self, store, username, password, realm_name,
+                 read_only=False):
         self.store = store
         self.username = username
         self.password = password
         self.realm_name = realm_name
+        self.read_only = read_only
 
         self.router = Map([
             Rule("/<key>", methods=["GET"], endpoint="get"),
@@ -102,6 +112,9 @@ class StoreHandler:
         request.encoding_errors = "strict"
 
         response = Response()
+        # Tell the clients they can compress the data they send (see
+        # RFC 7694).
+        response.headers['Accept-Encoding'] = "gzip"
 
         try:
             if endpoint == "get":
@@ -129,6 +142,13 @@ class StoreHandler:
             request.authorization.username == self.username and \
             request.authorization.password == self.password
 
+    def check_writable(self, request):
+        # Replicas receive their data from the primary only.
+        if self.read_only:
+            logger.warning("Write request to a replica.",
+                           extra={'location': request.url})
+            raise Forbidden()
+
     def get(self, request, response, key):
         # Limit charset of keys.
         if re.match("^[A-Za-z0-9_]+$", key) is None:
@@ -142,12 +162,47 @@ class StoreHandler:
         response.data = json.dumps(self.store.retrieve(key))
 
     def get_list(self, request, response):
+        data = self.store.retrieve_list()
+        # Clients that just want to know which entities differ from
+        # the ones they have can ask for their digests only.
+        if "digests" in request.args:
+            data = {key: json_digest(value) for key, value in data.items()}
+
         response.status_code = 200
         response.headers['Timestamp'] = "%0.6f" % time.time()
         response.mimetype = "application/json"
-        response.data = json.dumps(self.store.retrieve_list())
+        response.data = json.dumps(data)
+
+    def load_data(self, request):
+        """Return the JSON data sent with the request.
+
+        request (Request): a request whose body is JSON, possibly
+            compressed with gzip.
+
+        return (object): the decoded data.
+
+        raise (UnsupportedMediaType): if the encoding isn't supported.
+        raise (BadRequest): if the body isn't valid (compressed) JSON.
+
+        """
+        stream = request.stream
+        if request.content_encoding == "gzip":
+            stream = gzip.GzipFile(fileobj=stream, mode="rb")
+        elif request.content_encoding not in (None, "identity"):
+            logger.warning("Unsupported content encoding.",
+                           extra={'location': request.url,
+                                  'details': request.content_encoding})
+            raise UnsupportedMediaType()
+
+        try:
+            return json.load(stream)
+        except (TypeError, ValueError, OSError, EOFError, zlib.error):
+            logger.warning("Wrong JSON.",
+                           extra={'location': request.url})
+            raise BadRequest()
 
     def put(self, request, response, key):
+        self.check_writable(request)
         # Limit charset of keys.
         if re.match("^[A-Za-z0-9_]+$", key) is None:
             return Forbidden()
@@ -162,12 +217,7 @@ class StoreHandler:
                                   'details': request.mimetype})
             raise UnsupportedMediaType()
 
-        try:
-            data = json.load(request.stream)
-        except (TypeError, ValueError):
-            logger.warning("Wrong JSON.",
-                           extra={'location': request.url})
-            raise BadRequest()
+        data = self.load_data(request)
 
         try:
             if key not in self.store:
@@ -183,6 +233,7 @@ class StoreHandler:
         response.status_code = 204
 
     def put_list(self, request, response):
+        self.check_writable(request)
         if not self.authorized(request):
             logger.info("Unauthorized request.",
                         extra={'location': request.url,
@@ -194,12 +245,7 @@ class StoreHandler:
                                   'details': request.mimetype})
             raise UnsupportedMediaType()
 
-        try:
-            data = json.load(request.stream)
-        except (TypeError, ValueError):
-            logger.warning("Wrong JSON.",
-                           extra={'location': request.url})
-            raise BadRequest()
+        data = self.load_data(request)
 
         try:
             self.store.merge_list(data)
@@ -212,6 +258,7 @@ class StoreHandler:
         response.status_code = 204
 
     def delete(self, request, response, key):
+        self.check_writable(request)
         # Limit charset of keys.
         if re.match("^[A-Za-z0-9_]+$", key) is None:
             return NotFound()
@@ -228,6 +275,7 @@ class StoreHandler:
         response.status_code = 204
 
     def delete_list(self, request, response):
+        self.check_writable(request)
         if not self.authorized(request):
             logger.info("Unauthorized request.",
                         extra={'location': request.url,
@@ -243,8 +291,7 @@ class DataWatcher(EventSource):
     """Receive the messages from the entities store and redirect them."""
 
     def __init__(self, stores, buffer_size):
-        self._CACHE_SIZE = buffer_size
-        EventSource.__init__(self)
+        EventSource.__init__(self, buffer_size)
 
         stores["contest"].add_create_callback(
             functools.partial(self.callback, "contest", "create"))
@@ -281,13 +328,87 @@ class DataWatcher(EventSource):
 
     def score_callback(self, user, task, score):
         # FIXME Use score_precision.
-        self.send("score", "%s %s %0.2f" % (user, task, score))
+        # A score makes the previous ones of the same user and task
+        # useless, so clients that are late skip them.
+        self.send("score", "%s %s %0.2f" % (user, task, score),
+                  coalesce=(user, task))
+
+
+class ReplicationHandler(EventSource):
+    """Serve the content of the stores to the replicas.
+
+    /dump gives the JSON object of the data of all entities, by store
+    and key, together with a cursor. /changes is an event source that
+    sends, after that cursor, a "change" event for each creation,
+    update or deletion, whose data is the JSON array [store, key,
+    data] (with null data for a deletion).
+
+    """
+
+    def __init__(self, stores, buffer_size):
+        EventSource.__init__(self, buffer_size)
+        self.stores = stores
+
+        self.router = Map([
+            Rule("/dump", methods=["GET"], endpoint="dump"),
+            Rule("/changes", methods=["GET"], endpoint="changes"),
+        ], encoding_errors="strict")
+
+        for name in REPLICATED_STORES:
+            stores[name].add_create_callback(
+                functools.partial(self.callback, name))
+            stores[name].add_update_callback(
+                functools.partial(self.callback, name))
+            stores[name].add_delete_callback(
+                functools.partial(self.delete_callback, name))
+
+    def callback(self, name, key, *args):
+        # The last argument is the new entity. Changes can't be
+        # coalesced, as their order matters for consistency.
+        self.send("change", json.dumps([name, key, args[-1].get()]))
+
+    def delete_callback(self, name, key, old_item):
+        self.send("change", json.dumps([name, key, None]))
+
+    def wsgi_app(self, environ, start_response):
+        route = self.router.bind_to_environ(environ)
+        try:
+            endpoint, args = route.match()
+        except HTTPException as exc:
+            return exc(environ, start_response)
+
+        if endpoint == "changes":
+            return EventSource.wsgi_app(self, environ, start_response)
+        return self.dump(environ, start_response)
+
+    @responder
+    def dump(self, environ, start_response):
+        request = Request(environ)
+        request.encoding_errors = "strict"
+
+        if request.accept_mimetypes.quality("application/json") <= 0:
+            return NotAcceptable()
+
+        # All data is taken without yielding, so that the changes
+        # after the cursor are exactly the ones it doesn't include.
+        data = json.dumps({
+            "cursor": self.get_last_event_id(),
+            "stores": dict((name, self.stores[name].retrieve_list())
+                           for name in REPLICATED_STORES),
+        }).encode("utf-8")
+
+        response = Response()
+        response.status_code = 200
+        response.headers["Cache-Control"] = "no-cache"
+        response.mimetype = "application/json"
+        set_body(request, response, data)
+
+        return response
 
 
 class SubListHandler:
 
     def __init__(self, stores):
-        self.task_store = stores["task"]
         self.scoring_store = stores["scoring"]
 
         self.router = Map([
@@ -312,47 +433,99 @@ class SubListHandler:
         if request.accept_mimetypes.quality("application/json") <= 0:
             raise NotAcceptable()
 
-        result = list()
-        for task_id in self.task_store._store.keys():
-            result.extend(
-                self.scoring_store.get_submissions(
-                    args["user_id"], task_id
-                ).values()
-            )
-        result.sort(key=lambda x: (x.task, x.time))
-        result = list(a.__dict__ for a in result)
-
         response = Response()
         response.status_code = 200
         response.mimetype = "application/json"
-        response.data = json.dumps(result)
+        response.data = \
+            self.scoring_store.get_encoded_submissions(args["user_id"])
 
         return response(environ, start_response)
 
 
+def accepts_gzip(request):
+    """Return whether the client accepts gzipped responses."""
+    return request.accept_encodings.quality("gzip") > 0
+
+
+def set_body(request, response, data):
+    """Set the body of a response, gzipped if the client accepts it.
+
+    request (Request): the request.
+    response (Response): the response.
+    data (bytes): the body.
+
+    """
+    response.vary.add("Accept-Encoding")
+    if len(data) >= MIN_COMPRESSED_SIZE and accepts_gzip(request):
+        response.content_encoding = "gzip"
+        data = gzip.compress(data)
+    response.data = data
+
+
 class HistoryHandler:
+    """Serve the global history of the scores.
+
+    The response is the JSON list of all the (user, task, time,
+    score) entries. The X-History-Cursor header (also the ETag)
+    identifies its version; passing it back as the since parameter
+    gives only the entries appended after it or, if the history has
+    been rebuilt since then, a 410 error.
+
+    """
 
     def __init__(self, stores):
         self.scoring_store = stores["scoring"]
+        # The version and the gzipped encoding of the whole history.
+        self._compressed = (None, None)
 
     def __call__(self, environ, start_response):
         return self.wsgi_app(environ, start_response)
 
+    @responder
     def wsgi_app(self, environ, start_response):
         request = Request(environ)
         request.encoding_errors = "strict"
 
         if request.accept_mimetypes.quality("application/json") <= 0:
-            raise NotAcceptable()
+            return NotAcceptable()
 
-        result = list(self.scoring_store.get_global_history())
+        version = self.scoring_store.get_history_version()
+        cursor = "%d-%d" % version
+
+        start = 0
+        if "since" in request.args:
+            try:
+                generation, start = \
+                    (int(x) for x in request.args["since"].split("-"))
+            except ValueError:
+                return BadRequest()
+            if generation != version[0] or not 0 <= start <= version[1]:
+                return Gone()
 
         response = Response()
+        response.headers["X-History-Cursor"] = cursor
+        response.headers["Cache-Control"] = "no-cache"
+        response.set_etag(cursor, weak=True)
+        if request.if_none_match.contains_weak(cursor):
+            response.status_code = 304
+            return response
+
         response.status_code = 200
         response.mimetype = "application/json"
-        response.data = json.dumps(result)
+        if start == 0 and accepts_gzip(request):
+            # Everybody gets the whole history at first: compress it
+            # only once for each version.
+            if self._compressed[0] != version:
+                self._compressed = (version, gzip.compress(
+                    self.scoring_store.get_encoded_history()))
+            response.vary.add("Accept-Encoding")
+            response.content_encoding = "gzip"
+            response.data = self._compressed[1]
+        else:
+            set_body(request, response,
+                     self.scoring_store.get_encoded_history(start))
 
-        return response(environ, start_response)
+        return response
 
 
 class ScoreHandler:
@@ -370,21 +543,100 @@ class ScoreHandler:
         if request.accept_mimetypes.quality("application/json") <= 0:
             raise NotAcceptable()
 
-        result = dict()
-        for u_id, tasks in self.scoring_store._scores.items():
-            for t_id, score in tasks.items():
-                if score.get_score() > 0.0:
-                    result.setdefault(u_id, dict())[t_id] = score.get_score()
-
         response = Response()
         response.status_code = 200
         response.headers['Timestamp'] = "%0.6f" % time.time()
         response.mimetype = "application/json"
-        response.data = json.dumps(result)
+        response.data = json.dumps(self.scoring_store.get_scores())
 
         return response(environ, start_response)
 
 
+class SnapshotHandler:
+    """Serve all the data needed to show the ranking at once.
+
+    The snapshot is the JSON object of the contests, tasks, teams,
+    users and scores, as served by their own handlers. It's kept in
+    memory, both plain and gzipped, and rebuilt when requested after
+    a change, but not more often than once every interval seconds:
+    its Timestamp header allows clients to pick up the more recent
+    changes from the event source.
+
+    """
+
+    def __init__(self, stores, interval):
+        self.stores = stores
+        self.interval = interval
+
+        # The time the snapshot has been built at, its plain and
+        # gzipped encoding (None if it has never been built) and
+        # whether something has changed since then.
+        self._timestamp = None
+        self._data = None
+        self._compressed = None
+        self._changed = True
+
+        for name in ["contest", "task", "team", "user"]:
+            stores[name].add_create_callback(self.callback)
+            stores[name].add_update_callback(self.callback)
+            stores[name].add_delete_callback(self.callback)
+        stores["scoring"].add_score_callback(self.callback)
+
+    def callback(self, *args):
+        self._changed = True
+
+    def _build(self):
+        # All data is taken without yielding, so it's consistent and
+        # up to date at the timestamp.
+        self._timestamp = time.time()
+        self._changed = False
+        self._data = json.dumps({
+            "contests": self.stores["contest"].retrieve_list(),
+            "tasks": self.stores["task"].retrieve_list(),
+            "teams": self.stores["team"].retrieve_list(),
+            "users": self.stores["user"].retrieve_list(),
+            "scores": self.stores["scoring"].get_scores(),
+        }).encode("utf-8")
+        self._compressed = gzip.compress(self._data)
+
+    def __call__(self, environ, start_response):
+        return self.wsgi_app(environ, start_response)
+
+    @responder
+    def wsgi_app(self, environ, start_response):
+        request = Request(environ)
+        request.encoding_errors = "strict"
+
+        if request.accept_mimetypes.quality("application/json") <= 0:
+            return NotAcceptable()
+
+        if self._data is None or (
+                self._changed
+                and time.time() >= self._timestamp + self.interval):
+            self._build()
+
+        # The timestamp identifies the snapshot.
+        etag = "%0.6f" % self._timestamp
+        response = Response()
+        response.headers['Timestamp'] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        response.set_etag(etag, weak=True)
+        if request.if_none_match.contains_weak(etag):
+            response.status_code = 304
+            return response
+
+        response.status_code = 200
+        response.mimetype = "application/json"
+        if accepts_gzip(request):
+            response.content_encoding = "gzip"
+            response.data = self._compressed
+        else:
+            response.data = self._data
+
+        return response
+
+
 class ImageHandler:
     EXT_TO_MIME = {
         'png': 'image/png',
@@ -475,11 +727,12 @@ class RootHandler:
 class RoutingHandler:
 
     def __init__(self, root_handler, event_handler, logo_handler,
-                 score_handler, history_handler):
+                 score_handler, history_handler, snapshot_handler):
         self.router = Map([
             Rule("/", methods=["GET"], endpoint="root"),
             Rule("/history", methods=["GET"], endpoint="history"),
             Rule("/scores", methods=["GET"], endpoint="scores"),
+            Rule("/snapshot", methods=["GET"], endpoint="snapshot"),
             Rule("/events", methods=["GET"], endpoint="events"),
             Rule("/logo", methods=["GET"], endpoint="logo"),
         ], encoding_errors="strict")
@@ -488,6 +741,7 @@ class RoutingHandler:
         self.logo_handler = logo_handler
         self.score_handler = score_handler
         self.history_handler = history_handler
+        self.snapshot_handler = snapshot_handler
         self.root_handler = root_handler
 
     def __call__(self, environ, start_response):
@@ -510,6 +764,8 @@ class RoutingHandler:
             return self.score_handler(environ, start_response)
         elif endpoint == "history":
             return self.history_handler(environ, start_response)
+        elif endpoint == "snapshot":
+            return self.snapshot_handler(environ, start_response)
 
 
 def main():
@@ -544,32 +800,39 @@ def main():
             print("Not removing directory %s." % config.lib_dir)
         return 0
 
+    # Replicas keep their data only in memory.
+    replica = config.primary_url is not None
+
+    def store_path(name):
+        return os.path.join(config.lib_dir, name) if not replica else None
+
     stores = dict()
 
+    store_args = {
+        "journal": config.store_format == "journal",
+        "flush_interval": config.journal_flush_interval,
+    }
     stores["subchange"] = Store(
-        Subchange, os.path.join(config.lib_dir, 'subchanges'), stores)
+        Subchange, store_path('subchanges'), stores, **store_args)
     stores["submission"] = Store(
-        Submission, os.path.join(config.lib_dir, 'submissions'), stores,
-        [stores["subchange"]])
+        Submission, store_path('submissions'), stores,
+        [stores["subchange"]], **store_args)
     stores["user"] = Store(
-        User, os.path.join(config.lib_dir, 'users'), stores,
-        [stores["submission"]])
+        User, store_path('users'), stores,
+        [stores["submission"]], **store_args)
     stores["team"] = Store(
-        Team, os.path.join(config.lib_dir, 'teams'), stores,
-        [stores["user"]])
+        Team, store_path('teams'), stores,
+        [stores["user"]], **store_args)
     stores["task"] = Store(
-        Task, os.path.join(config.lib_dir, 'tasks'), stores,
-        [stores["submission"]])
+        Task, store_path('tasks'), stores,
+        [stores["submission"]], **store_args)
     stores["contest"] = Store(
-        Contest, os.path.join(config.lib_dir, 'contests'), stores,
-        [stores["task"]])
+        Contest, store_path('contests'), stores,
+        [stores["task"]], **store_args)
 
-    stores["contest"].load_from_disk()
-    stores["task"].load_from_disk()
-    stores["team"].load_from_disk()
-    stores["user"].load_from_disk()
-    stores["submission"].load_from_disk()
-    stores["subchange"].load_from_disk()
+    if not replica:
+        for name in REPLICATED_STORES:
+            stores[name].load_from_disk()
 
     stores["scoring"] = ScoringStore(stores)
     stores["scoring"].init_store()
@@ -581,28 +844,39 @@ def main():
             os.path.join(config.lib_dir, '%(name)s'),
             os.path.join(config.web_dir, 'img', 'logo.png')),
         ScoreHandler(stores),
-        HistoryHandler(stores))
+        HistoryHandler(stores),
+        SnapshotHandler(stores, config.snapshot_interval))
+
+    # Replicas can have replicas too.
+    replication_handler = ReplicationHandler(
+        stores, config.replication_buffer_size)
 
     wsgi_app = SharedDataMiddleware(DispatcherMiddleware(
         toplevel_handler, {
             '/contests': StoreHandler(
                 stores["contest"],
-                config.username, config.password, config.realm_name),
+                config.username, config.password, config.realm_name,
+                read_only=replica),
             '/tasks': StoreHandler(
                 stores["task"],
-                config.username, config.password, config.realm_name),
+                config.username, config.password, config.realm_name,
+                read_only=replica),
             '/teams': StoreHandler(
                 stores["team"],
-                config.username, config.password, config.realm_name),
+                config.username, config.password, config.realm_name,
+                read_only=replica),
             '/users': StoreHandler(
                 stores["user"],
-                config.username, config.password, config.realm_name),
+                config.username, config.password, config.realm_name,
+                read_only=replica),
             '/submissions': StoreHandler(
                 stores["submission"],
-                config.username, config.password, config.realm_name),
+                config.username, config.password, config.realm_name,
+                read_only=replica),
             '/subchanges': StoreHandler(
                 stores["subchange"],
-                config.username, config.password, config.realm_name),
+                config.username, config.password, config.realm_name,
+                read_only=replica),
             '/faces': ImageHandler(
                 os.path.join(config.lib_dir, 'faces', '%(name)s'),
                 os.path.join(config.web_dir, 'img', 'face.png')),
@@ -610,6 +884,7 @@ def main():
                 os.path.join(config.lib_dir, 'flags', '%(name)s'),
                 os.path.join(config.web_dir, 'img', 'flag.png')),
             '/sublist': SubListHandler(stores),
+            '/replication': replication_handler,
         }), {'/': config.web_dir})
 
     servers = list()
@@ -627,10 +902,15 @@ def main():
         raise KeyboardInterrupt
     signal.signal(signal.SIGTERM, sigterm_handler)
 
+    if replica:
+        gevent.spawn(Replica(stores, config.primary_url).run)
+
     try:
         gevent.joinall(list(gevent.spawn(s.serve_forever) for s in servers))
     except KeyboardInterrupt:
         pass
     finally:
         gevent.joinall(list(gevent.spawn(s.stop) for s in servers))
+        for name in REPLICATED_STORES:
+            stores[name].close()
     return 0
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Keep the stores of a RankingWebServer in sync with another one.
+
+A replica doesn't receive data from ProxyService: it downloads the
+content of the stores of its primary (from /replication/dump) and then
+follows its changes (from /replication/changes, an event source),
+applying them to its own stores. Hence it serves spectators exactly
+as the primary would, while ProxyService pushes only to the latter.
+
+"""
+
+import json
+import logging
+
+import gevent
+import requests
+
+from cmsranking.Entity import InvalidData, InvalidKey
+
+
+logger = logging.getLogger(__name__)
+
+
+# The replicated stores, in an order such that entities only refer to
+# entities of the stores that come before.
+REPLICATED_STORES = ["contest", "task", "team", "user", "submission",
+                     "subchange"]
+
+
+def parse_events(lines):
+    """Parse a Server-Sent Events stream.
+
+    Only the fields produced by cmscommon.eventsource are supported.
+
+    lines ([bytes]): the lines of the stream, without line breaks.
+
+    yield ((str, str|None, str)): the type, the ID and the data of
+        each event.
+
+    """
+    event, event_id, data = None, None, []
+    for line in lines:
+        line = line.decode("utf-8")
+        if line == "":
+            if event is not None or len(data) > 0:
+                yield event or "message", event_id, "\n".join(data)
+            event, data = None, []
+            continue
+        field, _, value = line.partition(":")
+        if field == "id":
+            event_id = value
+        elif field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+
+
+class Replica:
+    """Apply to the local stores the changes made to the primary.
+
+    """
+    RETRY_INTERVAL = 1.0
+    CONNECT_TIMEOUT = 10
+    # Longer than the time between two pings of the event source.
+    READ_TIMEOUT = 60
+
+    def __init__(self, stores, primary_url):
+        """Create a replica.
+
+        stores (dict): the stores to keep in sync, by name.
+        primary_url (str): the base URL of the primary RWS.
+
+        """
+        self.stores = stores
+        self.primary_url = primary_url.rstrip("/")
+        self._session = requests.Session()
+        # The ID of the last change applied, or None if the whole
+        # content has to be downloaded.
+        self.cursor = None
+
+    def run(self):
+        """Keep the stores in sync, forever."""
+        while True:
+            try:
+                if self.cursor is None:
+                    response = self._session.get(
+                        self.primary_url + "/replication/dump",
+                        headers={"Accept": "application/json"},
+                        timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT))
+                    response.raise_for_status()
+                    self.load_dump(response.json())
+                    logger.info("Downloaded the data of the primary.")
+                self._follow()
+            except (requests.RequestException, ValueError) as error:
+                logger.warning("Cannot sync with the primary: %s.", error)
+                gevent.sleep(self.RETRY_INTERVAL)
+            except (InvalidData, InvalidKey) as error:
+                logger.error("Cannot apply the data of the primary: %s.",
+                             error)
+                self.cursor = None
+                gevent.sleep(self.RETRY_INTERVAL)
+
+    def _follow(self):
+        """Apply the changes until the primary closes the stream."""
+        with self._session.get(
+                self.primary_url + "/replication/changes",
+                headers={"Accept": "text/event-stream",
+                         "Last-Event-ID": self.cursor},
+                stream=True,
+                timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT)) \
+                as response:
+            response.raise_for_status()
+            for event, event_id, data in parse_events(
+                    response.iter_lines()):
+                if event == "reinit":
+                    logger.warning("Some changes of the primary were "
+                                   "missed, downloading all its data.")
+                    self.cursor = None
+                    return
+                if event == "change":
+                    self.apply_change(*json.loads(data))
+                    self.cursor = event_id
+
+    def load_dump(self, dump):
+        """Make the stores hold the given content.
+
+        dump (dict): the cursor and the content of the stores, as
+            served by /replication/dump.
+
+        raise (InvalidData): if an entity is invalid.
+        raise (InvalidKey): if a key is invalid.
+
+        """
+        content = dump["stores"]
+        # Entities referring to others are deleted first.
+        for name in reversed(REPLICATED_STORES):
+            store = self.stores[name]
+            for key in list(store.retrieve_list()):
+                # It could have been deleted together with another.
+                if key not in content[name] and key in store:
+                    store.delete(key)
+        for name in REPLICATED_STORES:
+            for key, data in content[name].items():
+                self._put(self.stores[name], key, data)
+        self.cursor = dump["cursor"]
+
+    def apply_change(self, name, key, data):
+        """Apply a change made to the primary.
+
+        name (str): the name of the store.
+        key (str): the key of the entity.
+        data (dict|None): its new data, or None if it was deleted.
+
+        raise (InvalidData): if the entity is invalid.
+        raise (InvalidKey): if the key is invalid.
+
+        """
+        store = self.stores[name]
+        if data is None:
+            # Deleting an entity deletes those referring to it too, so
+            # the primary sends deletions we have already applied.
+            if key in store:
+                store.delete(key)
+        else:
+            self._put(store, key, data)
+
+    @staticmethod
+    def _put(store, key, data):
+        if key not in store:
+            store.create(key, data)
+        elif store.retrieve(key) != data:
+            store.update(key, data)
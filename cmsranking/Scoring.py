@@ -19,9 +19,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
 import heapq
+import json
 import logging
-from itertools import zip_longest
+import time
 
 from cmscommon.constants import \
     SCORE_MODE_MAX, SCORE_MODE_MAX_SUBTASK, SCORE_MODE_MAX_TOKENED_LAST
@@ -40,24 +42,79 @@ class NumberSet:
 
     It can hold the same value multiple times.
 
-    This data structure could be implemented with a binary tree, but
-    at the moment we're actually using a standard python list.
+    It's implemented as a binary heap with lazy deletion: removed
+    values stay in the heap until they reach its top, so that all
+    operations take amortized logarithmic time.
 
     """
     def __init__(self):
-        self._impl = list()
+        # The values, negated (heapq implements a min-heap).
+        self._heap = list()
+        # The number of times each value is held.
+        self._count = dict()
+        # The number of times each value has been removed but not yet
+        # popped from the heap.
+        self._removed = dict()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
 
     def insert(self, val):
-        self._impl.append(val)
+        heapq.heappush(self._heap, -val)
+        self._count[val] = self._count.get(val, 0) + 1
+        self._size += 1
 
     def remove(self, val):
-        self._impl.remove(val)
+        count = self._count.get(val, 0)
+        if count == 0:
+            raise ValueError("NumberSet.remove(x): x not in NumberSet")
+        if count == 1:
+            del self._count[val]
+        else:
+            self._count[val] = count - 1
+        self._removed[val] = self._removed.get(val, 0) + 1
+        self._size -= 1
+        # Don't let the removed values make up most of the heap.
+        if len(self._heap) > 2 * self._size + 16:
+            self._heap = [-val for val, count in self._count.items()
+                          for _ in range(count)]
+            heapq.heapify(self._heap)
+            self._removed.clear()
+
+    def maximum(self):
+        """Return the maximum value, or None if there are none."""
+        while len(self._heap) > 0:
+            val = -self._heap[0]
+            removed = self._removed.get(val, 0)
+            if removed == 0:
+                return val
+            heapq.heappop(self._heap)
+            if removed == 1:
+                del self._removed[val]
+            else:
+                self._removed[val] = removed - 1
+        return None
 
     def query(self):
-        return max(self._impl + [0.0])
+        """Return the maximum between the values and 0.0."""
+        val = self.maximum()
+        return max(val, 0.0) if val is not None else 0.0
 
     def clear(self):
-        del self._impl[:]
+        del self._heap[:]
+        self._count.clear()
+        self._removed.clear()
+        self._size = 0
+
+
+def _subtask_scores(submission):
+    """Return the scores of the subtasks of a submission.
+
+    A submission without details counts as having a single subtask.
+
+    """
+    return [float(s) for s in submission.extra or [submission.score]]
 
 
 class Score:
@@ -67,6 +124,11 @@ class Score:
     user/task.  It gets notified in case a submission is created,
     updated and deleted.
 
+    Each change of a submission is applied in logarithmic time (in the
+    number of submissions) to the data structures the score mode
+    needs: the scores of all submissions, those of the released ones
+    or those of each subtask.
+
     """
     # We assume that the submissions will all have different times,
     # since cms enforces a minimum delay between two submissions of
@@ -82,9 +144,22 @@ class Score:
         # The list of changes of the submissions.
         self._changes = list()
 
-        # The set of the scores of the currently released submissions.
+        # The set of the scores of all the submissions (only for
+        # SCORE_MODE_MAX).
+        self._scores = NumberSet()
+
+        # The set of the scores of the currently released submissions
+        # (only for SCORE_MODE_MAX_TOKENED_LAST).
         self._released = NumberSet()
 
+        # For each subtask, the set of the scores of the submissions
+        # that have it and the maximum among them (or 0.0, if some
+        # submissions don't have it); only the maxima are summed for
+        # each change, in the same order as a from-scratch computation
+        # would (only for SCORE_MODE_MAX_SUBTASK).
+        self._subtasks = list()
+        self._subtask_max = list()
+
         # The last submitted submission (with at least one subchange).
         self._last = None
 
@@ -92,39 +167,84 @@ class Score:
         # object).
         self._history = list()
 
+        # How many times the history has been recomputed from scratch
+        # (otherwise, it's only appended to).
+        self._resets = 0
+
         self._score_mode = score_mode
 
+    def _add_scores(self, submission):
+        # Add the scores of a submission to the data structures used
+        # by the score mode; return the number of subtasks involved.
+        if self._score_mode == SCORE_MODE_MAX:
+            self._scores.insert(submission.score)
+        elif self._score_mode == SCORE_MODE_MAX_SUBTASK:
+            subtask_scores = _subtask_scores(submission)
+            for i, score in enumerate(subtask_scores):
+                if i == len(self._subtasks):
+                    self._subtasks.append(NumberSet())
+                    self._subtask_max.append(0.0)
+                self._subtasks[i].insert(score)
+            return len(subtask_scores)
+        elif self._score_mode == SCORE_MODE_MAX_TOKENED_LAST:
+            if submission.token:
+                self._released.insert(submission.score)
+        return 0
+
+    def _remove_scores(self, submission):
+        # Remove the scores of a submission from the data structures
+        # used by the score mode; return the number of subtasks
+        # involved.
+        if self._score_mode == SCORE_MODE_MAX:
+            self._scores.remove(submission.score)
+        elif self._score_mode == SCORE_MODE_MAX_SUBTASK:
+            subtask_scores = _subtask_scores(submission)
+            for i, score in enumerate(subtask_scores):
+                self._subtasks[i].remove(score)
+            return len(subtask_scores)
+        elif self._score_mode == SCORE_MODE_MAX_TOKENED_LAST:
+            if submission.token:
+                self._released.remove(submission.score)
+        return 0
+
+    def _update_subtask_max(self, count):
+        # Recompute the maximum of the first count subtasks (those
+        # that may have changed), dropping the trailing subtasks that
+        # no submission has anymore.
+        while len(self._subtasks) > 0 and len(self._subtasks[-1]) == 0:
+            self._subtasks.pop()
+            self._subtask_max.pop()
+        for i in range(min(count, len(self._subtasks))):
+            subtask = self._subtasks[i]
+            val = subtask.maximum()
+            if len(subtask) < len(self._submissions):
+                val = max(val, 0.0)
+            self._subtask_max[i] = val
+
     def append_change(self, change):
-        # Remove from released submission (if needed), apply changes,
-        # add back to released submissions (if needed) and check if
-        # it's the last. Compute the new score and, if it changed,
-        # append it to the history.
-        s_id = change.submission
-        if self._submissions[s_id].token:
-            self._released.remove(self._submissions[s_id].score)
+        # Remove the submission from the data structures, apply
+        # changes, add it back and check if it's the last. Compute the
+        # new score and, if it changed, append it to the history.
+        submission = self._submissions[change.submission]
+        count = self._remove_scores(submission)
         if change.score is not None:
-            self._submissions[s_id].score = change.score
+            submission.score = change.score
         if change.token is not None:
-            self._submissions[s_id].token = change.token
+            submission.token = change.token
         if change.extra is not None:
-            self._submissions[s_id].extra = change.extra
-        if self._submissions[s_id].token:
-            self._released.insert(self._submissions[s_id].score)
+            submission.extra = change.extra
+        count = max(count, self._add_scores(submission))
         if change.score is not None and \
-                (self._last is None or
-                 self._submissions[s_id].time > self._last.time):
-            self._last = self._submissions[s_id]
+                (self._last is None or submission.time > self._last.time):
+            self._last = submission
 
         if self._score_mode == SCORE_MODE_MAX:
-            score = max((submission.score
-                         for submission in self._submissions.values()),
-                        default=0.0)
+            score = self._scores.maximum()
+            if score is None:
+                score = 0.0
         elif self._score_mode == SCORE_MODE_MAX_SUBTASK:
-            scores_by_submission = (map(float, s.extra or [s.score])
-                                    for s in self._submissions.values())
-            scores_by_subtask = zip_longest(*scores_by_submission,
-                                            fillvalue=0.0)
-            score = float(sum(max(s) for s in scores_by_subtask))
+            self._update_subtask_max(count)
+            score = float(sum(self._subtask_max))
         elif self._score_mode == SCORE_MODE_MAX_TOKENED_LAST:
             score = max(self._released.query(),
                         self._last.score if self._last is not None else 0.0)
@@ -139,8 +259,12 @@ class Score:
 
     def reset_history(self):
         # Delete everything except the submissions and the subchanges.
+        self._resets += 1
         self._last = None
+        self._scores.clear()
         self._released.clear()
+        del self._subtasks[:]
+        del self._subtask_max[:]
         del self._history[:]
 
         # Reset the submissions at their default value.
@@ -148,6 +272,8 @@ class Score:
             sub.score = 0.0
             sub.token = False
             sub.extra = list()
+            self._add_scores(sub)
+        self._update_subtask_max(len(self._subtasks))
 
         # Append each change, one at a time.
         for change in self._changes:
@@ -203,6 +329,9 @@ class Score:
         submission.token = False
         submission.extra = list()
         self._submissions[key] = submission
+        self._add_scores(submission)
+        if self._score_mode == SCORE_MODE_MAX_SUBTASK:
+            self._update_subtask_max(len(self._subtasks))
 
     def update_submission(self, key, submission):
         # An updated submission may cause an update in history because
@@ -222,7 +351,73 @@ class Score:
             self.reset_history()
 
     def update_score_mode(self, score_mode):
-        self._score_mode = score_mode
+        # The data structures depend on the score mode.
+        if score_mode != self._score_mode:
+            self._score_mode = score_mode
+            self.reset_history()
+
+
+class HistoryBuffer:
+    """The global history of score changes, JSON-encoded.
+
+    It holds the encoding of the list of (user, task, time, score)
+    entries returned by ScoringStore.get_global_history, to which the
+    new entries are appended as they are produced. These don't always
+    come in order of time (evaluations end in any order): only the
+    entries of each user and task are sure to be, and clients have to
+    sort the list themselves.
+    Each time it's rebuilt from scratch it gets a new generation, so
+    that a (generation, length) pair identifies its content.
+
+    """
+    def __init__(self):
+        self.generation = int(time.time() * 1000)
+        # The encoded entries, separated by ", ", or None if the
+        # buffer has to be rebuilt.
+        self._body = None
+        # The position in _body of each entry.
+        self._offsets = list()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def is_valid(self):
+        return self._body is not None
+
+    def invalidate(self):
+        if self._body is not None:
+            self._body = None
+            del self._offsets[:]
+            self.generation += 1
+
+    def rebuild(self, entries):
+        """Fill the (invalid) buffer with the given entries.
+
+        entries ([(str, str, int, float)]): the sorted entries.
+
+        """
+        self._body = bytearray()
+        for user, task, time_, score in entries:
+            self.append(user, task, time_, score)
+
+    def append(self, user, task, time_, score):
+        """Append an entry."""
+        if len(self._offsets) > 0:
+            self._body += b", "
+        self._offsets.append(len(self._body))
+        self._body += json.dumps([user, task, time_, score]).encode("utf-8")
+
+    def encode(self, start=0):
+        """Return the JSON encoding of the entries after the given one.
+
+        start (int): the index of the first entry to include.
+
+        return (bytes): the JSON list of the entries from start on.
+
+        """
+        if start >= len(self._offsets):
+            return b"[]"
+        return b"[" + self._body[self._offsets[start]:] + b"]"
 
 
 class ScoringStore:
@@ -232,6 +427,8 @@ class ScoringStore:
     redirects them to the corresponding Score (based on their user/task).
     When asked to provide a global history of score changes it takes the
     ones of each Score and combines them toghether (using a binary heap).
+    It also indexes the submissions of each user, to serve them without
+    looking at those of the other users.
 
     """
     # We can do an important assumption here too: since the data has
@@ -255,6 +452,13 @@ class ScoringStore:
 
         self._scores = dict()
         self._callbacks = list()
+        self._history = HistoryBuffer()
+
+        # For each user, the (task, time, key, submission) tuples of
+        # their submissions, sorted, and the JSON encoding of the list
+        # of these submissions (if it's up to date).
+        self._user_submissions = dict()
+        self._encoded_submissions = dict()
 
     def init_store(self):
         """Load the scores from the stores.
@@ -289,9 +493,13 @@ class ScoringStore:
             self._scores[submission.user][submission.task] = \
                 Score(score_mode=task["score_mode"])
 
+        self._index_submission(key, submission)
         score_obj = self._scores[submission.user][submission.task]
         old_score = score_obj.get_score()
+        mark = self._history_mark(score_obj)
         score_obj.create_submission(key, submission)
+        self._update_history(submission.user, submission.task,
+                             score_obj, mark)
         new_score = score_obj.get_score()
         if old_score != new_score:
             self.notify_callbacks(submission.user, submission.task, new_score)
@@ -307,18 +515,27 @@ class ScoringStore:
 
         task = self.task_store.retrieve(submission.task)
 
+        self._unindex_submission(key, old_submission)
+        self._index_submission(key, submission)
         score_obj = self._scores[submission.user][submission.task]
         old_score = score_obj.get_score()
+        mark = self._history_mark(score_obj)
         score_obj.update_submission(key, submission)
         score_obj.update_score_mode(task["score_mode"])
+        self._update_history(submission.user, submission.task,
+                             score_obj, mark)
         new_score = score_obj.get_score()
         if old_score != new_score:
             self.notify_callbacks(submission.user, submission.task, new_score)
 
     def delete_submission(self, key, submission):
+        self._unindex_submission(key, submission)
         score_obj = self._scores[submission.user][submission.task]
         old_score = score_obj.get_score()
+        mark = self._history_mark(score_obj)
         score_obj.delete_submission(key)
+        self._update_history(submission.user, submission.task,
+                             score_obj, mark)
         new_score = score_obj.get_score()
         if old_score != new_score:
             self.notify_callbacks(submission.user, submission.task, new_score)
@@ -333,7 +550,11 @@ class ScoringStore:
         submission = self.submission_store._store[subchange.submission]
         score_obj = self._scores[submission.user][submission.task]
         old_score = score_obj.get_score()
+        mark = self._history_mark(score_obj)
         score_obj.create_subchange(key, subchange)
+        self._encoded_submissions.pop(submission.user, None)
+        self._update_history(submission.user, submission.task,
+                             score_obj, mark)
         new_score = score_obj.get_score()
         if old_score != new_score:
             self.notify_callbacks(submission.user, submission.task, new_score)
@@ -347,7 +568,11 @@ class ScoringStore:
         submission = self.submission_store._store[subchange.submission]
         score_obj = self._scores[submission.user][submission.task]
         old_score = score_obj.get_score()
+        mark = self._history_mark(score_obj)
         score_obj.update_subchange(key, subchange)
+        self._encoded_submissions.pop(submission.user, None)
+        self._update_history(submission.user, submission.task,
+                             score_obj, mark)
         new_score = score_obj.get_score()
         if old_score != new_score:
             self.notify_callbacks(submission.user, submission.task, new_score)
@@ -361,11 +586,72 @@ class ScoringStore:
         submission = self.submission_store._store[subchange.submission]
         score_obj = self._scores[submission.user][submission.task]
         old_score = score_obj.get_score()
+        mark = self._history_mark(score_obj)
         score_obj.delete_subchange(key)
+        self._encoded_submissions.pop(submission.user, None)
+        self._update_history(submission.user, submission.task,
+                             score_obj, mark)
         new_score = score_obj.get_score()
         if old_score != new_score:
             self.notify_callbacks(submission.user, submission.task, new_score)
 
+    def _index_submission(self, key, submission):
+        bisect.insort(
+            self._user_submissions.setdefault(submission.user, list()),
+            (submission.task, submission.time, key, submission))
+        self._encoded_submissions.pop(submission.user, None)
+
+    def _unindex_submission(self, key, submission):
+        entries = self._user_submissions[submission.user]
+        del entries[bisect.bisect_left(
+            entries, (submission.task, submission.time, key))]
+        if len(entries) == 0:
+            del self._user_submissions[submission.user]
+        self._encoded_submissions.pop(submission.user, None)
+
+    @staticmethod
+    def _history_mark(score_obj):
+        return len(score_obj._history), score_obj._resets
+
+    def _update_history(self, user, task, score_obj, mark):
+        # Append to the global history the entries that an operation
+        # appended to the history of score_obj, or invalidate it if
+        # the history has been changed in any other way.
+        if not self._history.is_valid():
+            return
+        length, resets = mark
+        if score_obj._resets != resets:
+            self._history.invalidate()
+            return
+        for time_, score in score_obj._history[length:]:
+            self._history.append(user, task, time_, score)
+
+    def get_history_version(self):
+        """Return the version of the global history.
+
+        The encoding of the global history is kept up to date as the
+        scores change, and rebuilt only when a history is reset.
+
+        return ((int, int)): the generation and the length of the
+            global history (see HistoryBuffer).
+
+        """
+        if not self._history.is_valid():
+            self._history.rebuild(self.get_global_history())
+        return self._history.generation, len(self._history)
+
+    def get_encoded_history(self, start=0):
+        """Return the global history, JSON-encoded.
+
+        start (int): the index of the first entry to return.
+
+        return (bytes): the encoding of the list of the entries of the
+            global history from start on.
+
+        """
+        self.get_history_version()
+        return self._history.encode(start)
+
     def get_score(self, user, task):
         if user not in self._scores or task not in self._scores[user]:
             # We may want to raise an exception to distinguish between
@@ -373,11 +659,45 @@ class ScoringStore:
             return 0
         return self._scores[user][task].get_score()
 
+    def get_scores(self):
+        """Return the positive scores of all users on all tasks.
+
+        return ({str: {str: float}}): the scores, by user and task.
+
+        """
+        result = dict()
+        for u_id, tasks in self._scores.items():
+            for t_id, score in tasks.items():
+                if score.get_score() > 0.0:
+                    result.setdefault(u_id, dict())[t_id] = score.get_score()
+        return result
+
     def get_submissions(self, user, task):
         if user not in self._scores or task not in self._scores[user]:
             return dict()
         return self._scores[user][task]._submissions
 
+    def get_encoded_submissions(self, user):
+        """Return the submissions of a user, JSON-encoded.
+
+        The encoding is computed only after the submissions (or their
+        scores) change.
+
+        user (str): the key of the user.
+
+        return (bytes): the encoding of the list of the submissions of
+            the user, with their current score, token and extra, sorted
+            by task and time.
+
+        """
+        if user not in self._user_submissions:
+            return b"[]"
+        if user not in self._encoded_submissions:
+            self._encoded_submissions[user] = json.dumps(
+                [entry[3].__dict__
+                 for entry in self._user_submissions[user]]).encode("utf-8")
+        return self._encoded_submissions[user]
+
     def get_global_history(self):
         """Merge all individual histories into a global one.
 
@@ -24,6 +24,7 @@ import re
 from gevent.lock import RLock
 
 from cmsranking.Entity import Entity, InvalidKey, InvalidData
+from cmsranking.Journal import Journal
 
 
 logger = logging.getLogger(__name__)
@@ -44,7 +45,8 @@ class Store:
     callbacks.
 
     """
-    def __init__(self, entity, path, all_stores, depends=None):
+    def __init__(self, entity, path, all_stores, depends=None,
+                 journal=False, flush_interval=None):
         """Initialize an empty EntityStore.
 
         The entity definition given as argument will define what kind
@@ -52,6 +54,15 @@ class Store:
 
         entity (type): the class definition of the entities that will
             be stored
+        path (str|None): the directory where entities are persisted,
+            or None to keep them only in memory.
+        all_stores (dict): all the stores, by name.
+        depends ([Store]): the stores whose entities may become
+            inconsistent when an entity of this store is deleted.
+        journal (bool): whether to persist entities in a journal (see
+            cmsranking.Journal) rather than in a file per entity.
+        flush_interval (float|None): for the journal, the maximum
+            time (in seconds) that changes are kept in memory.
 
         """
         if not issubclass(entity, Entity):
@@ -65,10 +76,16 @@ class Store:
         self._create_callbacks = list()
         self._update_callbacks = list()
         self._delete_callbacks = list()
+        self._journal = None
+        if journal and path is not None:
+            self._journal = Journal(path, self.retrieve_list, flush_interval)
 
     def load_from_disk(self):
         """Load the initial data for this store from the disk.
 
+        With a journal, if the directory still has the layout with a
+        file per entity, its content is moved to the journal.
+
         """
         try:
             os.mkdir(self._path)
@@ -76,25 +93,102 @@ class Store:
             # it's ok: it means the directory already exists
             pass
 
+        if self._journal is None:
+            data_dict = self._read_files()
+        else:
+            try:
+                data_dict = self._journal.load()
+            except OSError:
+                logger.critical("Unable to read or write the journal",
+                                exc_info=True, extra={'location': self._path})
+                raise
+            except ValueError:
+                logger.critical("Invalid JSON in snapshot", exc_info=False,
+                                extra={'location': self._path})
+                raise
+            if data_dict is None:
+                data_dict = self._read_files()
+                logger.info("Moving %d entities to the journal",
+                            len(data_dict), extra={'location': self._path})
+                self._journal.compact(data_dict)
+                for key in data_dict:
+                    try:
+                        os.remove(os.path.join(self._path, key + '.json'))
+                    except OSError:
+                        logger.error("Unable to delete entity file",
+                                     exc_info=True)
+
+        for key, data in data_dict.items():
+            try:
+                item = self._entity()
+                item.set(data)
+            except InvalidData as exc:
+                logger.error(str(exc), exc_info=False,
+                             extra={'location': os.path.join(self._path,
+                                                             key)})
+                continue
+            item.key = key
+            self._store[key] = item
+
+    def _read_files(self):
+        """Read the entities stored in a file each.
+
+        return (dict): the data of the entities, by key.
+
+        """
+        data_dict = dict()
         try:
             for name in os.listdir(self._path):
                 # TODO check that the key is '[A-Za-z0-9_]+'
                 if name[-5:] == '.json' and name[:-5] != '':
-                    with open(os.path.join(self._path, name), 'rb') as rec:
-                        item = self._entity()
-                        item.set(json.load(rec))
-                        item.key = name[:-5]
-                        self._store[name[:-5]] = item
+                    try:
+                        with open(os.path.join(self._path, name),
+                                  'rb') as rec:
+                            data_dict[name[:-5]] = json.load(rec)
+                    except ValueError:
+                        logger.error("Invalid JSON", exc_info=False,
+                                     extra={'location':
+                                            os.path.join(self._path, name)})
         except OSError:
             # the path isn't a directory or is inaccessible
             logger.error("Path is not a directory or is not accessible "
                          "(or other I/O error occurred)", exc_info=True)
-        except ValueError:
-            logger.error("Invalid JSON", exc_info=False,
-                         extra={'location': os.path.join(self._path, name)})
-        except InvalidData as exc:
-            logger.error(str(exc), exc_info=False,
-                         extra={'location': os.path.join(self._path, name)})
+        return data_dict
+
+    def _persist(self, key, item):
+        """Reflect the creation or update of an entity on disk."""
+        if self._path is None:
+            return
+        if self._journal is not None:
+            self._journal.put(key, item.get())
+            return
+        try:
+            path = os.path.join(self._path, key + '.json')
+            with open(path, 'wt', encoding="utf-8") as rec:
+                json.dump(item.get(), rec)
+        except OSError:
+            logger.error("I/O error occured while storing entity",
+                         exc_info=True)
+
+    def _unpersist(self, key):
+        """Reflect the deletion of an entity on disk."""
+        if self._path is None:
+            return
+        if self._journal is not None:
+            self._journal.delete(key)
+            return
+        try:
+            os.remove(os.path.join(self._path, key + '.json'))
+        except OSError:
+            logger.error("Unable to delete entity", exc_info=True)
+
+    def close(self):
+        """Write to disk the changes not written yet."""
+        if self._journal is not None:
+            try:
+                self._journal.close()
+            except OSError:
+                logger.error("Unable to write the journal", exc_info=True)
 
     def add_create_callback(self, callback):
         """Add a callback to be called when entities are created.
@@ -153,13 +247,7 @@ class Store:
             for callback in self._create_callbacks:
                 callback(key, item)
             # reflect changes on the persistent storage
-            try:
-                path = os.path.join(self._path, key + '.json')
-                with open(path, 'wt', encoding="utf-8") as rec:
-                    json.dump(self._store[key].get(), rec)
-            except OSError:
-                logger.error("I/O error occured while creating entity",
-                             exc_info=True)
+            self._persist(key, item)
 
     def update(self, key, data):
         """Update an entity.
@@ -192,13 +280,7 @@ class Store:
             for callback in self._update_callbacks:
                 callback(key, old_item, item)
             # reflect changes on the persistent storage
-            try:
-                path = os.path.join(self._path, key + '.json')
-                with open(path, 'wt', encoding="utf-8") as rec:
-                    json.dump(self._store[key].get(), rec)
-            except OSError:
-                logger.error("I/O error occured while updating entity",
-                             exc_info=True)
+            self._persist(key, item)
 
     def merge_list(self, data_dict):
         """Merge a list of entities.
@@ -246,14 +328,7 @@ class Store:
                     for callback in self._update_callbacks:
                         callback(key, old_value, value)
                 # reflect changes on the persistent storage
-                try:
-                    path = os.path.join(self._path, key + '.json')
-                    with open(path, 'wt', encoding="utf-8") as rec:
-                        json.dump(value.get(), rec)
-                except OSError:
-                    logger.error(
-                        "I/O error occured while merging entity lists",
-                        exc_info=True)
+                self._persist(key, value)
 
     def delete(self, key):
         """Delete an entity.
@@ -282,10 +357,7 @@ class Store:
             for callback in self._delete_callbacks:
                 callback(key, old_value)
             # reflect changes on the persistent storage
-            try:
-                os.remove(os.path.join(self._path, key + '.json'))
-            except OSError:
-                logger.error("Unable to delete entity", exc_info=True)
+            self._unpersist(key)
 
     def delete_list(self):
         """Delete all entities.
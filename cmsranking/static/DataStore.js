@@ -60,24 +60,6 @@ var DataStore = new function () {
 
     self.contest_count = 0;
 
-    self.init_contests = function () {
-        $.ajax({
-            url: Config.get_contest_list_url(),
-            dataType: "json",
-            success: function (data, status, xhr) {
-                self.contest_init_time = parseFloat(xhr.getResponseHeader("Timestamp"));
-                for (var key in data) {
-                    self.create_contest(key, data[key]);
-                }
-                self.init_tasks();
-            },
-            error: function () {
-                console.error("Error while getting the list of contests");
-                self.update_network_status(4);
-            }
-        });
-    }
-
     self.contest_listener = function (event) {
         var cmd = event.data.split(" ");
         if (cmd[0] == "create") {
@@ -154,27 +136,6 @@ var DataStore = new function () {
 
     self.task_count = 0;
 
-    self.init_tasks = function () {
-        $.ajax({
-            url: Config.get_task_list_url(),
-            dataType: "json",
-            success: function (data, status, xhr) {
-                self.task_init_time = parseFloat(xhr.getResponseHeader("Timestamp"));
-                for (var key in data) {
-                    self.create_task(key, data[key]);
-                }
-                self.inits_todo -= 1;
-                if (self.inits_todo == 0) {
-                    self.init_scores();
-                }
-            },
-            error: function () {
-                console.error("Error while getting the list of tasks");
-                self.update_network_status(4);
-            }
-        });
-    }
-
     self.task_listener = function (event) {
         var cmd = event.data.split(" ");
         if (cmd[0] == "create") {
@@ -261,24 +222,6 @@ var DataStore = new function () {
 
     self.team_count = 0;
 
-    self.init_teams = function () {
-        $.ajax({
-            url: Config.get_team_list_url(),
-            dataType: "json",
-            success: function (data, status, xhr) {
-                self.team_init_time = parseFloat(xhr.getResponseHeader("Timestamp"));
-                for (var key in data) {
-                    self.create_team(key, data[key]);
-                }
-                self.init_users();
-            },
-            error: function () {
-                console.error("Error while getting the list of teams");
-                self.update_network_status(4);
-            }
-        });
-    }
-
     self.team_listener = function (event) {
         var cmd = event.data.split(" ");
         if (cmd[0] == "create") {
@@ -355,27 +298,6 @@ var DataStore = new function () {
 
     self.user_count = 0;
 
-    self.init_users = function () {
-        $.ajax({
-            url: Config.get_user_list_url(),
-            dataType: "json",
-            success: function (data, status, xhr) {
-                self.user_init_time = parseFloat(xhr.getResponseHeader("Timestamp"));
-                for (var key in data) {
-                    self.create_user(key, data[key]);
-                }
-                self.inits_todo -= 1;
-                if (self.inits_todo == 0) {
-                    self.init_scores();
-                }
-            },
-            error: function () {
-                console.error("Error while getting the list of users");
-                self.update_network_status(4);
-            }
-        });
-    }
-
     self.user_listener = function (event) {
         var cmd = event.data.split(" ");
         if (cmd[0] == "create") {
@@ -573,26 +495,6 @@ var DataStore = new function () {
 
     ////// Score
 
-    self.init_scores = function () {
-        $.ajax({
-            url: Config.get_score_url(),
-            dataType: "json",
-            success: function (data, status, xhr) {
-                self.score_init_time = parseFloat(xhr.getResponseHeader("Timestamp"));
-                for (var u_id in data) {
-                    for (var t_id in data[u_id]) {
-                        self.set_score(u_id, t_id, data[u_id][t_id]);
-                    }
-                }
-                self.init_ranks();
-            },
-            error: function () {
-                console.error("Error while getting the scores");
-                self.update_network_status(4);
-            }
-        });
-    };
-
     self.score_listener = function (event) {
         var data = event.data.split("\n");
         for (var idx in data) {
@@ -779,23 +681,52 @@ var DataStore = new function () {
     ////// Initialization
 
     /* The init process works this way:
-       - we start init_contests() and init_teams()
-       - they each start an asynchronous AJAX request
-       - when the requests end their data is processed and then, respectively,
-         init_tasks() and init_users() are called
-       - they also start an AJAX request and process its data
-       - when BOTH requests finish init_scores() is called
-       - it does again an AJAX request and processes its data
-       - at the end it calls init_ranks() which calls init_selections() which,
+       - we get the snapshot of all the data (contests, tasks, teams, users
+         and scores) with a single AJAX request
+       - we process it, in this order
+       - at the end we call init_ranks() which calls init_selections() which,
          in turn, calls init_callback()
+       The snapshot may be slightly older than the request: the changes made
+       after its timestamp are received from the event source.
      */
 
     self.init = function (callback) {
-        self.inits_todo = 2;
         self.init_callback = callback;
 
-        self.init_contests();
-        self.init_teams();
+        $.ajax({
+            url: Config.get_snapshot_url(),
+            dataType: "json",
+            success: function (data, status, xhr) {
+                var init_time = parseFloat(xhr.getResponseHeader("Timestamp"));
+                self.contest_init_time = init_time;
+                self.task_init_time = init_time;
+                self.team_init_time = init_time;
+                self.user_init_time = init_time;
+                self.score_init_time = init_time;
+                for (var key in data["contests"]) {
+                    self.create_contest(key, data["contests"][key]);
+                }
+                for (var key in data["tasks"]) {
+                    self.create_task(key, data["tasks"][key]);
+                }
+                for (var key in data["teams"]) {
+                    self.create_team(key, data["teams"][key]);
+                }
+                for (var key in data["users"]) {
+                    self.create_user(key, data["users"][key]);
+                }
+                for (var u_id in data["scores"]) {
+                    for (var t_id in data["scores"][u_id]) {
+                        self.set_score(u_id, t_id, data["scores"][u_id][t_id]);
+                    }
+                }
+                self.init_ranks();
+            },
+            error: function () {
+                console.error("Error while getting the snapshot");
+                self.update_network_status(4);
+            }
+        });
     };
 
 
@@ -823,6 +754,7 @@ var DataStore = new function () {
         self.es.addEventListener("open", self.es_open_handler, false);
         self.es.addEventListener("error", self.es_error_handler, false);
         self.es.addEventListener("reload", self.es_reload_handler, false);
+        self.es.addEventListener("reinit", self.es_reload_handler, false);
         self.es.addEventListener("contest", function (event) {
             var timestamp = parseInt(event.lastEventId, 16) / 1000000;
             if (timestamp > self.contest_init_time) {
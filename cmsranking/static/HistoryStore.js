@@ -24,34 +24,92 @@ var HistoryStore = new function () {
         self.history_t = new Array();  // per task
         self.history_c = new Array();  // per contest
         self.history_g = new Array();  // global
+
+        // The version of the history we have (as given by the server),
+        // its entries and the scores of each user on each task at its
+        // end.
+        self.cursor = null;
+        self.entries = new Array();
+        self.scores = new Object();
     };
 
     self.request_update = function (callback) {
+        // Ask only for the changes after the ones we already have.
         $.ajax({
             url: Config.get_history_url(),
+            data: self.cursor !== null ? {since: self.cursor} : {},
             dataType: "json",
-            success: function (data) {
-                self.perform_update(data, callback);
+            success: function (data, status, xhr) {
+                self.perform_update(
+                    data, xhr.getResponseHeader("X-History-Cursor"), callback);
             },
-            error: function () {
-                console.error("Error while getting the history");
+            error: function (xhr) {
+                if (xhr.status == 410) {
+                    // The history has been rebuilt: get it again.
+                    self.cursor = null;
+                    self.request_update(callback);
+                } else {
+                    console.error("Error while getting the history");
+                }
             }
         });
     };
 
-    self.perform_update = function (data, callback) {
-        var d = new Object();
+    self.perform_update = function (data, cursor, callback) {
+        var first = self.cursor === null;
+        if (first) {
+            self.entries = new Array();
+        }
+        self.cursor = cursor;
+
+        // The server appends the entries as the scores change, which
+        // isn't always in order of time (evaluations end in any order).
+        // If the new ones break the order, sort them all (the sort is
+        // stable, so the entries of each user and task stay in order)
+        // and compute everything again.
+        var sorted = true;
+        for (var i = 0; i < data.length; i += 1) {
+            var n = self.entries.length;
+            if (n > 0 && data[i][2] < self.entries[n - 1][2]) {
+                sorted = false;
+            }
+            self.entries.push(data[i]);
+        }
+        if (!sorted) {
+            self.entries.sort(function (a, b) {
+                return a[2] - b[2];
+            });
+        }
+        if (first || !sorted) {
+            self.scores = new Object();
+            self.history_t = new Array();
+            self.history_c = new Array();
+            self.history_g = new Array();
+            data = self.entries;
+        }
+
+        var d = self.scores;
+        for (var u_id in d) {
+            if (!DataStore.users[u_id]) {
+                delete d[u_id];
+            }
+        }
         for (var u_id in DataStore.users) {
-            d[u_id] = new Object();
+            if (!d[u_id]) {
+                d[u_id] = new Object();
+            }
+            for (var t_id in d[u_id]) {
+                if (!DataStore.tasks[t_id]) {
+                    delete d[u_id][t_id];
+                }
+            }
             for (var t_id in DataStore.tasks) {
-                d[u_id][t_id] = 0.0;
+                if (d[u_id][t_id] === undefined) {
+                    d[u_id][t_id] = 0.0;
+                }
             }
         }
 
-        self.history_t = new Array();
-        self.history_c = new Array();
-        self.history_g = new Array();
-
         for (var i in data) {
             var user = data[i][0];
             var task = data[i][1];
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how fast an EventSource delivers events to many clients.
+
+The clients are greenlets running the WSGI application of the event
+source in this process, each with a write() that just counts the
+events it receives; the events are published at a fixed pace, as the
+ranking does when receiving data from ProxyService.
+
+"""
+
+import argparse
+import sys
+import time
+
+import gevent
+from werkzeug.test import EnvironBuilder
+
+from cmscommon.eventsource import EventSource
+
+
+class Done(Exception):
+    pass
+
+
+def run(clients, events, batch):
+    """Time the delivery of the events to the clients.
+
+    clients (int): the number of connected clients.
+    events (int): the number of events to publish.
+    batch (int): how many events are published at once, before giving
+        control to the clients.
+
+    return ((float, float, int)): the time spent publishing, the time
+        until all clients received everything (both in seconds) and the
+        number of clients that fell behind and were asked to reinit.
+
+    """
+    source = EventSource()
+    environ = EnvironBuilder(
+        headers={"Accept": "text/event-stream"}).get_environ()
+    environ["SERVER_PROTOCOL"] = "HTTP/1.1"
+    reinits = [0]
+
+    def client():
+        received = [0]
+
+        def write(data):
+            received[0] += data.count(b"\nid:") + data.startswith(b"id:")
+            if b"event:reinit" in data:
+                reinits[0] += 1
+                raise Done()
+            if received[0] >= events:
+                raise Done()
+
+        source.wsgi_app(dict(environ), lambda status, headers: write)
+
+    greenlets = [gevent.spawn(client) for _ in range(clients)]
+    # Let all clients subscribe.
+    gevent.sleep(0)
+
+    publish_time = 0.0
+    start = time.monotonic()
+    for i in range(0, events, batch):
+        publish_start = time.monotonic()
+        for j in range(i, min(i + batch, events)):
+            source.send("score", "u%d t%d %d" % (j, j, j))
+        publish_time += time.monotonic() - publish_start
+        gevent.sleep(0)
+    gevent.joinall(greenlets, raise_error=True)
+    return publish_time, time.monotonic() - start, reinits[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the fan-out of EventSource.")
+    parser.add_argument(
+        "-c", "--clients", action="store", type=int, nargs="+",
+        default=[10, 100, 1000, 5000],
+        help="set the numbers of connected clients")
+    parser.add_argument(
+        "-n", "--events", action="store", type=int, default=1000,
+        help="set the number of events published (default 1000)")
+    parser.add_argument(
+        "-b", "--batch", action="store", type=int, default=10,
+        help="set the number of events published at once (default 10)")
+    args = parser.parse_args()
+
+    print("%10s %14s %14s %14s %10s" % (
+        "clients", "publish (ms)", "deliver (s)", "events/s", "reinits"))
+    for clients in args.clients:
+        publish_time, elapsed, reinits = run(
+            clients, args.events, args.batch)
+        print("%10d %14.1f %14.3f %14.0f %10d" % (
+            clients, publish_time * 1000, elapsed,
+            clients * args.events / elapsed, reinits))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure throughput and latency of the RPC protocols.
+
+A server and a client are run in this process, talking over a local
+TCP connection; the client calls an echo method with payloads of
+different sizes, once with the JSON protocol and once with the framed
+one.
+
+"""
+
+from gevent import monkey
+monkey.patch_all()  # noqa
+
+import argparse
+import sys
+import time
+from unittest.mock import patch
+
+import gevent
+from gevent.server import StreamServer
+
+from cms import Address, ServiceCoord
+from cms.io import RemoteServiceClient, RemoteServiceServer, rpc_method
+
+
+class EchoService:
+    @rpc_method
+    def echo(self, value):
+        return value
+
+
+def run(protocols, size, calls, concurrency):
+    """Time the echo calls using the given protocols.
+
+    protocols ([str]): the protocols the client proposes.
+    size (int): the length of the string sent with each call.
+    calls (int): the number of calls.
+    concurrency (int): how many calls are in flight at any time.
+
+    return ((float, float, float)): the total time, the median and
+        the 99th percentile of the latency (all in seconds).
+
+    """
+    service = EchoService()
+    server = StreamServer(
+        ("127.0.0.1", 0),
+        lambda sock, address:
+            RemoteServiceServer(service, address).handle(sock))
+    server.start()
+    address = Address(server.server_host, server.server_port)
+
+    with patch("cms.io.rpc.get_service_address", return_value=address), \
+            patch.object(RemoteServiceClient, "SUPPORTED_PROTOCOLS",
+                         tuple(protocols)):
+        client = RemoteServiceClient(ServiceCoord("Echo", 0))
+        client.connect()
+        client._connection_event.wait()
+        client.echo(value="").get()
+
+        value = "x" * size
+        latencies = []
+
+        def worker(count):
+            for _ in range(count):
+                start = time.monotonic()
+                client.echo(value=value).get()
+                latencies.append(time.monotonic() - start)
+
+        start = time.monotonic()
+        gevent.joinall([
+            gevent.spawn(worker, calls // concurrency
+                         + (1 if i < calls % concurrency else 0))
+            for i in range(concurrency)], raise_error=True)
+        elapsed = time.monotonic() - start
+
+        client.disconnect()
+    server.stop()
+
+    latencies.sort()
+    return (elapsed,
+            latencies[len(latencies) // 2],
+            latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the RPC protocols.")
+    parser.add_argument(
+        "-n", "--calls", action="store", type=int, default=2000,
+        help="set the number of calls for each payload size (default 2000)")
+    parser.add_argument(
+        "-c", "--concurrency", action="store", type=int, default=8,
+        help="set the number of concurrent calls (default 8)")
+    parser.add_argument(
+        "-s", "--sizes", action="store", type=int, nargs="+",
+        default=[10, 1000, 100000, 1000000],
+        help="set the payload sizes, in bytes")
+    args = parser.parse_args()
+
+    print("%-10s %10s %10s %12s %12s %12s" % (
+        "protocol", "size", "calls/s", "MiB/s", "p50 (ms)", "p99 (ms)"))
+    for size in args.sizes:
+        for name, protocols in [
+                (RemoteServiceClient.PROTOCOL_JSON, []),
+                (RemoteServiceClient.PROTOCOL_FRAMED,
+                 [RemoteServiceClient.PROTOCOL_FRAMED])]:
+            # JSON messages cannot exceed MAX_MESSAGE_SIZE.
+            if not protocols \
+                    and size + 100 > RemoteServiceClient.MAX_MESSAGE_SIZE:
+                continue
+            elapsed, p50, p99 = run(
+                protocols, size, args.calls, args.concurrency)
+            print("%-10s %10d %10.0f %12.1f %12.3f %12.3f" % (
+                name, size, args.calls / elapsed,
+                2 * size * args.calls / elapsed / 2 ** 20,
+                p50 * 1000, p99 * 1000))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
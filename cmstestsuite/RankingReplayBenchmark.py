@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how fast the ranking replays the history of the scores.
+
+Stores (kept in memory) are filled with random submissions and
+subchanges of a few users on a single task, and the scores are then
+computed from them, as RankingWebServer does at startup, once for
+each score mode.
+
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from cmscommon.constants import SCORE_MODE_MAX, SCORE_MODE_MAX_SUBTASK, \
+    SCORE_MODE_MAX_TOKENED_LAST
+from cmsranking.Scoring import ScoringStore
+from cmsranking.Store import Store
+from cmsranking.Subchange import Subchange
+from cmsranking.Submission import Submission
+from cmsranking.Task import Task
+
+
+def make_stores(score_mode, users, submissions, subtasks):
+    """Return stores filled with random data.
+
+    score_mode (str): the score mode of the task.
+    users (int): the number of users.
+    submissions (int): the number of submissions of each user.
+    subtasks (int): the number of subtasks of the task.
+
+    return (dict): the task, submission and subchange stores.
+
+    """
+    stores = dict()
+    for name, entity in [("task", Task), ("submission", Submission),
+                         ("subchange", Subchange)]:
+        # The path is never used, since nothing is loaded from disk.
+        stores[name] = Store(entity, name, stores)
+
+    def add(name, key, data):
+        item = stores[name]._entity()
+        item.set(data)
+        item.key = key
+        stores[name]._store[key] = item
+
+    add("task", "t", {
+        "name": "Task", "short_name": "t", "contest": "c",
+        "max_score": 100.0, "score_precision": 0, "extra_headers": [],
+        "order": 0, "score_mode": score_mode})
+    for user in range(users):
+        for i in range(submissions):
+            key = "%d_%d" % (user, i)
+            timestamp = 1500000000 + i
+            add("submission", key, {"user": "u%d" % user, "task": "t",
+                                    "time": timestamp})
+            extra = [str(random.choice([0, 100 / subtasks]))
+                     for _ in range(subtasks)]
+            # Keys are as ProxyService makes them, so that their order
+            # is the order of the times.
+            add("subchange", "%d%ss" % (timestamp, key), {
+                "submission": key, "time": timestamp,
+                "score": sum(float(e) for e in extra), "extra": extra})
+            if random.random() < 0.1:
+                add("subchange", "%d%st" % (timestamp, key), {
+                    "submission": key, "time": timestamp, "token": True})
+    return stores
+
+
+def run(stores):
+    """Time the computation of the scores.
+
+    stores (dict): the stores, as returned by make_stores.
+
+    return (float): the total time, in seconds.
+
+    """
+    start = time.monotonic()
+    ScoringStore(stores).init_store()
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the replay of the ranking history.")
+    parser.add_argument(
+        "-u", "--users", action="store", type=int, default=10,
+        help="set the number of users (default 10)")
+    parser.add_argument(
+        "-n", "--submissions", action="store", type=int, default=2000,
+        help="set the number of submissions of each user (default 2000)")
+    parser.add_argument(
+        "-s", "--subtasks", action="store", type=int, default=10,
+        help="set the number of subtasks (default 10)")
+    args = parser.parse_args()
+
+    random.seed(0)
+    print("%-20s %12s %12s %16s" % (
+        "mode", "subchanges", "total (s)", "subchanges/s"))
+    for score_mode in [SCORE_MODE_MAX, SCORE_MODE_MAX_SUBTASK,
+                       SCORE_MODE_MAX_TOKENED_LAST]:
+        stores = make_stores(
+            score_mode, args.users, args.submissions, args.subtasks)
+        subchanges = len(stores["subchange"]._store)
+        elapsed = run(stores)
+        print("%-20s %12d %12.3f %16.0f" % (
+            score_mode, subchanges, elapsed, subchanges / elapsed))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how fast the group score types score submissions.
+
+Submission results with random outcomes are scored in memory (without
+database) by a single score type instance, as ScoringService does for
+the results of a dataset, with both forms of subtask parameters
+(number of testcases and regular expression).
+
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from cms.grading.scoretypes.GroupMin import GroupMin
+from cms.grading.scoretypes.GroupMul import GroupMul
+
+
+class FakeEvaluation:
+    def __init__(self, codename, outcome):
+        self.codename = codename
+        self.outcome = outcome
+        self.text = ["Output is correct"]
+        self.execution_time = 0.1
+        self.execution_memory = 1024 * 1024
+
+
+class FakeSubmissionResult:
+    def __init__(self, evaluations):
+        self.evaluations = evaluations
+
+    def evaluated(self):
+        return True
+
+
+def make_score_type(score_type_class, form, subtasks, testcases):
+    """Return a score type with the given shape.
+
+    score_type_class (type): the class of the score type.
+    form (str): "number" or "regex", the kind of parameters.
+    subtasks (int): the number of subtasks.
+    testcases (int): the number of testcases in each subtask.
+
+    return (ScoreTypeGroup): the score type.
+
+    """
+    public_testcases = dict(
+        ("%03d_%04d" % (st, tc), tc == 0)
+        for st in range(subtasks) for tc in range(testcases))
+    if form == "number":
+        parameters = [[100 / subtasks, testcases] for _ in range(subtasks)]
+    else:
+        parameters = [[100 / subtasks, r"%03d_\d+" % st]
+                      for st in range(subtasks)]
+    return score_type_class(parameters, public_testcases)
+
+
+def run(score_type, submissions):
+    """Time the scoring of random submission results.
+
+    score_type (ScoreTypeGroup): the score type to use.
+    submissions (int): the number of submission results to score.
+
+    return (float): the total time, in seconds.
+
+    """
+    codenames = list(score_type.public_testcases.keys())
+    results = [
+        FakeSubmissionResult([
+            FakeEvaluation(codename, random.choice([0.0, 0.5, 1.0]))
+            for codename in codenames])
+        for _ in range(submissions)]
+
+    start = time.monotonic()
+    for result in results:
+        score_type.compute_score(result)
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scoring of submission results.")
+    parser.add_argument(
+        "-n", "--submissions", action="store", type=int, default=5000,
+        help="set the number of submissions (default 5000)")
+    parser.add_argument(
+        "-s", "--subtasks", action="store", type=int, default=10,
+        help="set the number of subtasks (default 10)")
+    parser.add_argument(
+        "-t", "--testcases", action="store", type=int, default=30,
+        help="set the number of testcases in each subtask (default 30)")
+    args = parser.parse_args()
+
+    random.seed(0)
+    print("%-10s %-8s %10s %12s %12s" % (
+        "type", "form", "testcases", "total (s)", "subs/s"))
+    for score_type_class in [GroupMin, GroupMul]:
+        for form in ["number", "regex"]:
+            score_type = make_score_type(
+                score_type_class, form, args.subtasks, args.testcases)
+            elapsed = run(score_type, args.submissions)
+            print("%-10s %-8s %10d %12.3f %12.0f" % (
+                score_type_class.__name__, form,
+                args.subtasks * args.testcases, elapsed,
+                args.submissions / elapsed))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
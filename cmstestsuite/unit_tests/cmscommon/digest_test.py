@@ -20,7 +20,8 @@
 
 import unittest
 
-from cmscommon.digest import Digester, bytes_digest, path_digest
+from cmscommon.digest import Digester, bytes_digest, json_digest, \
+    path_digest
 from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
 
 
@@ -61,6 +62,17 @@ class TestBytesDigest(unittest.TestCase):
             bytes_digest("")
 
 
+class TestJsonDigest(unittest.TestCase):
+
+    def test_canonical(self):
+        self.assertEqual(json_digest({"a": 1, "b": [1.0, "x"]}),
+                         json_digest({"b": [1.0, "x"], "a": 1}))
+        self.assertEqual(json_digest({"a": 1}), bytes_digest(b'{"a":1}'))
+
+    def test_different(self):
+        self.assertNotEqual(json_digest({"a": 1}), json_digest({"a": 1.0}))
+
+
 class TestPathDigest(FileSystemMixin, unittest.TestCase):
 
     def setUp(self):
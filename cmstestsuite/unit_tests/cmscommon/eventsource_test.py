@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the eventsource module"""
+
+import re
+import unittest
+
+import gevent
+
+from cmscommon.eventsource import Publisher, Subscriber
+
+
+def data(messages):
+    """Return the data of the given encoded events."""
+    return [re.search(b"data:(.*)", msg).group(1).decode("utf-8")
+            if msg != Subscriber.REINIT else "reinit"
+            for msg in messages]
+
+
+def event_id(msg):
+    return re.match(b"id:([0-9a-f]+)", msg).group(1).decode("ascii")
+
+
+class TestPublisher(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pub = Publisher(4)
+
+    def put(self, *values, coalesce=None):
+        for value in values:
+            self.pub.put("e", value, coalesce)
+
+    def test_get(self):
+        sub = self.pub.get_subscriber()
+        self.put("a", "b")
+        self.assertEqual(data(sub.get()), ["a", "b"])
+        self.put("c")
+        self.assertEqual(data(sub.get()), ["c"])
+
+    def test_get_blocks(self):
+        sub = self.pub.get_subscriber()
+        greenlet = gevent.spawn(lambda: data(sub.get()))
+        gevent.sleep(0)
+        self.assertFalse(greenlet.ready())
+        self.put("a")
+        self.assertEqual(greenlet.get(timeout=1), ["a"])
+
+    def test_keys_increase(self):
+        sub = self.pub.get_subscriber()
+        self.put("a", "b", "c")
+        keys = [int(event_id(msg), 16) for msg in sub.get()]
+        self.assertEqual(keys, sorted(set(keys)))
+
+    def receive_all(self, values):
+        """Publish values, receiving each one as soon as it's sent."""
+        sub = self.pub.get_subscriber()
+        messages = list()
+        for value in values:
+            self.put(value)
+            messages.extend(sub.get())
+        return messages
+
+    def test_resume(self):
+        messages = self.receive_all(["a", "b", "c", "d", "e", "f"])
+        # The buffer holds "c" to "f", "b" is the last one dropped.
+        for last, expected in [(1, ["c", "d", "e", "f"]),
+                               (2, ["d", "e", "f"]),
+                               (4, ["f"])]:
+            resumed = self.pub.get_subscriber(event_id(messages[last]))
+            self.assertEqual(data(resumed.get()), expected)
+
+    def test_resume_too_old(self):
+        messages = self.receive_all(["a", "b", "c", "d", "e", "f"])
+        # "b", that followed "a", is not in the buffer anymore.
+        resumed = self.pub.get_subscriber(event_id(messages[0]))
+        self.assertEqual(data(resumed.get()), ["reinit"])
+
+    def test_resume_from_last_event_id(self):
+        for values in [[], ["a", "b"]]:
+            self.put(*values)
+            resumed = self.pub.get_subscriber(self.pub.get_last_event_id())
+            self.put("c")
+            self.assertEqual(data(resumed.get()), ["c"])
+
+    def test_resume_from_before_start(self):
+        self.assertEqual(data(self.pub.get_subscriber("0").get()),
+                         ["reinit"])
+
+    def test_slow_subscriber(self):
+        sub = self.pub.get_subscriber()
+        self.put("a", "b", "c", "d", "e")
+        self.assertEqual(data(sub.get()), ["reinit"])
+        self.put("f")
+        self.assertEqual(data(sub.get()), ["f"])
+
+    def test_coalesce(self):
+        sub = self.pub.get_subscriber()
+        self.put("a1", coalesce="a")
+        self.put("b1", coalesce="b")
+        self.put("x")
+        self.put("a2", coalesce="a")
+        self.assertEqual(data(sub.get()), ["b1", "x", "a2"])
+        self.put("a3", coalesce="a")
+        self.assertEqual(data(sub.get()), ["a3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
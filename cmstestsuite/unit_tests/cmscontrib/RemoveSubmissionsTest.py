@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the RemoveSubmissions script"""
+
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.db import Submission, TaskScore
+from cms.grading.scoring import get_task_score, update_task_scores
+from cmscommon.constants import SCORE_MODE_MAX
+from cmscommon.datetime import make_datetime
+from cmscontrib.RemoveSubmissions import remove_submission
+
+
+class TestRemoveSubmissions(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.participation = self.add_participation()
+        self.task = self.add_task(contest=self.participation.contest,
+                                  score_mode=SCORE_MODE_MAX)
+        self.task.active_dataset = self.add_dataset(task=self.task)
+        timestamp = make_datetime()
+        self.submissions = []
+        for i, score in enumerate([30.0, 70.0]):
+            submission = self.add_submission(
+                participation=self.participation, task=self.task,
+                timestamp=timestamp + timedelta(seconds=i))
+            self.add_submission_result(
+                submission, self.task.active_dataset, score=score,
+                public_score=0.0, score_details=[],
+                public_score_details=[], ranking_score_details=[])
+            self.submissions.append(submission)
+        self.session.flush()
+        update_task_scores(self.session, self.task)
+        self.session.commit()
+
+    def tearDown(self):
+        self.delete_data()
+        super().tearDown()
+
+    def test_remove_submission(self):
+        self.assertEqual(
+            get_task_score(self.session, self.participation, self.task),
+            (70.0, False))
+
+        with patch("builtins.input", return_value="y"):
+            remove_submission(self.submissions[1].id)
+
+        self.session.expire_all()
+        self.assertEqual(self.session.query(Submission).count(), 1)
+        self.assertEqual(self.session.query(TaskScore).count(), 0)
+        self.assertEqual(
+            get_task_score(self.session, self.participation, self.task),
+            (30.0, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the journal of the ranking stores.
+
+"""
+
+import json
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+import gevent
+
+from cmsranking.Journal import Journal
+from cmsranking.Store import Store
+from cmsranking.Team import Team
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
+
+
+class TestJournal(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.base_dir, "teams")
+        self.stores = dict()
+
+    def new_store(self, journal=True):
+        store = Store(Team, self.path, self.stores, journal=journal,
+                      flush_interval=0.01)
+        store.load_from_disk()
+        return store
+
+    def names(self):
+        return sorted(os.listdir(self.path))
+
+    def test_replay(self):
+        store = self.new_store()
+        store.create("a", {"name": "A"})
+        store.create("b", {"name": "B"})
+        store.update("a", {"name": "AA"})
+        store.delete("b")
+        store.merge_list({"c": {"name": "C"}, "a": {"name": "AAA"}})
+        store.close()
+
+        store = self.new_store()
+        self.assertEqual(store.retrieve_list(),
+                         {"a": {"name": "AAA"}, "c": {"name": "C"}})
+        # Loading a non-empty journal compacts it.
+        self.assertEqual(self.names(), ["journal.1", "snapshot.1"])
+
+    def test_flushed_in_background(self):
+        store = self.new_store()
+        store.create("a", {"name": "A"})
+        journal_path = os.path.join(self.path, "journal.0")
+        self.assertEqual(os.path.getsize(journal_path), 0)
+        gevent.sleep(0.05)
+        with open(journal_path, "rt", encoding="utf-8") as journal:
+            self.assertEqual([json.loads(line) for line in journal],
+                             [["a", {"name": "A"}]])
+        store.close()
+
+    def test_flush_does_not_block(self):
+        store = self.new_store()
+        store.create("a", {"name": "A"})
+        ticks = []
+
+        def tick():
+            while True:
+                ticks.append(None)
+                gevent.sleep(0.01)
+
+        ticker = gevent.spawn(tick)
+        gevent.sleep(0)
+        # A slow disk: other greenlets run while the journal is synced.
+        with patch("cmsranking.Journal.os.fsync",
+                   side_effect=lambda fd: time.sleep(0.1)):
+            store._journal.flush()
+        ticker.kill()
+        self.assertGreater(len(ticks), 3)
+        store.close()
+
+    def test_truncated_record(self):
+        store = self.new_store()
+        store.create("a", {"name": "A"})
+        store.close()
+        with open(os.path.join(self.path, "journal.0"), "ab") as journal:
+            journal.write(b'["b", {"na')
+
+        store = self.new_store()
+        self.assertEqual(store.retrieve_list(), {"a": {"name": "A"}})
+        store.create("b", {"name": "B"})
+        store.close()
+        self.assertEqual(self.new_store().retrieve_list(),
+                         {"a": {"name": "A"}, "b": {"name": "B"}})
+
+    def test_compaction(self):
+        with patch.object(Journal, "MIN_COMPACTION_RECORDS", 3):
+            store = self.new_store()
+            for i in range(4):
+                store.create("t%d" % i, {"name": "T"})
+            store._journal.flush()
+            self.assertEqual(self.names(), ["journal.1", "snapshot.1"])
+            store.delete("t0")
+            store.close()
+        self.assertEqual(sorted(self.new_store().retrieve_list()),
+                         ["t1", "t2", "t3"])
+
+    def test_migration(self):
+        store = self.new_store(journal=False)
+        store.create("a", {"name": "A"})
+        store.create("b", {"name": "B"})
+        self.assertEqual(self.names(), ["a.json", "b.json"])
+
+        store = self.new_store()
+        self.assertEqual(self.names(), ["journal.0", "snapshot.0"])
+        self.assertEqual(store.retrieve_list(),
+                         {"a": {"name": "A"}, "b": {"name": "B"}})
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the handlers of RankingWebServer.
+
+"""
+
+import gzip
+import json
+import os
+import unittest
+
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse
+
+from cmscommon.constants import SCORE_MODE_MAX
+from cmsranking.Contest import Contest
+from cmscommon.digest import json_digest
+from cmsranking.RankingWebServer import HistoryHandler, SnapshotHandler, \
+    StoreHandler, SubListHandler
+from cmsranking.Scoring import ScoringStore
+from cmsranking.Store import Store
+from cmsranking.Subchange import Subchange
+from cmsranking.Submission import Submission
+from cmsranking.Task import Task
+from cmsranking.Team import Team
+from cmsranking.User import User
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
+
+
+class TestGlobalHistory(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.stores = dict()
+        for name, entity in [("task", Task), ("submission", Submission),
+                             ("subchange", Subchange)]:
+            self.stores[name] = Store(
+                entity, os.path.join(self.base_dir, name), self.stores)
+            self.stores[name].load_from_disk()
+        self.stores["scoring"] = ScoringStore(self.stores)
+        self.stores["scoring"].init_store()
+        self.stores["task"].create("t", {
+            "name": "Task", "short_name": "t", "contest": "c",
+            "max_score": 100.0, "score_precision": 0, "extra_headers": [],
+            "order": 0, "score_mode": SCORE_MODE_MAX})
+        self.client = Client(HistoryHandler(self.stores), BaseResponse)
+
+    def score(self, key, user, time, score):
+        if key not in self.stores["submission"]:
+            self.stores["submission"].create(
+                key, {"user": user, "task": "t", "time": time})
+        self.stores["subchange"].create(
+            "%d%ss" % (time, key),
+            {"submission": key, "time": time, "score": score})
+
+    def get(self, since=None, headers=None):
+        query = {"since": since} if since is not None else {}
+        headers = dict(headers or {}, Accept="application/json")
+        return self.client.get("/", query_string=query, headers=headers)
+
+    def assertHistory(self, entries):
+        response = self.get()
+        self.assertEqual(json.loads(response.get_data()),
+                         [list(e) for e in entries])
+        # Once sorted, it's the same as the merge of the histories.
+        self.assertEqual(
+            sorted(json.loads(response.get_data()),
+                   key=lambda e: (e[2], e[3], e[0], e[1])),
+            [list(e) for e in
+             self.stores["scoring"].get_global_history()])
+        return response.headers["X-History-Cursor"]
+
+    def test_since(self):
+        self.score("s1", "u1", 10, 20.0)
+        cursor = self.assertHistory([("u1", "t", 10, 20.0)])
+        self.score("s2", "u2", 11, 30.0)
+        self.score("s3", "u1", 12, 40.0)
+        response = self.get(cursor)
+        self.assertEqual(json.loads(response.get_data()),
+                         [["u2", "t", 11, 30.0], ["u1", "t", 12, 40.0]])
+        # Nothing is rebuilt when appending.
+        self.assertEqual(
+            response.headers["X-History-Cursor"].split("-")[0],
+            cursor.split("-")[0])
+        self.assertEqual(
+            json.loads(self.get(response.headers["X-History-Cursor"])
+                       .get_data()), [])
+
+    def test_out_of_order(self):
+        # Evaluations of two users ending out of order with respect to
+        # each other: the entries are appended as they come, without a
+        # rebuild.
+        self.score("s1", "u1", 10, 20.0)
+        cursor = self.assertHistory([("u1", "t", 10, 20.0)])
+        self.score("s2", "u2", 13, 30.0)
+        self.score("s3", "u1", 12, 40.0)
+        self.score("s4", "u2", 15, 50.0)
+        self.score("s5", "u1", 14, 60.0)
+        response = self.get(cursor)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.get_data()),
+                         [["u2", "t", 13, 30.0], ["u1", "t", 12, 40.0],
+                          ["u2", "t", 15, 50.0], ["u1", "t", 14, 60.0]])
+        self.assertEqual(
+            response.headers["X-History-Cursor"].split("-")[0],
+            cursor.split("-")[0])
+        self.assertHistory([("u1", "t", 10, 20.0), ("u2", "t", 13, 30.0),
+                            ("u1", "t", 12, 40.0), ("u2", "t", 15, 50.0),
+                            ("u1", "t", 14, 60.0)])
+
+    def test_rebuilt(self):
+        self.score("s1", "u1", 10, 20.0)
+        self.score("s2", "u2", 12, 30.0)
+        cursor = self.assertHistory([("u1", "t", 10, 20.0),
+                                     ("u2", "t", 12, 30.0)])
+        # A reset of the history of a user.
+        self.stores["subchange"].delete("10s1s")
+        self.assertEqual(self.get(cursor).status_code, 410)
+        self.assertHistory([("u2", "t", 12, 30.0)])
+
+    def test_conditional_and_compressed(self):
+        for i in range(100):
+            self.score("s%d" % i, "u%d" % i, i, 1.0)
+        response = self.get(headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(len(json.loads(gzip.decompress(
+            response.get_data()))), 100)
+        etag = response.headers["ETag"]
+        self.assertEqual(
+            self.get(headers={"If-None-Match": etag}).status_code, 304)
+        self.score("s100", "u100", 100, 1.0)
+        self.assertEqual(
+            self.get(headers={"If-None-Match": etag}).status_code, 200)
+
+
+class TestSnapshot(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.stores = dict()
+        for name, entity in [("contest", Contest), ("task", Task),
+                             ("team", Team), ("user", User),
+                             ("submission", Submission),
+                             ("subchange", Subchange)]:
+            self.stores[name] = Store(
+                entity, os.path.join(self.base_dir, name), self.stores)
+            self.stores[name].load_from_disk()
+        self.stores["scoring"] = ScoringStore(self.stores)
+        self.stores["scoring"].init_store()
+        self.stores["team"].create("tm", {"name": "Team"})
+
+    def get(self, interval, headers=None):
+        if not hasattr(self, "client"):
+            self.client = Client(SnapshotHandler(self.stores, interval),
+                                 BaseResponse)
+        headers = dict(headers or {}, Accept="application/json")
+        return self.client.get("/", headers=headers)
+
+    def test_content(self):
+        self.stores["user"].create("u", {"f_name": "A", "l_name": "B",
+                                         "team": "tm"})
+        response = self.get(0.0, {"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        data = json.loads(gzip.decompress(response.get_data()))
+        self.assertEqual(data["teams"], {"tm": {"name": "Team"}})
+        self.assertEqual(list(data["users"]), ["u"])
+        self.assertEqual(data["scores"], {})
+        self.assertEqual(response.headers["ETag"],
+                         'W/"%s"' % response.headers["Timestamp"])
+
+    def test_conditional(self):
+        response = self.get(0.0)
+        etag = response.headers["ETag"]
+        self.assertEqual(self.get(0.0, {"If-None-Match": etag}).status_code,
+                         304)
+        self.stores["team"].update("tm", {"name": "Other"})
+        response = self.get(0.0, {"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.get_data())["teams"],
+                         {"tm": {"name": "Other"}})
+
+    def test_interval(self):
+        timestamp = self.get(3600.0).headers["Timestamp"]
+        self.stores["team"].update("tm", {"name": "Other"})
+        # Changes are picked up only after the interval.
+        response = self.get(3600.0)
+        self.assertEqual(response.headers["Timestamp"], timestamp)
+        self.assertEqual(json.loads(response.get_data())["teams"],
+                         {"tm": {"name": "Team"}})
+
+
+class TestSubList(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.stores = dict()
+        for name, entity in [("task", Task), ("submission", Submission),
+                             ("subchange", Subchange)]:
+            self.stores[name] = Store(
+                entity, os.path.join(self.base_dir, name), self.stores)
+            self.stores[name].load_from_disk()
+        self.stores["scoring"] = ScoringStore(self.stores)
+        self.stores["scoring"].init_store()
+        for task in ["t1", "t2"]:
+            self.stores["task"].create(task, {
+                "name": "Task", "short_name": task, "contest": "c",
+                "max_score": 100.0, "score_precision": 0,
+                "extra_headers": [], "order": 0,
+                "score_mode": SCORE_MODE_MAX})
+        self.client = Client(SubListHandler(self.stores), BaseResponse)
+
+    def submit(self, key, user, task, time):
+        self.stores["submission"].create(
+            key, {"user": user, "task": task, "time": time})
+
+    def get(self, user):
+        response = self.client.get(
+            "/%s" % user, headers={"Accept": "application/json"})
+        return [(s["key"], s["score"])
+                for s in json.loads(response.get_data())]
+
+    def test_sorted(self):
+        self.submit("s1", "u1", "t2", 10)
+        self.submit("s2", "u1", "t1", 20)
+        self.submit("s3", "u2", "t1", 15)
+        self.submit("s4", "u1", "t1", 5)
+        self.assertEqual(self.get("u1"),
+                         [("s4", 0.0), ("s2", 0.0), ("s1", 0.0)])
+        self.assertEqual(self.get("u2"), [("s3", 0.0)])
+        self.assertEqual(self.get("u3"), [])
+
+    def test_changes(self):
+        self.submit("s1", "u1", "t1", 10)
+        self.submit("s2", "u1", "t1", 20)
+        self.assertEqual(self.get("u1"), [("s1", 0.0), ("s2", 0.0)])
+        self.stores["subchange"].create(
+            "20s2s", {"submission": "s2", "time": 20, "score": 50.0})
+        self.assertEqual(self.get("u1"), [("s1", 0.0), ("s2", 50.0)])
+        self.stores["submission"].update(
+            "s1", {"user": "u1", "task": "t1", "time": 30})
+        self.assertEqual(self.get("u1"), [("s2", 50.0), ("s1", 0.0)])
+        self.stores["submission"].update(
+            "s1", {"user": "u2", "task": "t1", "time": 30})
+        self.assertEqual(self.get("u1"), [("s2", 50.0)])
+        self.assertEqual(self.get("u2"), [("s1", 0.0)])
+        self.stores["submission"].delete("s2")
+        self.assertEqual(self.get("u1"), [])
+
+
+class TestStoreHandler(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = Store(Team, os.path.join(self.base_dir, "team"), {})
+        self.store.load_from_disk()
+        self.client = Client(StoreHandler(self.store, "user", "pass", "R"),
+                             BaseResponse)
+
+    def put(self, body, headers=None):
+        headers = dict(headers or {}, Authorization="Basic dXNlcjpwYXNz")
+        return self.client.put("/", data=body, headers=headers,
+                               content_type="application/json")
+
+    def test_put_compressed(self):
+        response = self.put(gzip.compress(b'{"tm": {"name": "Team"}}'),
+                            {"Content-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.headers["Accept-Encoding"], "gzip")
+        self.assertEqual(self.store.retrieve("tm"), {"name": "Team"})
+
+    def test_put_wrong_encoding(self):
+        self.assertEqual(self.put(b'{"tm": {"name": "Team"}}',
+                                  {"Content-Encoding": "gzip"}).status_code,
+                         400)
+        self.assertEqual(self.put(b'{"tm": {"name": "Team"}}',
+                                  {"Content-Encoding": "br"}).status_code,
+                         415)
+        self.assertNotIn("tm", self.store)
+
+    def test_digests(self):
+        self.store.create("tm", {"name": "Team"})
+        response = self.client.get(
+            "/?digests", headers={"Accept": "application/json"})
+        self.assertEqual(json.loads(response.get_data()),
+                         {"tm": json_digest({"name": "Team"})})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the replication of RankingWebServer.
+
+"""
+
+import json
+import os
+import unittest
+
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse
+
+from cmscommon.constants import SCORE_MODE_MAX
+from cmsranking.Contest import Contest
+from cmsranking.RankingWebServer import ReplicationHandler
+from cmsranking.Replica import REPLICATED_STORES, Replica, parse_events
+from cmsranking.Scoring import ScoringStore
+from cmsranking.Store import Store
+from cmsranking.Subchange import Subchange
+from cmsranking.Submission import Submission
+from cmsranking.Task import Task
+from cmsranking.Team import Team
+from cmsranking.User import User
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
+
+
+def make_stores(base_dir=None):
+    """Return the stores of an RWS, in memory if base_dir is None."""
+    stores = dict()
+    depends = {"contest": "task", "task": "submission", "team": "user",
+               "user": "submission", "submission": "subchange"}
+    for name, entity in reversed(list(zip(
+            REPLICATED_STORES,
+            [Contest, Task, Team, User, Submission, Subchange]))):
+        path = os.path.join(base_dir, name) if base_dir is not None \
+            else None
+        stores[name] = Store(
+            entity, path, stores,
+            [stores[depends[name]]] if name in depends else None)
+        if path is not None:
+            stores[name].load_from_disk()
+    stores["scoring"] = ScoringStore(stores)
+    stores["scoring"].init_store()
+    return stores
+
+
+class TestParseEvents(unittest.TestCase):
+
+    def test_parse(self):
+        lines = b":\n\nid:1\nevent:change\ndata:a\ndata:b\n\n" \
+            b"event:reinit\n\n".split(b"\n")
+        self.assertEqual(list(parse_events(lines)),
+                         [("change", "1", "a\nb"), ("reinit", "1", "")])
+
+
+class TestReplica(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.primary = make_stores(self.base_dir)
+        self.client = Client(ReplicationHandler(self.primary, 100),
+                             BaseResponse)
+        self.replica = Replica(make_stores(), "http://primary/")
+
+        self.primary["contest"].create("c", {
+            "name": "Contest", "begin": 0, "end": 100,
+            "score_precision": 0})
+        self.primary["task"].create("t", {
+            "name": "Task", "short_name": "t", "contest": "c",
+            "max_score": 100.0, "score_precision": 0, "extra_headers": [],
+            "order": 0, "score_mode": SCORE_MODE_MAX})
+        self.primary["team"].create("tm", {"name": "Team"})
+        self.primary["user"].create("u", {"f_name": "A", "l_name": "B",
+                                          "team": "tm"})
+        self.score("s1", 10, 50.0)
+
+    def score(self, key, time, score):
+        self.primary["submission"].create(
+            key, {"user": "u", "task": "t", "time": time})
+        self.primary["subchange"].create(
+            "%d%ss" % (time, key),
+            {"submission": key, "time": time, "score": score})
+
+    def load_dump(self):
+        response = self.client.get(
+            "/dump", headers={"Accept": "application/json"})
+        self.replica.load_dump(json.loads(response.get_data()))
+
+    def follow(self):
+        # Requests coming from XMLHttpRequest return after the first
+        # batch of events.
+        response = self.client.get("/changes", headers={
+            "Accept": "text/event-stream",
+            "Last-Event-ID": self.replica.cursor,
+            "X-Requested-With": "XMLHttpRequest"})
+        for event, event_id, data in parse_events(
+                response.get_data().split(b"\n")):
+            self.assertEqual(event, "change")
+            self.replica.apply_change(*json.loads(data))
+            self.replica.cursor = event_id
+
+    def assertInSync(self):
+        for name in REPLICATED_STORES:
+            self.assertEqual(self.replica.stores[name].retrieve_list(),
+                             self.primary[name].retrieve_list())
+        self.assertEqual(self.replica.stores["scoring"].get_scores(),
+                         self.primary["scoring"].get_scores())
+
+    def test_dump(self):
+        self.load_dump()
+        self.assertInSync()
+        self.assertEqual(self.replica.stores["scoring"].get_scores(),
+                         {"u": {"t": 50.0}})
+
+    def test_changes(self):
+        self.load_dump()
+        self.score("s2", 20, 80.0)
+        self.primary["team"].update("tm", {"name": "Other team"})
+        self.follow()
+        self.assertInSync()
+
+        # Deleting the user deletes its submissions too.
+        self.primary["user"].delete("u")
+        self.follow()
+        self.assertInSync()
+
+    def test_dump_again(self):
+        self.load_dump()
+        self.primary["user"].delete("u")
+        self.primary["team"].update("tm", {"name": "Other team"})
+        self.load_dump()
+        self.assertInSync()
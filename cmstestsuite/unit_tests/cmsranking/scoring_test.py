@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the scores of the ranking.
+
+"""
+
+import random
+import unittest
+from itertools import zip_longest
+
+from cmscommon.constants import SCORE_MODE_MAX, SCORE_MODE_MAX_SUBTASK, \
+    SCORE_MODE_MAX_TOKENED_LAST
+from cmsranking.Scoring import NumberSet, Score
+from cmsranking.Subchange import Subchange
+from cmsranking.Submission import Submission
+
+
+def expected_score(submissions, score_mode):
+    """Compute the score from scratch."""
+    if score_mode == SCORE_MODE_MAX:
+        return max((s.score for s in submissions), default=0.0)
+    elif score_mode == SCORE_MODE_MAX_SUBTASK:
+        scores_by_subtask = zip_longest(
+            *(map(float, s.extra or [s.score]) for s in submissions),
+            fillvalue=0.0)
+        return float(sum(max(s) for s in scores_by_subtask))
+    else:
+        scored = [s for s in submissions if s.scored]
+        last = max(scored, key=lambda s: s.time) if scored else None
+        return max([s.score for s in submissions if s.token]
+                   + [0.0, last.score if last is not None else 0.0])
+
+
+class TestNumberSet(unittest.TestCase):
+
+    def test_operations(self):
+        numbers = NumberSet()
+        self.assertIsNone(numbers.maximum())
+        self.assertEqual(numbers.query(), 0.0)
+        for val in [3.0, -1.0, 5.0, 5.0]:
+            numbers.insert(val)
+        self.assertEqual(numbers.maximum(), 5.0)
+        numbers.remove(5.0)
+        self.assertEqual(numbers.maximum(), 5.0)
+        numbers.remove(5.0)
+        numbers.remove(3.0)
+        self.assertEqual(len(numbers), 1)
+        self.assertEqual(numbers.maximum(), -1.0)
+        self.assertEqual(numbers.query(), 0.0)
+        with self.assertRaises(ValueError):
+            numbers.remove(3.0)
+
+    def test_many_removals(self):
+        numbers = NumberSet()
+        for val in range(1000):
+            numbers.insert(val)
+        for val in range(999, 0, -1):
+            numbers.remove(val)
+            self.assertEqual(numbers.maximum(), val - 1)
+        self.assertLess(len(numbers._heap), 100)
+
+
+class TestScore(unittest.TestCase):
+
+    def replay(self, score_mode, seed):
+        rnd = random.Random(seed)
+        score = Score(score_mode)
+        submissions = list()
+        for i in range(5):
+            submission = Submission()
+            submission.set({"user": "u", "task": "t", "time": i})
+            score.create_submission("s%d" % i, submission)
+            # Whether it had a subchange with a score.
+            submission.scored = False
+            submissions.append(submission)
+        for i in range(100):
+            data = {"submission": "s%d" % rnd.randrange(5), "time": i}
+            if rnd.random() < 0.7:
+                data["score"] = rnd.choice([0.0, 10.0, 25.5, 40.0])
+            if rnd.random() < 0.2:
+                data["token"] = True
+            if rnd.random() < 0.5:
+                data["extra"] = [rnd.choice(["0", "5", "12.5"])
+                                 for _ in range(rnd.randrange(4))]
+            subchange = Subchange()
+            subchange.set(data)
+            subchange.key = "%03d" % i
+            score.create_subchange(subchange.key, subchange)
+            if "score" in data:
+                score._submissions[data["submission"]].scored = True
+            self.assertEqual(score.get_score(),
+                             expected_score(submissions, score_mode))
+
+    def test_max(self):
+        for seed in range(10):
+            self.replay(SCORE_MODE_MAX, seed)
+
+    def test_max_subtask(self):
+        for seed in range(10):
+            self.replay(SCORE_MODE_MAX_SUBTASK, seed)
+
+    def test_max_tokened_last(self):
+        for seed in range(10):
+            self.replay(SCORE_MODE_MAX_TOKENED_LAST, seed)
+
+    def test_update_score_mode(self):
+        score = Score(SCORE_MODE_MAX)
+        submission = Submission()
+        submission.set({"user": "u", "task": "t", "time": 0})
+        score.create_submission("s", submission)
+        subchange = Subchange()
+        subchange.set({"submission": "s", "time": 0, "score": 30.0,
+                       "extra": ["10", "10"]})
+        subchange.key = "c"
+        score.create_subchange("c", subchange)
+        self.assertEqual(score.get_score(), 30.0)
+        score.update_score_mode(SCORE_MODE_MAX_SUBTASK)
+        self.assertEqual(score.get_score(), 20.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -28,11 +28,15 @@ import random
 import shutil
 import unittest
 from io import BytesIO
+from unittest.mock import patch
 
 # Needs to be first to allow for monkey patching the DB connection string.
 from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
 
-from cms.db.filecacher import FileCacher
+from cms import config
+from cms.db.filecacher import FileCacher, ObjectStoreBackend, \
+    _compute_backend_digest
+from cmstestsuite.unit_tests.objectstoreserver import ObjectStoreServer
 from cmscommon.digest import Digester, bytes_digest
 
 
@@ -359,6 +363,55 @@ class TestFileCacherBase:
         # Check that the file was stored correctly.
         self.check_stored_file(digest)
 
+    def test_file_mmap(self):
+        """Store some files and read them back through memory maps.
+
+        """
+        for content in [os.urandom(100), os.urandom(100_000), b""]:
+            digest = self.file_cacher.put_file_content(content)
+            os.unlink(os.path.join(self.cache_base_path, digest))
+            with self.file_cacher.get_file_mmap(digest) as view:
+                self.assertEqual(len(view), len(content))
+                self.assertEqual(view.read(), content)
+
+    def test_prefetch(self):
+        """Prefetch some files and check that they end up in the cache,
+        each downloaded only once even when requested many times.
+
+        """
+        contents = [os.urandom(100) for _ in range(3)]
+        digests = [self.file_cacher.put_file_content(content)
+                   for content in contents]
+        for digest in digests:
+            os.unlink(os.path.join(self.cache_base_path, digest))
+
+        original_get_file = self.file_cacher.backend.get_file
+        with patch.object(self.file_cacher.backend, "get_file",
+                          side_effect=original_get_file) as get_file:
+            handles = self.file_cacher.prefetch(digests + digests)
+            # get_file must wait for the pending prefetch.
+            self.assertEqual(self.file_cacher.get_file_content(digests[0]),
+                             contents[0])
+            for handle in handles:
+                handle.get()
+            self.assertEqual(get_file.call_count, len(digests))
+
+        for digest, content in zip(digests, contents):
+            with open(os.path.join(self.cache_base_path, digest), "rb") as f:
+                self.assertEqual(f.read(), content)
+
+    def test_prefetch_missing_file(self):
+        """Prefetch a file that doesn't exist and check that the error
+        is delivered to whoever waits on it.
+
+        """
+        digest = bytes_digest(os.urandom(100))
+        handle, = self.file_cacher.prefetch([digest])
+        with self.assertRaises(KeyError):
+            self.file_cacher.get_file(digest)
+        with self.assertRaises(KeyError):
+            handle.get()
+
 
 class TestFileCacherDB(TestFileCacherBase, DatabaseMixin, unittest.TestCase):
     """Tests for the FileCacher service with a database backend."""
@@ -383,6 +436,123 @@ class TestFileCacherFS(TestFileCacherBase, unittest.TestCase):
     def tearDown(self):
         shutil.rmtree("fs-storage", ignore_errors=True)
 
+    def corrupt(self, digest):
+        with open(os.path.join("fs-storage", digest), "ab") as f:
+            f.write(b"corruption")
+
+    def test_check_backend_integrity(self):
+        """Corrupt a file in the storage and check that the parallel
+        integrity check finds and deletes it.
+
+        """
+        digests = [self.file_cacher.put_file_content(os.urandom(100))
+                   for _ in range(5)]
+        self.assertTrue(self.file_cacher.check_backend_integrity(workers=2))
+
+        self.corrupt(digests[0])
+        self.assertFalse(self.file_cacher.check_backend_integrity(
+            delete=True, workers=2))
+        self.assertEqual(set(d for d, _ in self.file_cacher.list()),
+                         set(digests[1:]))
+
+    def test_check_backend_integrity_checkpoint(self):
+        """Interrupt an integrity check and check that it resumes from
+        the checkpoint.
+
+        """
+        checkpoint_path = os.path.join(self.file_cacher.temp_dir, "ckpt")
+        digests = [self.file_cacher.put_file_content(os.urandom(100))
+                   for _ in range(5)]
+        self.corrupt(digests[0])
+        with open(checkpoint_path, "wt", encoding="utf-8") as f:
+            f.write("%s %s\n" % (digests[1], digests[1]))
+            f.write("%s %s\n" % (digests[0], "wrong"))
+
+        with patch("cms.db.filecacher._compute_backend_digest",
+                   wraps=_compute_backend_digest) as compute:
+            self.assertFalse(self.file_cacher.check_backend_integrity(
+                workers=1, checkpoint_path=checkpoint_path))
+        self.assertCountEqual([c[0][1] for c in compute.call_args_list],
+                              digests[2:])
+        with open(checkpoint_path, "rt", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+    def test_check_backend_integrity_checkpoint_truncated(self):
+        """Resume from a checkpoint whose last line was cut off, and
+        delete the corrupted files it lists.
+
+        """
+        checkpoint_path = os.path.join(self.file_cacher.temp_dir, "ckpt")
+        digests = [self.file_cacher.put_file_content(os.urandom(100))
+                   for _ in range(3)]
+        self.corrupt(digests[0])
+        with open(checkpoint_path, "wt", encoding="utf-8") as f:
+            f.write("%s %s\n" % (digests[0], "wrong"))
+            f.write("%s %s" % (digests[1], digests[1][:10]))
+
+        with patch("cms.db.filecacher._compute_backend_digest",
+                   wraps=_compute_backend_digest) as compute:
+            self.assertFalse(self.file_cacher.check_backend_integrity(
+                delete=True, workers=1, checkpoint_path=checkpoint_path))
+        self.assertCountEqual([c[0][1] for c in compute.call_args_list],
+                              digests[1:])
+        self.assertCountEqual([d for d, _ in self.file_cacher.list()],
+                              digests[1:])
+        with open(checkpoint_path, "rt", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        self.assertCountEqual(lines[2:], ["%s %s" % (d, d)
+                                          for d in digests[1:]] + [""])
+
+
+class TestFileCacherObjectStore(TestFileCacherBase, unittest.TestCase):
+    """Tests for the FileCacher service with an object store backend."""
+
+    # Tell pytest to collect this class as test
+    __test__ = True
+
+    def setUp(self):
+        self.server = ObjectStoreServer(max_keys=2)
+        with patch.object(config, "file_store", self.server.url + "/cms"):
+            file_cacher = FileCacher()
+        self.assertIsInstance(file_cacher.backend, ObjectStoreBackend)
+        super().setUp(file_cacher)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_list_and_describe(self):
+        """Store a few files and check that the (paginated) listing
+        returns all of them, and only them.
+
+        """
+        self.server.objects["other"] = (b"not ours", {})
+        digests = set(self.file_cacher.put_file_content(os.urandom(10),
+                                                        "Test #%d" % i)
+                      for i in range(5))
+        self.assertEqual(set(d for d, _ in self.file_cacher.list()),
+                         digests)
+        for digest in digests:
+            self.assertTrue(
+                self.file_cacher.describe(digest).startswith("Test #"))
+
+    def test_multipart_and_range(self):
+        """Store a file bigger than a part and read it from the
+        middle.
+
+        """
+        content = os.urandom(ObjectStoreBackend.PART_SIZE * 2 + 100)
+        digest = self.file_cacher.put_file_content(content)
+        uploaded_parts = [params["partNumber"]
+                          for method, _, params in self.server.requests
+                          if method == "PUT" and "partNumber" in params]
+        self.assertCountEqual(uploaded_parts, ["1", "2", "3"])
+
+        with self.file_cacher.backend.get_file(digest) as fobj:
+            fobj.seek(-200, os.SEEK_END)
+            self.assertEqual(fobj.read(), content[-200:])
+            fobj.seek(10)
+            self.assertEqual(fobj.read(10), content[10:20])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -19,6 +19,7 @@
 """Tests for the GroupMin score type."""
 
 import unittest
+from unittest.mock import patch
 
 from cms.grading.scoretypes.GroupMin import GroupMin
 from cmstestsuite.unit_tests.grading.scoretypes.scoretypetestutils \
@@ -157,6 +158,26 @@ class TestGroupMin(ScoreTypeTestMixin, unittest.TestCase):
         self.assertComputeScore(gmin.compute_score(sr),
                                 s2 + s3 * 0.1, 0.0, [0, s2, s3 * 0.1])
 
+    def test_targets_computed_once(self):
+        parameters = [[40, "1_*"], [60, "[23]_*"]]
+        with patch.object(GroupMin, "retrieve_target_testcases",
+                          autospec=True,
+                          side_effect=GroupMin.retrieve_target_testcases) \
+                as retrieve:
+            gmin = GroupMin(parameters, self._public_testcases)
+            sr = self.get_submission_result(self._public_testcases)
+            for _ in range(3):
+                self.assertComputeScore(gmin.compute_score(sr),
+                                        100, 40, [40, 60])
+        retrieve.assert_called_once()
+
+    def test_compute_score_missing_evaluation(self):
+        gmin = GroupMin([[40, 2], [60, 4]], self._public_testcases)
+        sr = self.get_submission_result(self._public_testcases)
+        sr.evaluations = sr.evaluations[1:]
+        with self.assertRaises(KeyError):
+            gmin.compute_score(sr)
+
 
 if __name__ == "__main__":
     unittest.main()
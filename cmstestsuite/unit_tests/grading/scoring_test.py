@@ -26,7 +26,9 @@ from datetime import timedelta
 # Needs to be first to allow for monkey patching the DB connection string.
 from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
 
-from cms.grading.scoring import task_score
+from cms.db import Session, Submission, TaskScore
+from cms.grading.scoring import task_score, update_task_scores, \
+    invalidate_task_scores, get_task_score, get_task_scores
 from cmscommon.constants import \
     SCORE_MODE_MAX, SCORE_MODE_MAX_SUBTASK, SCORE_MODE_MAX_TOKENED_LAST
 from cmscommon.datetime import make_datetime
@@ -382,5 +384,116 @@ class TestTaskScoreMax(TaskScoreMixin, unittest.TestCase):
         self.assertEqual(self.call(rounded=True), (44.44, False))
 
 
+class TestStoredTaskScores(TaskScoreMixin, unittest.TestCase):
+    """Tests for the functions handling TaskScore."""
+
+    def setUp(self):
+        super().setUp()
+        self.task.score_mode = SCORE_MODE_MAX
+
+    def stored(self):
+        return self.session.query(TaskScore).all()
+
+    def test_update(self):
+        self.add_result(self.at(1), 44.4, tokened=True, public_score=4.4)
+        self.add_result(self.at(2), 66.6, tokened=False, public_score=6.6)
+        self.add_result(self.at(3), None)
+        self.session.flush()
+
+        self.assertEqual(update_task_scores(self.session, self.task), 1)
+        stored, = self.stored()
+        self.assertIs(stored.participation, self.participation)
+        self.assertEqual(stored.get_score(), (66.6, True))
+        self.assertEqual(stored.get_score(public=True), (6.6, True))
+        self.assertEqual(stored.get_score(only_tokened=True), (44.4, True))
+
+    def test_update_no_submissions(self):
+        self.add_result(self.at(1), 44.4)
+        self.session.flush()
+        update_task_scores(self.session, self.task)
+        for submission in self.participation.submissions:
+            submission.official = False
+        self.session.flush()
+
+        update_task_scores(self.session, self.task,
+                           [self.participation.id])
+        self.assertEqual(self.stored(), [])
+
+    def test_get_stored(self):
+        self.add_result(self.at(1), 44.444)
+        self.session.flush()
+        update_task_scores(self.session, self.task)
+        # Make sure the stored score is used.
+        self.stored()[0].score = 55.555
+        self.session.flush()
+
+        self.assertEqual(
+            get_task_score(self.session, self.participation, self.task,
+                           rounded=True),
+            (55.56, False))
+        self.assertEqual(
+            get_task_scores(self.session, self.participation.contest),
+            {(self.participation.id, self.task.id): (55.555, False)})
+
+    def test_get_missing(self):
+        self.add_result(self.at(1), 44.444)
+        other = self.add_participation(contest=self.participation.contest)
+        self.session.flush()
+
+        self.assertEqual(
+            get_task_score(self.session, self.participation, self.task),
+            (44.444, False))
+        self.assertEqual(
+            get_task_scores(self.session, self.participation.contest,
+                            rounded=True),
+            {(self.participation.id, self.task.id): (44.44, False),
+             (other.id, self.task.id): (0.0, False)})
+
+    def test_get_missing_unofficial(self):
+        # Unofficial submissions don't count, so neither do the scores
+        # of participations having only those.
+        self.add_result(self.at(1), 44.4)
+        self.participation.submissions[0].official = False
+        self.session.flush()
+
+        self.assertEqual(
+            get_task_scores(self.session, self.participation.contest),
+            {(self.participation.id, self.task.id): (0.0, False)})
+
+    def test_invalidate(self):
+        self.add_result(self.at(1), 44.4)
+        self.session.flush()
+        update_task_scores(self.session, self.task)
+
+        invalidate_task_scores(self.session,
+                               participation_id=self.participation.id + 1)
+        self.assertEqual(len(self.stored()), 1)
+        invalidate_task_scores(self.session,
+                               contest_id=self.participation.contest_id)
+        self.assertEqual(self.stored(), [])
+
+    def test_update_after_concurrent_change(self):
+        self.add_result(self.at(1), 44.4)
+        self.add_result(self.at(2), 66.6)
+        self.session.commit()
+        self.addCleanup(self.delete_data)
+        # The submissions are loaded before the change.
+        self.participation.submissions
+
+        # Another transaction makes the best submission unofficial.
+        other_session = Session()
+        submission = other_session.query(Submission)\
+            .filter(Submission.participation_id == self.participation.id)\
+            .filter(Submission.timestamp == self.at(2))\
+            .one()
+        submission.official = False
+        invalidate_task_scores(other_session, submission_id=submission.id)
+        other_session.commit()
+        other_session.close()
+
+        update_task_scores(self.session, self.task)
+        self.assertEqual(self.stored()[0].get_score(), (44.4, False))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -96,6 +96,11 @@ class FakeIsolateSandbox(IsolateSandbox):
             return BytesIO(self._fake_files[path])
         raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
 
+    def get_file_mmap(self, path):
+        if path in self._fake_files:
+            return BytesIO(self._fake_files[path])
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
     def get_file_text(self, path, trunc_len=None):
         assert trunc_len is None  # other case not handled by fake
         if path in self._fake_files:
@@ -18,9 +18,11 @@
 
 """Tests for whitediff.py."""
 
+import tempfile
 import unittest
 from io import BytesIO
 
+from cms.db.filecacher import map_file
 from cms.grading.steps import _WHITES, _white_diff
 
 
@@ -67,6 +69,19 @@ class TestWhiteDiff(unittest.TestCase):
         self.assertFalse(self._diff("1 2", "1\n2"))
         self.assertFalse(self._diff("1\n\n2", "1\n2"))
 
+    def test_memory_maps(self):
+        def map_string(s):
+            with tempfile.TemporaryFile() as f:
+                f.write(s.encode("utf-8"))
+                f.flush()
+                return map_file(f)
+
+        for s1, s2, same in [("1 asd\n\n\n", "   1\tasd  \n", True),
+                             ("", "\n \n", True),
+                             ("1 2", "1\n2", False)]:
+            with map_string(s1) as m1, map_string(s2) as m2:
+                self.assertEqual(_white_diff(m1, m2), same)
+
 
 if __name__ == "__main__":
     unittest.main()
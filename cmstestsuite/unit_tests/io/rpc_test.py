@@ -32,11 +32,15 @@ import gevent.socket
 from gevent.server import StreamServer
 
 from cms import Address, ServiceCoord
-from cms.io import RPCError, rpc_method, RemoteServiceServer, \
-    RemoteServiceClient
+from cms.io import RPCError, rpc_method, rpc_batch_method, \
+    RemoteServiceServer, RemoteServiceClient
+from cms.io.rpcstats import RPCStats
 
 
 class MockService:
+    def __init__(self):
+        self.batches = list()
+
     def not_rpc_callable(self):
         pass
 
@@ -62,6 +66,15 @@ class MockService:
         event = gevent.event.Event()
         event.wait()
 
+    @rpc_method
+    def double(self, value):
+        return 2 * value
+
+    @rpc_batch_method("double")
+    def double_batch(self, calls):
+        self.batches.append(calls)
+        return [2 * call["value"] for call in calls]
+
 
 class TestRPC(unittest.TestCase):
 
@@ -71,6 +84,7 @@ class TestRPC(unittest.TestCase):
         self.addCleanup(patcher.stop)
 
         self.service = MockService()
+        self.stats = RPCStats()
         self.servers = list()
         self.clients = list()
         self.spawn_listener()
@@ -115,7 +129,7 @@ class TestRPC(unittest.TestCase):
         address (tuple): the (ip address, port) of the remote part
 
         """
-        server = RemoteServiceServer(self.service, address)
+        server = RemoteServiceServer(self.service, address, self.stats)
         self.servers.append(server)
         server.handle(socket_)
 
@@ -429,6 +443,177 @@ class TestRPC(unittest.TestCase):
         self.assertFalse(self.servers[0].connected)
         sock.close()
 
+    def test_negotiate_framed(self):
+        client = self.get_client(ServiceCoord("Foo", 0))
+        result = client.echo(value=42)
+        result.wait()
+        self.assertEqual(result.value, 42)
+        self.assertEqual(client._protocol, client.PROTOCOL_FRAMED)
+        self.assertEqual(self.servers[0]._protocol, client.PROTOCOL_FRAMED)
+
+    def test_negotiate_old_server(self):
+        # A server not knowing about negotiation treats the request as
+        # a call to a non-existent method; the client stays with JSON.
+        with patch.object(RemoteServiceServer, "SUPPORTED_PROTOCOLS", ()):
+            client = self.get_client(ServiceCoord("Foo", 0))
+            result = client.echo(value=42)
+            result.wait()
+        self.assertEqual(result.value, 42)
+        self.assertEqual(client._protocol, client.PROTOCOL_JSON)
+        self.assertEqual(self.servers[0]._protocol, client.PROTOCOL_JSON)
+
+    def test_negotiate_old_client(self):
+        with patch.object(RemoteServiceClient, "SUPPORTED_PROTOCOLS", ()):
+            client = self.get_client(ServiceCoord("Foo", 0))
+            result = client.echo(value=42)
+            result.wait()
+        self.assertEqual(result.value, 42)
+        self.assertEqual(client._protocol, client.PROTOCOL_JSON)
+        self.assertEqual(self.servers[0]._protocol, client.PROTOCOL_JSON)
+
+    def test_framed_large_message(self):
+        # Frames are not subject to MAX_MESSAGE_SIZE and are sent in
+        # several chunks.
+        value = "x" * (3 * RemoteServiceClient.MAX_MESSAGE_SIZE + 1)
+        client = self.get_client(ServiceCoord("Foo", 0))
+        result = client.echo(value=value)
+        result.wait()
+        self.assertTrue(result.successful())
+        self.assertEqual(result.value, value)
+
+    def test_framed_too_large_message(self):
+        value = "x" * 1000
+        with patch.object(RemoteServiceClient, "MAX_FRAME_SIZE", 100):
+            client = self.get_client(ServiceCoord("Foo", 0))
+            client.echo(value="").wait()
+            result = client.echo(value=value)
+            result.wait()
+        self.assertFalse(result.successful())
+        self.assertIsInstance(result.exception, RPCError)
+
+    def test_send_too_large_frame(self):
+        # The length is checked before reading the frame.
+        client = self.get_client(ServiceCoord("Foo", 0))
+        client.echo(value=42).wait()
+        server = self.servers[0]
+        client._writer.write(
+            client.FRAME_HEADER.pack(server.MAX_FRAME_SIZE + 1))
+        client._writer.flush()
+        self.sleep()
+        self.assertFalse(server.connected)
+
+    def test_json_large_message(self):
+        value = "x" * RemoteServiceClient.MAX_MESSAGE_SIZE
+        with patch.object(RemoteServiceClient, "SUPPORTED_PROTOCOLS", ()):
+            client = self.get_client(ServiceCoord("Foo", 0))
+            result = client.echo(value=value)
+            result.wait()
+        self.assertFalse(result.successful())
+        self.assertIsInstance(result.exception, RPCError)
+
+    def test_batch(self):
+        client = self.get_client(ServiceCoord("Foo", 0))
+        results = [client.double(value=i, batch=True) for i in range(5)]
+        results.append(client.echo(value="x", batch=True))
+        results.append(client.not_existent(batch=True))
+        results.append(client.double(value=10, batch=True))
+        # Nothing is sent before the end of the window.
+        self.assertFalse(any(result.ready() for result in results))
+        gevent.wait(results)
+        self.assertEqual([result.value for result in results[:6]],
+                         [0, 2, 4, 6, 8, "x"])
+        self.assertIsInstance(results[6].exception, RPCError)
+        self.assertEqual(results[7].value, 20)
+        # The run of five calls went to the batch handler, the last
+        # one was executed on its own.
+        self.assertEqual(self.service.batches,
+                         [[{"value": i} for i in range(5)]])
+
+    def test_batch_max_size(self):
+        client = self.get_client(ServiceCoord("Foo", 0))
+        with patch.object(RemoteServiceClient, "BATCH_WINDOW", 10):
+            results = [client.double(value=i, batch=True)
+                       for i in range(RemoteServiceClient.MAX_BATCH_SIZE)]
+            gevent.wait(results)
+        self.assertEqual(results[-1].value,
+                         2 * (RemoteServiceClient.MAX_BATCH_SIZE - 1))
+        self.assertEqual(len(self.service.batches), 1)
+
+    def test_batch_unencodable(self):
+        client = self.get_client(ServiceCoord("Foo", 0))
+        result1 = client.double(value=1, batch=True)
+        result2 = client.echo(value=RuntimeError(), batch=True)
+        gevent.wait([result1, result2])
+        self.assertEqual(result1.value, 2)
+        self.assertIsInstance(result2.exception, RPCError)
+
+    def test_batch_short_reply(self):
+        # Calls left without a result by the reply fail.
+        execute_batch = RemoteServiceServer.execute_batch
+        with patch.object(RemoteServiceServer, "execute_batch",
+                          lambda self, calls:
+                              execute_batch(self, calls)[:-1]):
+            client = self.get_client(ServiceCoord("Foo", 0))
+            results = [client.double(value=i, batch=True) for i in range(3)]
+            gevent.wait(results)
+        self.assertEqual([result.value for result in results[:2]], [0, 2])
+        self.assertIsInstance(results[2].exception, RPCError)
+
+    def test_batch_old_server(self):
+        # Servers without the framed protocol may not know batches, so
+        # the calls are sent one by one.
+        with patch.object(RemoteServiceServer, "SUPPORTED_PROTOCOLS", ()):
+            client = self.get_client(ServiceCoord("Foo", 0))
+            results = [client.double(value=i, batch=True) for i in range(3)]
+            gevent.wait(results)
+        self.assertEqual([result.value for result in results], [0, 2, 4])
+        self.assertEqual(self.service.batches, [])
+
+    def test_stats(self):
+        client = self.get_client(ServiceCoord("Foo", 0))
+        client.echo(value="x").wait()
+        client.raise_exception().wait()
+        results = [client.double(value=i, batch=True) for i in range(3)]
+        gevent.wait(results)
+
+        echo = self.stats.methods["echo"]
+        self.assertEqual((echo.calls, echo.errors), (1, 0))
+        self.assertGreater(echo.bytes_in, 0)
+        self.assertGreater(echo.bytes_out, 0)
+        self.assertEqual(self.stats.methods["raise_exception"].errors, 1)
+        # Calls in a batch are accounted on their own, with a share of
+        # the traffic of the batch request, which isn't accounted.
+        double = self.stats.methods["double"]
+        self.assertEqual(double.calls, 3)
+        self.assertGreater(double.bytes_in, 0)
+        self.assertGreater(double.bytes_out, 0)
+        self.assertNotIn(RemoteServiceServer.BATCH_METHOD,
+                         self.stats.methods)
+
+        client_echo = client.stats.methods["echo"]
+        self.assertEqual(client_echo.calls, 1)
+        self.assertEqual(client_echo.bytes_in, echo.bytes_out)
+        self.assertEqual(client_echo.bytes_out, echo.bytes_in)
+        self.assertNotIn("double", client.stats.methods)
+
+    def test_stats_disconnection(self):
+        client = self.get_client(ServiceCoord("Foo", 0))
+        result = client.infinite()
+        self.sleep()
+        self.disconnect_servers()
+        result.wait()
+        self.assertEqual(client.stats.methods["infinite"].errors, 1)
+
+    def test_send_truncated_frame(self):
+        client = self.get_client(ServiceCoord("Foo", 0))
+        client.echo(value=42).wait()
+        server = self.servers[0]
+        client._writer.write(client.FRAME_HEADER.pack(100) + b"{}")
+        client._writer.flush()
+        client._socket.shutdown(socket.SHUT_WR)
+        self.sleep()
+        self.assertFalse(server.connected)
+
 
 if __name__ == "__main__":
     unittest.main()
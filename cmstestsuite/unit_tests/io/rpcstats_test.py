@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the RPC statistics.
+
+"""
+
+import json
+import unittest
+from unittest.mock import patch
+
+from cms.io.rpcstats import Histogram, RPCStats
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_empty(self):
+        histogram = Histogram()
+        self.assertIsNone(histogram.percentile(0.5))
+        self.assertEqual(sum(histogram.export()["counts"]), 0)
+
+    def test_buckets(self):
+        histogram = Histogram()
+        histogram.add(0.00005)
+        histogram.add(0.0001)
+        histogram.add(0.00015)
+        histogram.add(1000)
+        self.assertEqual(histogram.counts[0], 2)
+        self.assertEqual(histogram.counts[1], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.max, 1000)
+        self.assertAlmostEqual(histogram.total, 1000.0003)
+
+    def test_percentile(self):
+        histogram = Histogram()
+        for _ in range(99):
+            histogram.add(0.003)
+        histogram.add(0.5)
+        self.assertEqual(histogram.percentile(0.5), 0.0032)
+        self.assertEqual(histogram.percentile(0.99), 0.0032)
+        # The last bucket is capped by the maximum.
+        self.assertEqual(histogram.percentile(1), 0.5)
+
+
+class TestRPCStats(unittest.TestCase):
+
+    def test_record(self):
+        stats = RPCStats()
+        stats.record("echo", 0.001, bytes_in=10, bytes_out=20)
+        stats.record("echo", 0.002, error=True, bytes_in=5)
+        echo = stats.methods["echo"]
+        self.assertEqual(echo.calls, 2)
+        self.assertEqual(echo.errors, 1)
+        self.assertEqual(echo.bytes_in, 15)
+        self.assertEqual(echo.bytes_out, 20)
+        self.assertEqual(sum(echo.durations.counts), 2)
+
+    def test_add_bytes(self):
+        stats = RPCStats()
+        stats.record("echo", 0.001, bytes_in=10)
+        stats.add_bytes("echo", bytes_in=5, bytes_out=7)
+        echo = stats.methods["echo"]
+        self.assertEqual((echo.calls, echo.bytes_in, echo.bytes_out),
+                         (1, 15, 7))
+
+    @patch.object(RPCStats, "MAX_METHODS", 2)
+    def test_bounded(self):
+        stats = RPCStats()
+        for method in ["a", "b", "c", "d", "a"]:
+            stats.record(method, 0.001)
+        self.assertEqual(set(stats.methods),
+                         {"a", "b", RPCStats.OTHER_METHODS})
+        self.assertEqual(stats.methods["a"].calls, 2)
+        self.assertEqual(stats.methods[RPCStats.OTHER_METHODS].calls, 2)
+
+    def test_export(self):
+        stats = RPCStats()
+        stats.record("echo", 0.001)
+        exported = json.loads(json.dumps(stats.export()))
+        self.assertEqual(exported["methods"]["echo"]["calls"], 1)
+        self.assertEqual(exported["methods"]["echo"]["durations"]["p50"],
+                         0.001)
+
+
+if __name__ == "__main__":
+    unittest.main()
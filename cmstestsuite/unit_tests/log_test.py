@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the logging utilities.
+
+"""
+
+import logging
+import unittest
+from unittest.mock import Mock, patch
+
+import gevent
+import gevent.event
+
+from cms.log import LogServiceHandler, RateLimitFilter, ServiceFilter
+
+
+def successful_result(*unused_args, **unused_kwargs):
+    result = gevent.event.AsyncResult()
+    result.set(None)
+    return result
+
+
+class TestLogServiceHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.log_service = Mock()
+        self.log_service.connected = True
+        self.log_service.LogBatch.side_effect = successful_result
+        self.handler = LogServiceHandler(self.log_service)
+        self.handler.addFilter(ServiceFilter("Foo", 0))
+        self.logger = logging.getLogger("cms.log_test")
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def shipped(self):
+        return [record
+                for call in self.log_service.LogBatch.call_args_list
+                for record in call[1]["records"]]
+
+    def test_batching(self):
+        for i in range(5):
+            self.logger.info("Message %d.", i)
+        # Nothing is sent synchronously.
+        self.log_service.LogBatch.assert_not_called()
+        gevent.sleep(2 * LogServiceHandler.SHIP_INTERVAL)
+        self.log_service.LogBatch.assert_called_once()
+        records = self.shipped()
+        self.assertEqual([record["msg"] for record in records],
+                         ["Message %d." % i for i in range(5)])
+        self.assertIsNone(records[0]["args"])
+        self.assertEqual(records[0]["service_name"], "Foo")
+
+    @patch.object(LogServiceHandler, "BATCH_SIZE", 2)
+    def test_batch_size(self):
+        for i in range(5):
+            self.logger.info("Message %d.", i)
+        gevent.sleep(2 * LogServiceHandler.SHIP_INTERVAL)
+        self.assertEqual(self.log_service.LogBatch.call_count, 3)
+        self.assertEqual(len(self.shipped()), 5)
+
+    def test_exception(self):
+        try:
+            raise ValueError("Foo")
+        except ValueError:
+            self.logger.error("Failed.", exc_info=True)
+        self.handler.flush()
+        record, = self.shipped()
+        self.assertIsNone(record["exc_info"])
+        self.assertIn("ValueError", record["exc_text"])
+
+    @patch.object(LogServiceHandler, "MAX_QUEUE_SIZE", 3)
+    def test_full_buffer(self):
+        for i in range(5):
+            self.logger.info("Message %d.", i)
+        self.logger.warning("Warning.")
+        for i in range(5):
+            self.logger.error("Error %d.", i)
+        self.assertEqual(self.handler.dropped, 2 + 3)
+        self.handler.flush()
+        messages = [record["msg"] for record in self.shipped()]
+        self.assertEqual(messages[:6], [
+            "Message 0.", "Message 1.", "Message 2.", "Warning.",
+            "Error 0.", "Error 1."])
+        self.assertIn("5 log records were dropped", messages[6])
+        self.assertEqual(self.shipped()[6]["service_name"], "Foo")
+
+    def test_unencodable_batch(self):
+        result = gevent.event.AsyncResult()
+        result.set_exception(RuntimeError("JSON encoding failed."))
+        self.log_service.LogBatch.side_effect = None
+        self.log_service.LogBatch.return_value = result
+        self.logger.info("Message 1.")
+        self.logger.info("Message 2.")
+        self.handler.flush()
+        self.assertEqual(self.log_service.Log.call_count, 2)
+
+    def test_disconnected(self):
+        result = gevent.event.AsyncResult()
+        result.set_exception(RuntimeError("Write failed."))
+        self.log_service.connected = False
+        self.log_service.LogBatch.side_effect = None
+        self.log_service.LogBatch.return_value = result
+        self.logger.info("Message 1.")
+        self.handler.flush()
+        self.log_service.Log.assert_not_called()
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestRateLimitFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.logger = logging.getLogger("cms.log_test.rate_limit")
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def limit(self, **kwargs):
+        filter_ = RateLimitFilter(self.logger, **kwargs)
+        self.logger.addFilter(filter_)
+        self.addCleanup(self.logger.removeFilter, filter_)
+        return filter_
+
+    def test_rate(self):
+        self.limit(rate=2, period=0.1)
+        for i in range(5):
+            self.logger.info("Message %d.", i)
+        self.logger.info("Other call site.")
+        self.assertEqual(self.handler.messages,
+                         ["Message 0.", "Message 1.", "Other call site."])
+        # The summary arrives at the end of the period, and then
+        # records are let through again.
+        gevent.sleep(0.15)
+        self.assertEqual(self.handler.messages[3:], [
+            "3 similar messages suppressed, last one: Message 4."])
+        self.logger.info("Message %d.", 5)
+        self.assertEqual(self.handler.messages[-1], "Message 5.")
+
+    def test_sample(self):
+        filter_ = self.limit(sample=3)
+        for i in range(7):
+            self.logger.info("Message %d.", i)
+        self.assertEqual(self.handler.messages,
+                         ["Message 0.", "Message 3.", "Message 6."])
+        filter_.flush()
+        self.assertEqual(self.handler.messages[3:], [
+            "4 similar messages suppressed, last one: Message 5."])
+
+    def test_warnings_not_limited(self):
+        self.limit(rate=1, sample=2)
+        for i in range(3):
+            self.logger.warning("Message %d.", i)
+        self.assertEqual(len(self.handler.messages), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the contest cache of CWS.
+
+"""
+
+import unittest
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.db import Session
+from cms.server.contest.cache import ContestCache
+
+
+class TestContestCache(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contest = self.add_contest(description="old")
+        self.task = self.add_task(contest=self.contest)
+        self.task.active_dataset = self.add_dataset(task=self.task)
+        self.add_statement(task=self.task, language="en")
+        self.session.commit()
+        self.cache = ContestCache()
+
+    def tearDown(self):
+        self.delete_data()
+        super().tearDown()
+
+    def get(self, **kwargs):
+        session = Session()
+        try:
+            contest = self.cache.get(session, **kwargs)
+            if contest is None:
+                return None
+            return (contest.description,
+                    [(task.name, task.active_dataset.description,
+                      sorted(task.statements))
+                     for task in contest.tasks])
+        finally:
+            session.close()
+
+    def test_get(self):
+        expected = ("old", [(self.task.name,
+                             self.task.active_dataset.description,
+                             ["en"])])
+        self.assertEqual(self.get(contest_id=self.contest.id), expected)
+        self.assertEqual(self.get(name=self.contest.name), expected)
+
+    def test_missing(self):
+        self.assertIsNone(self.get(contest_id=self.contest.id + 1))
+        self.assertIsNone(self.get(name=self.contest.name + "x"))
+
+    def test_invalidate(self):
+        self.get(contest_id=self.contest.id)
+        self.contest.description = "new"
+        self.session.commit()
+        self.assertEqual(self.get(name=self.contest.name)[0], "old")
+        self.cache.invalidate()
+        self.assertEqual(self.get(name=self.contest.name)[0], "new")
+
+    def test_expired(self):
+        self.get(contest_id=self.contest.id)
+        self.contest.description = "new"
+        self.session.commit()
+        self.cache.TTL = -1.0
+        self.assertEqual(self.get(contest_id=self.contest.id)[0], "new")
+
+
+if __name__ == "__main__":
+    unittest.main()
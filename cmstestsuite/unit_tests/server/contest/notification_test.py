@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the notification watcher.
+
+"""
+
+import unittest
+
+import gevent
+
+from cms.server.contest.notification import NotificationWatcher
+
+
+class TestNotificationWatcher(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.watcher = NotificationWatcher()
+
+    def wait(self, keys, timeout=0.1):
+        with self.watcher.watch(keys) as wait:
+            return wait(timeout)
+
+    def test_notify(self):
+        waiters = [gevent.spawn(self.wait, keys)
+                   for keys in [["c"], ["c", "u1"], ["u1"], ["u2"]]]
+        gevent.sleep(0)
+        self.watcher.notify("c")
+        self.watcher.notify("u1")
+        gevent.joinall(waiters)
+        self.assertEqual([waiter.value for waiter in waiters],
+                         [True, True, True, False])
+
+    def test_notify_before_waiting(self):
+        with self.watcher.watch(["c"]) as wait:
+            self.watcher.notify("c")
+            self.assertTrue(wait(0))
+        # A later notification is needed to wake up later requests.
+        self.assertFalse(self.wait(["c"], 0))
+
+    def test_cleanup(self):
+        with self.watcher.watch(["c", "u1"]):
+            with self.watcher.watch(["c"]):
+                self.watcher.notify("u1")
+            self.assertEqual(list(self.watcher._waiting), ["c"])
+        self.assertEqual(self.watcher._waiting, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -16,8 +16,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import io
 import random
+import tempfile
 import unittest
 from unittest.mock import Mock
 
@@ -26,7 +26,7 @@ from werkzeug.test import Client, EnvironBuilder
 from werkzeug.wrappers import Response
 from werkzeug.wsgi import responder
 
-from cms.db.filecacher import TombstoneError
+from cms.db.filecacher import TombstoneError, map_file
 from cms.server.file_middleware import FileServerMiddleware
 from cmscommon.digest import bytes_digest
 
@@ -43,9 +43,8 @@ class TestFileByDigestMiddleware(unittest.TestCase):
         self.mimetype = "image/jpeg"
 
         self.file_cacher = Mock()
-        self.file_cacher.get_file = Mock(
-            side_effect=lambda digest: io.BytesIO(self.content))
-        self.file_cacher.get_size = Mock(return_value=len(self.content))
+        self.file_cacher.get_file_mmap = Mock(
+            side_effect=lambda digest: self.map_content())
 
         self.serve_file = True
         self.provide_filename = True
@@ -55,6 +54,12 @@ class TestFileByDigestMiddleware(unittest.TestCase):
         self.environ_builder = EnvironBuilder("/some/url")
         self.client = Client(self.wsgi_app, Response)
 
+    def map_content(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(self.content)
+            f.flush()
+            return map_file(f)
+
     @responder
     def wrapped_wsgi_app(self, environ, start_response):
         self.assertEqual(environ, self.environ)
@@ -88,7 +93,7 @@ class TestFileByDigestMiddleware(unittest.TestCase):
         self.assertFalse(response.cache_control.public)
         self.assertEqual(response.get_data(), self.content)
 
-        self.file_cacher.get_file.assert_called_once_with(self.digest)
+        self.file_cacher.get_file_mmap.assert_called_once_with(self.digest)
 
     def test_not_a_file(self):
         self.serve_file = False
@@ -107,20 +112,20 @@ class TestFileByDigestMiddleware(unittest.TestCase):
         self.assertNotIn("content-disposition", response.headers)
 
     def test_not_found(self):
-        self.file_cacher.get_file.side_effect = KeyError()
+        self.file_cacher.get_file_mmap.side_effect = KeyError()
 
         response = self.request()
 
         self.assertEqual(response.status_code, 404)
-        self.file_cacher.get_file.assert_called_once_with(self.digest)
+        self.file_cacher.get_file_mmap.assert_called_once_with(self.digest)
 
     def test_tombstone(self):
-        self.file_cacher.get_file.side_effect = TombstoneError()
+        self.file_cacher.get_file_mmap.side_effect = TombstoneError()
 
         response = self.request()
 
         self.assertEqual(response.status_code, 503)
-        self.file_cacher.get_file.assert_called_once_with(self.digest)
+        self.file_cacher.get_file_mmap.assert_called_once_with(self.digest)
 
     def test_conditional_request(self):
         # Test an etag that matches.
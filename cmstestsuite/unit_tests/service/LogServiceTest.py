@@ -75,6 +75,17 @@ class TestLogService(unittest.TestCase):
         else:
             self.assertNotEqual(last_message["severity"], severity)
 
+    def test_log_batch(self):
+        self.service.LogBatch(records=[
+            {"msg": TestLogService.MSG + str(i),
+             "levelname": "ERROR",
+             "levelno": logging.ERROR,
+             "created": TestLogService.CREATED}
+            for i in range(3)])
+        self.assertEqual(
+            [message["message"] for message in self.service.last_messages()],
+            [TestLogService.MSG + str(i) for i in range(3)])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -50,7 +50,8 @@ class TestScoringService(DatabaseMixin, unittest.TestCase):
 
         patcher = patch("cms.db.Dataset.score_type_object",
                         new_callable=PropertyMock)
-        self.score_type = patcher.start().return_value
+        self.score_type_object = patcher.start()
+        self.score_type = self.score_type_object.return_value
         self.addCleanup(patcher.stop)
         self.call_args = list()
         self.score_type.compute_score.side_effect = self.compute_score
@@ -61,9 +62,11 @@ class TestScoringService(DatabaseMixin, unittest.TestCase):
         self.call_args.append((sr.submission_id, sr.dataset_id))
         return self.score_info
 
-    def new_sr_to_score(self):
-        task = self.add_task(contest=self.contest)
-        dataset = self.add_dataset(task=task)
+    def new_sr_to_score(self, dataset=None):
+        if dataset is None:
+            task = self.add_task(contest=self.contest)
+            dataset = self.add_dataset(task=task)
+        task = dataset.task
         submission = self.add_submission(task=task)
         result = self.add_submission_result(
             compilation_outcome="ok", evaluation_outcome="ok",
@@ -121,6 +124,54 @@ class TestScoringService(DatabaseMixin, unittest.TestCase):
                               [(sr_a.submission_id, sr_a.dataset_id),
                                (sr_b.submission_id, sr_b.dataset_id)])
 
+    def test_new_evaluation_batch(self):
+        """Many results of a dataset are scored with one score type.
+
+        """
+        sr = self.new_sr_to_score()
+        srs = [sr] + [self.new_sr_to_score(dataset=sr.dataset)
+                      for _ in range(4)]
+        self.session.commit()
+
+        service = ScoringService(0)
+        for sr in srs:
+            service.new_evaluation(sr.submission_id, sr.dataset_id)
+        # A missing result doesn't prevent scoring the others.
+        service.new_evaluation(unique_long_id(), srs[0].dataset_id)
+
+        gevent.sleep(0.1)  # Needed to trigger the score loop.
+
+        self.assertCountEqual(self.call_args,
+                              [(sr.submission_id, sr.dataset_id)
+                               for sr in srs])
+        self.assertEqual(self.score_type_object.call_count, 1)
+        for sr in srs:
+            self.session.expire(sr)
+            self.assertEqual(sr.score, self.score_info[0])
+
+    def test_new_evaluation_bad_score_type(self):
+        """A score type that cannot be instantiated doesn't prevent
+        scoring the results of other datasets.
+
+        """
+        sr_a = self.new_sr_to_score()
+        sr_b = self.new_sr_to_score()
+        self.session.commit()
+        self.score_type_object.side_effect = [ValueError("bad"),
+                                              self.score_type]
+
+        service = ScoringService(0)
+        service.new_evaluation(sr_a.submission_id, sr_a.dataset_id)
+        service.new_evaluation(sr_b.submission_id, sr_b.dataset_id)
+
+        gevent.sleep(0.1)  # Needed to trigger the score loop.
+
+        # The first dataset scored fails, the other one is scored.
+        self.assertEqual(len(self.call_args), 1)
+        self.assertIn(self.call_args[0],
+                      [(sr_a.submission_id, sr_a.dataset_id),
+                       (sr_b.submission_id, sr_b.dataset_id)])
+
     def test_new_evaluation_already_scored(self):
         """One submission is not re-scored if already scored.
 
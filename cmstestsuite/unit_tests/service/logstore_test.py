@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the indexed log store.
+
+"""
+
+import logging
+import os
+import unittest
+
+import gevent
+
+from cms.service.logstore import LogStore, get_record_keys, query_logs, \
+    service_key, submission_key, user_test_key
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
+
+
+def make_record(msg, created, service=("Worker", 0), operation=None):
+    attributes = {"msg": msg,
+                  "levelno": logging.INFO,
+                  "levelname": "INFO",
+                  "created": created,
+                  "service_name": service[0],
+                  "service_shard": service[1]}
+    if operation is not None:
+        attributes["operation"] = operation
+    return logging.makeLogRecord(attributes)
+
+
+class TestLogStore(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = LogStore(self.base_dir)
+        self.store.setFormatter(logging.Formatter("%(message)s"))
+
+    def tearDown(self):
+        self.store.close()
+        super().tearDown()
+
+    def query(self, *keys, since=None, until=None):
+        return list(query_logs(self.base_dir, keys, since, until))
+
+    def test_keys(self):
+        record = make_record("Submission 3 was evaluated.", 0,
+                             operation="evaluate user test 5 on testcase 1")
+        self.assertEqual(get_record_keys(record),
+                         {"Worker,0", "submission:3", "user_test:5"})
+
+    def test_buffered(self):
+        self.store.handle(make_record("First.", 10))
+        # Nothing is written until the flush.
+        self.assertEqual(self.query(), [])
+        gevent.sleep(LogStore.FLUSH_INTERVAL * 1.5)
+        self.assertEqual(self.query(), ["First."])
+        self.assertTrue(os.path.islink(
+            os.path.join(self.base_dir, "last.log")))
+
+    def test_query(self):
+        self.store.handle(make_record("A.", 10,
+                                      operation="compile submission 1"))
+        self.store.handle(make_record("B.", 11, service=("Worker", 1),
+                                      operation="compile submission 1"))
+        self.store.flush()
+        self.store.handle(make_record("C.", 20,
+                                      operation="compile submission 2"))
+        self.store.handle(make_record("Multi\nline.", 21))
+        self.store.flush()
+
+        self.assertEqual(self.query(), ["A.", "B.", "C.", "Multi\nline."])
+        self.assertEqual(self.query(submission_key(1)), ["A.", "B."])
+        self.assertEqual(self.query(service_key("Worker", 0)),
+                         ["A.", "C.", "Multi\nline."])
+        self.assertEqual(
+            self.query(service_key("Worker", 1), submission_key(1)), ["B."])
+        self.assertEqual(self.query(user_test_key(1)), [])
+        # Time bounds select whole blocks.
+        self.assertEqual(self.query(since=15), ["C.", "Multi\nline."])
+        self.assertEqual(self.query(until=15), ["A.", "B."])
+
+    def test_rotation(self):
+        self.store.rotation_size = 1
+        for i in range(3):
+            self.store.handle(make_record("Message %d." % i, i))
+            self.store.flush()
+        logs = [name for name in os.listdir(self.base_dir)
+                if name.endswith(".log") and name != "last.log"]
+        self.assertEqual(len(logs), 3)
+        self.assertEqual(self.query(),
+                         ["Message %d." % i for i in range(3)])
+
+    def test_partial_index(self):
+        self.store.handle(make_record("A.", 10))
+        self.store.flush()
+        self.store._index.write('{"offset": ')
+        self.store._index.flush()
+        self.assertEqual(self.query(), ["A."])
+
+
+if __name__ == "__main__":
+    unittest.main()
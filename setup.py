@@ -160,6 +160,7 @@ setup(
             "cmsImportTask=cmscontrib.ImportTask:main",
             "cmsImportTeam=cmscontrib.ImportTeam:main",
             "cmsImportUser=cmscontrib.ImportUser:main",
+            "cmsQueryLogs=cmscontrib.QueryLogs:main",
             "cmsRWSHelper=cmscontrib.RWSHelper:main",
             "cmsRemoveContest=cmscontrib.RemoveContest:main",
             "cmsRemoveParticipation=cmscontrib.RemoveParticipation:main",